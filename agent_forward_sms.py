@@ -11,9 +11,9 @@ FORWARD + SMS Voice Assistant - LiveKit Agent (Variant 2)
 
 import os
 import re
-import json
 import logging
-from typing import Optional, List, Dict, Any
+import importlib.util
+from typing import Optional, List, Dict, Any, AsyncIterable
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
@@ -22,25 +22,44 @@ import asyncio
 import base64  # ggf. für spätere REST-Fallbacks
 
 from livekit import agents
-from livekit.agents import Agent, AgentSession, RunContext, JobContext
-from livekit.agents.llm import function_tool
+from livekit.agents import Agent, AgentSession, RunContext, JobContext, JobProcess, ModelSettings
+from livekit.agents.llm import function_tool, ChatContext, ChatMessage
 from livekit.agents.worker import WorkerOptions
-from livekit.plugins import azure, openai, silero
-# Deepgram optional nutzbar (du nutzt primär DSGVO/Azure-Pipeline)
-try:
-    from livekit.plugins import deepgram  # noqa: F401
-    HAS_DEEPGRAM = True
-except Exception:
-    HAS_DEEPGRAM = False
-
-# SIP Outdial via SDK
-from livekit.api import LiveKitAPI
+# Pflicht-Plugins bleiben Modul-Imports: LiveKit registriert Plugins nur im Main-Thread,
+# und `download-files` kennt nur registrierte Plugins
+from livekit.plugins import azure, openai, silero  # noqa: F401  (azure: Registrierung, genutzt in speech_pool)
+
+# Gemeinsame Bausteine (callisi/)
+from callisi.availability import AvailabilitySync, get_availability_index, stay_days
+from callisi.booking_queue import BookingDispatcher, get_booking_queue
+from callisi.call_recorder import CallRecorder, start_call_recorder
+from callisi.call_setup import PickupTimer, start_warmup
+from callisi.caller_profile import fetch_caller_profile, parse_caller_phone, profile_instructions, remember_caller
+from callisi.chat_context import ContextWindow
+from callisi.circuit_breaker import CircuitOpenError, get_breaker
+from callisi.embeddings import aclose_clients as aclose_embed_clients, azure_embed, embed_backend, local_embed, prewarm_embeddings
+from callisi.endpointing import EndpointingTuner, session_options, vad_options
+from callisi.kb_retrieval import get_kb_retriever, tenant_namespace
+from callisi.llm_pool import azure_llm_pool_configs, pooled_llm
+from callisi.loop_watchdog import start_loop_watchdog
+from callisi.metrics import start_metrics_server
+from callisi.quota import CallQuota
+from callisi.redaction import install_log_redaction
+from callisi.speech_pool import idle_processes, prewarm_speech, speech_plugins
+from callisi.tool_registry import ToolRegistry
+from callisi.tts_normalizer import normalize_stream
+from callisi.turn_budget import TurnBudget
+from callisi.worker_load import WorkerLoad, start_lag_reporter
+
+# Deepgram optional nutzbar (du nutzt primär DSGVO/Azure-Pipeline) – nur Verfügbarkeit prüfen, kein Import beim Start
+HAS_DEEPGRAM = importlib.util.find_spec("livekit.plugins.deepgram") is not None
 
 # ---- Logging ----
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(level=getattr(logging, LOG_LEVEL, logging.INFO),
                     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 log = logging.getLogger("dsgvo-telephony-agent")
+install_log_redaction()  # Telefonnummern, Namen, Adressen etc. nie im Klartext ins Log (PII_REDACTION=0 schaltet ab)
 
 # --------------------------------------------------------------------------------------
 # Konfiguration / ENV
@@ -113,20 +132,17 @@ def _pinecone_connect():
         return index
 
 async def _azure_embed(texts: List[str]) -> List[List[float]]:
-    """Holt Embeddings über AzureOpenAI; erwartet, dass Deployment existiert."""
-    from openai import AzureOpenAI  # OpenAI SDK >=1.43
+    """Holt Embeddings über AsyncAzureOpenAI (gecachter Client); erwartet, dass Deployment existiert."""
     cfg = _get_azure_embed_config()
     if not (cfg["api_key"] and cfg["endpoint"] and cfg["deployment"]):
         raise RuntimeError("Azure Embeddings nicht konfiguriert (API-Key/Endpoint/Deployment).")
+    return await azure_embed(texts, cfg)
 
-    client = AzureOpenAI(
-        api_key=cfg["api_key"],
-        api_version=cfg["api_version"],
-        azure_endpoint=cfg["endpoint"],
-    )
-    # Azure erwartet bei .create model=<DEPLOYMENTNAME>
-    r = client.embeddings.create(model=cfg["deployment"], input=texts)
-    return [d.embedding for d in r.data]
+async def _kb_embed(texts: List[str]) -> List[List[float]]:
+    """Query-Embeddings: lokal auf der CPU (EMBED_BACKEND=local) oder über Azure."""
+    if embed_backend() == "local":
+        return await local_embed(texts, kind="query")
+    return await _azure_embed(texts)
 
 def _lang_default() -> str:
     """Standardsprache Telefonie."""
@@ -160,10 +176,18 @@ async def _send_sms(body: str, to_override: Optional[str] = None) -> str:
     url = f"https://api.twilio.com/2010-04-01/Accounts/{TWILIO_ACCOUNT_SID}/Messages.json"
     auth = (TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
     data = {"From": TWILIO_PHONE_NUMBER, "To": to, "Body": body}
-    async with httpx.AsyncClient(timeout=20.0, auth=auth) as client:
-        r = await client.post(url, data=data)
-        if r.status_code not in (200, 201):
-            return f"SMS-Fehler {r.status_code}: {r.text}"
+    try:
+        async with get_breaker("twilio").guard():
+            async with httpx.AsyncClient(timeout=20.0, auth=auth) as client:
+                r = await client.post(url, data=data)
+            if r.status_code >= 500:
+                raise RuntimeError(f"Twilio-Status {r.status_code}")
+    except CircuitOpenError:
+        return "SMS derzeit nicht möglich (Twilio gestört)."
+    except Exception as e:
+        return f"SMS-Fehler: {e}"
+    if r.status_code not in (200, 201):
+        return f"SMS-Fehler {r.status_code}: {r.text}"
     return "SMS gesendet."
 
 # --------------------------------------------------------------------------------------
@@ -206,6 +230,24 @@ class TelephonyAssistant(Agent):
             )
 
         super().__init__(instructions=base_instructions)
+        self._turn_budget = TurnBudget.start()
+        self.call_recorder: Optional[CallRecorder] = None  # wird im entrypoint gesetzt
+        self.context_window = ContextWindow()
+        self.tool_registry = ToolRegistry()  # Phase info/booking/transfer bestimmt die sichtbaren Tools
+        self.caller_phone: Optional[str] = None  # einmal aus den Metadaten gelesen
+        self.kb_namespace = tenant_namespace(None)  # KB_NAMESPACE; pro Anruf aus den Dispatch-Metadaten
+        self._profile_task: Optional[asyncio.Task] = None
+        self.language = "de-DE"  # Sprache des Anrufs (STT); wird als bevorzugte Sprache im Profil gemerkt
+        self.quota = CallQuota()  # Azure-Kontingent des Workers; neue Anrufe stehen hinter laufenden zurück
+        self.booking_dispatcher: Optional[BookingDispatcher] = None  # wird im entrypoint gesetzt
+
+    def _record(self, kind: str, **data: Any) -> None:
+        if self.call_recorder is not None:
+            self.call_recorder.record(kind, **data)
+
+    def _enter_phase(self, phase: str) -> None:
+        if self.tool_registry.enter(phase):
+            self._record("phase", phase=phase)
 
     # ---- Tools ----
 
@@ -219,31 +261,60 @@ class TelephonyAssistant(Agent):
         return now.isoformat()
 
     @function_tool
-    async def query_kb(self, context: RunContext, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-        """Fragt Pinecone mit Azure-Embeddings ab."""
+    async def query_kb(self, context: RunContext, query: str, top_k: int = 3, category: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Fragt Pinecone mit Azure- oder lokalen Embeddings ab; hält das Turn-Budget ein (Hedge auf Cache/lokale Replica).
+        category grenzt optional ein (z.B. apartment, prices_payment, checkin_checkout, arrival, house_rules, services, contact)."""
+        retriever = get_kb_retriever()
+        local = embed_backend() == "local"
+        if not local:
+            await self.quota.acquire("embed_requests", 1, max_wait_s=self._turn_budget.tool_deadline_s() / 2)
+        search = dict(embed=_kb_embed, connect=_pinecone_connect, namespace=self.kb_namespace,
+                      embed_breaker=None if local else "azure_openai")
         try:
-            vectors = await _azure_embed([query])
-            vec = vectors[0]
-            index = _pinecone_connect()
-            res = index.query(vector=vec, top_k=top_k, include_metadata=True)
-            matches = res.get("matches") if isinstance(res, dict) else getattr(res, "matches", [])
-            hits: List[Dict[str, Any]] = []
-            for m in matches or []:
-                meta = m.get("metadata", {}) if isinstance(m, dict) else getattr(m, "metadata", {}) or {}
-                text = meta.get("text", "")
-                score = m.get("score") if isinstance(m, dict) else getattr(m, "score", None)
-                hits.append({"score": score, "text": text, "metadata": meta})
+            hits, _source = await retriever.retrieve(
+                query, top_k, deadline_s=self._turn_budget.tool_deadline_s(),
+                flt={"category": category.strip().lower()} if category else None, **search,
+            )
+            if not hits and category:
+                # Kategorie ohne Treffer (falsch geraten oder Vektoren ohne category) -> ohne Filter
+                hits, _source = await retriever.retrieve(query, top_k, deadline_s=self._turn_budget.tool_deadline_s(), **search)
             return hits
+        except asyncio.TimeoutError:
+            log.warning(f"query_kb: Turn-Budget überschritten ({self._turn_budget.elapsed_s() * 1000:.0f} ms)")
         except Exception as e:
-            return [{"error": f"KB-Fehler: {e}"}]
+            log.warning(f"query_kb fehlgeschlagen: {e}")
+        return [{"hinweis": "Die Information ist gerade nicht abrufbar. Sage dem Anrufer kurz, dass du das im Moment "
+                            "nicht nachsehen kannst, und biete Rückruf oder Weiterleitung an. Keine Fakten erfinden."}]
 
     def _caller_phone_from_session(self) -> Optional[str]:
+        if self.caller_phone is None:
+            try:
+                self.caller_phone = parse_caller_phone(self.session.room.local_participant.metadata)
+            except Exception:
+                return None
+        return self.caller_phone
+
+    def on_user_transcribed(self, ev: Any) -> None:
+        """Von der STT erkannte Sprache übernehmen (nur wenn sie gemeldet wird)."""
+        if ev.is_final and ev.language:
+            self.language = ev.language
+
+    def prefetch_caller_profile(self, phone: Optional[str]) -> None:
+        """Anruferprofil parallel zur Begrüßung laden; Treffer landen als Systemnachricht im Kontext."""
+        self.caller_phone = phone
+        self._profile_task = asyncio.create_task(self._load_caller_profile(phone))
+
+    async def _load_caller_profile(self, phone: Optional[str]) -> None:
         try:
-            meta_raw = self.session.room.local_participant.metadata
-            meta = meta_raw if isinstance(meta_raw, dict) else json.loads(meta_raw or "{}")
-            return meta.get("caller_phone") or meta.get("from") or meta.get("caller")
-        except Exception:
-            return None
+            profile = await fetch_caller_profile(phone)
+            if not profile:
+                return
+            self._record("caller_profile", calls=profile.get("calls", 0), open_bookings=len(profile.get("open_bookings") or []))
+            chat_ctx = self.chat_ctx.copy()
+            chat_ctx.add_message(role="system", content=profile_instructions(profile))
+            await self.update_chat_ctx(chat_ctx)
+        except Exception as e:
+            log.warning(f"Anruferprofil nicht übernommen: {e}")
 
     @function_tool
     async def send_to_webhook(self, context: RunContext, payload: dict) -> str:
@@ -252,19 +323,78 @@ class TelephonyAssistant(Agent):
         if not url:
             return "Webhook nicht konfiguriert (N8N_WEBHOOK_URL fehlt)."
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                r = await client.post(url, json=payload)
-                return r.text if r.status_code == 200 else f"Fehler: Status {r.status_code}"
+            async with get_breaker("n8n").guard():
+                async with httpx.AsyncClient(timeout=30.0) as client:
+                    r = await client.post(url, json=payload)
+                if r.status_code >= 500:
+                    raise RuntimeError(f"Status {r.status_code}")
+            return r.text if r.status_code == 200 else f"Fehler: Status {r.status_code}"
+        except CircuitOpenError:
+            return "Der Dienst ist gerade nicht erreichbar; die Anfrage wurde nicht übermittelt. Biete dem Anrufer einen Rückruf an."
         except Exception as e:
             return f"Webhook-Fehler: {e}"
         
     @function_tool
-    async def book_appointment(self, context: RunContext, customer_name: str, datetime_iso: str, phone: Optional[str], service: str) -> str:
-        """Bucht Termin via send_to_webhook; nutzt Caller aus Session, wenn phone None."""
+    async def check_availability(self, context: RunContext, checkin_iso: str, checkout_iso: str, apartment: Optional[int] = None) -> str:
+        """Prüft lokal, ob Apartment 1–5 von Anreise bis Abreise frei ist; ohne apartment: alle freien Apartments."""
+        self._enter_phase("booking")
+        index = get_availability_index()
+        if index.synced_at is None:
+            return "Verfügbarkeit derzeit unbekannt (noch nicht synchronisiert)."
+        try:
+            if apartment is not None:
+                free = index.is_free(apartment, checkin_iso, checkout_iso)
+                result = f"Apartment {apartment} ist im Zeitraum {'frei' if free else 'belegt'}."
+            else:
+                free_apts = index.free_apartments(checkin_iso, checkout_iso)
+                result = ("Frei: " + ", ".join(f"Apartment {a}" for a in free_apts) + ".") if free_apts else "Im Zeitraum ist kein Apartment frei."
+        except (KeyError, ValueError) as e:
+            return f"Verfügbarkeitsprüfung nicht möglich: {e}"
+        if index.is_stale():
+            result += " (Stand nicht aktuell – unter Vorbehalt.)"
+        return result
+
+    @function_tool
+    async def book_appointment(self, context: RunContext, customer_name: str, datetime_iso: str, phone: Optional[str], service: str,
+                               apartment: Optional[int] = None, checkout_iso: Optional[str] = None) -> str:
+        """Bucht Termin: lokale Queue (idempotent), sofortige Bestätigung, Zustellung an n8n im Hintergrund; nutzt Caller aus Session, wenn phone None.
+        Mit apartment + checkout_iso wird vorher lokal auf Überschneidungen geprüft."""
+        if self.booking_dispatcher is None or not self.booking_dispatcher.running:
+            # ohne Zustellung bliebe die Buchung für immer in der Queue – nicht zusagen
+            return "Webhook nicht konfiguriert (N8N_WEBHOOK_URL fehlt)."
         if not phone:
             phone = self._caller_phone_from_session() or "unbekannt"
         payload = {"action": "book_appointment", "customer_name": customer_name, "datetime": datetime_iso, "phone": phone, "service": service}
-        return await self.send_to_webhook(context, payload)
+        index = get_availability_index()
+        if apartment is not None and checkout_iso:
+            payload.update({"apartment": apartment, "checkout": checkout_iso})
+            try:
+                # Daten auch ohne Sync prüfen: der Hold nach dem Einreihen darf nicht mehr scheitern
+                stay_days(datetime_iso, checkout_iso)
+                if index.synced_at is not None and not index.is_free(apartment, datetime_iso, checkout_iso):
+                    return f"Apartment {apartment} ist im gewünschten Zeitraum bereits belegt. Bitte anderen Zeitraum oder anderes Apartment anbieten."
+            except (KeyError, ValueError) as e:
+                return f"Buchung nicht möglich: {e}"
+        try:
+            row, created = await asyncio.to_thread(get_booking_queue().enqueue, payload)
+        except Exception as e:
+            return f"Buchung konnte nicht gespeichert werden: {e}"
+        if not created:
+            return f"Diese Buchung liegt bereits vor (Referenz {row['ref']}, Status {row['status']})."
+        if "apartment" in payload:
+            index.hold(apartment, datetime_iso, checkout_iso, row["ref"])
+        return f"Buchung aufgenommen (Referenz {row['ref']}). Die Bestätigung wird im Hintergrund übermittelt."
+
+    @function_tool
+    async def get_booking_status(self, context: RunContext, reference: str) -> str:
+        """Zustellstatus einer Buchung anhand der Referenz (pending/delivering/delivered/failed)."""
+        try:
+            row = await asyncio.to_thread(get_booking_queue().get, reference)
+        except Exception as e:
+            return f"Buchungsstatus nicht abrufbar: {e}"
+        if not row:
+            return f"Keine Buchung mit Referenz {reference} gefunden."
+        return f"Buchung {row['ref']}: Status {row['status']} (Zustellversuche: {row['attempts']})."
 
     @function_tool
     async def parse_relative_time_to_iso(self, context: RunContext, text: str, tz: str = "Europe/Berlin") -> str:
@@ -286,6 +416,8 @@ class TelephonyAssistant(Agent):
 
     async def _sdk_add_sip_participant(self, room_name: str, destination: str, trunk_name: str) -> None:
         """LiveKit SDK: Outdial -> Ziel als SIP-Teilnehmer in diesen Room holen."""
+        from livekit.api import LiveKitAPI  # SIP Outdial via SDK – erst beim Transfer laden
+
         async with LiveKitAPI() as lk:
             sip_obj = getattr(lk, "sip", None)
             if sip_obj is None:
@@ -316,18 +448,23 @@ class TelephonyAssistant(Agent):
         """
         dest = DEFAULT_FORWARD_NUMBER
         if not dest or not _valid_target(dest):
+            self._record("transfer", outcome="invalid_target", reason=reason)
             return "Weiterleitung nicht möglich (Zielnummer ungültig oder fehlt)."
 
         await self.session.generate_reply(instructions="Einen Moment bitte, ich stelle Sie jetzt mit einem Kollegen durch.")
         try:
             joined = await self._warm_transfer_with_timeout(dest, RING_TIMEOUT_SECONDS)
         except Exception as e:
+            self._record("transfer", outcome="failed", reason=reason, error=str(e))
             await self.session.generate_reply(
                 instructions="Die Durchstellung ist leider fehlgeschlagen. Soll ich eine Nachricht aufnehmen?"
             )
             return f"Weiterleitung fehlgeschlagen: {e}"
 
         if joined:
+            # erst nach erfolgreicher Übergabe; bei Fehler/Timeout bleiben Verfügbarkeit & Co. erreichbar
+            self._enter_phase("transfer")
+            self._record("transfer", outcome="connected", reason=reason)
             await self.session.generate_reply(instructions="Vielen Dank. Ich übergebe jetzt das Gespräch.")
             # Optional: nach Übergabe Raum verlassen
             # await self.session.leave()
@@ -335,7 +472,10 @@ class TelephonyAssistant(Agent):
         else:
             caller = self._caller_phone_from_session() or "unbekannt"
             msg = f"Clara: Ziel nicht erreicht innerhalb {RING_TIMEOUT_SECONDS}s. Bitte Rückruf an {caller} veranlassen."
-            _ = await _send_sms(msg)
+            sent = await _send_sms(msg)
+            self._record("transfer", outcome="timeout", reason=reason, notification=sent)
+            if sent != "SMS gesendet.":
+                log.warning(f"Rückruf-Benachrichtigung fehlgeschlagen: {sent}")
             await self.session.generate_reply(
                 instructions="Es geht leider niemand ran. Ich habe das Team per SMS informiert; Sie werden gleich zurückgerufen."
             )
@@ -343,12 +483,47 @@ class TelephonyAssistant(Agent):
 
     # ---- Lifecycle ----
 
+    async def on_user_turn_completed(self, turn_ctx: ChatContext, new_message: ChatMessage) -> None:
+        """Anrufer hat ausgeredet -> Latenzbudget für diese Runde starten, Gesprächsphase nachführen."""
+        self._turn_budget = TurnBudget.start()
+        self.quota.call_in_progress()
+        if new_message is not None and self.tool_registry.observe_user_text(new_message.text_content or ""):
+            self._record("phase", phase=self.tool_registry.phase)
+
+    async def llm_node(self, chat_ctx: ChatContext, tools: list, model_settings: ModelSettings):
+        """Tools der Gesprächsphase; Kontext begrenzen (alte Tool-Ergebnisse kürzen, Zusammenfassung, gepinnte Buchungsdaten)."""
+        tools = self.tool_registry.select(tools)
+        chat_ctx = self.context_window.prepare(chat_ctx, summarizer=self.session.llm)
+        # Tokens vorab schätzen und beim Governor anfordern, nach der Antwort mit usage verrechnen
+        estimated = self.quota.llm_estimate(self.context_window.estimate_tokens(chat_ctx.items))
+        await self.quota.acquire("llm_tokens", estimated)
+        async for chunk in Agent.default.llm_node(self, chat_ctx, tools, model_settings):
+            if getattr(chunk, "usage", None) is not None:
+                self.quota.settle_llm(estimated, chunk.usage)
+            yield chunk
+
+    async def tts_node(self, text: AsyncIterable[str], model_settings: ModelSettings):
+        """Zahlen, Uhrzeiten, Beträge, Telefonnummern, PLZ und E-Mails vor Azure TTS aussprechbar machen."""
+        async for frame in Agent.default.tts_node(self, self.quota.tts_text(normalize_stream(text)), model_settings):
+            yield frame
+
+    async def aclose(self) -> None:
+        """Job-Shutdown: Per-Call-Referenzen lösen (der Worker-Prozess kann weitere Calls annehmen)."""
+        if self._profile_task is not None and not self._profile_task.done():
+            self._profile_task.cancel()
+        await self.context_window.aclose()
+        await remember_caller(self.caller_phone, self.context_window.facts, language=self.language)
+        if self.call_recorder is not None:
+            self.call_recorder.detach()
+            self.call_recorder = None
+
     async def on_enter(self):
         """Begrüßung auf Deutsch, kurz & freundlich – IMMER als „Clara".""" 
         greeting = (
             "Guten Tag und herzlich willkommen beim Aparts in Oberhausen. "
             "Sie sprechen mit Clara, Ihrer virtuellen Assistentin. Wie kann ich Ihnen helfen?"
         )
+        await self.tool_registry.install(self)  # kompakte Tool-Schemas
         try:
             await self.session.generate_reply(instructions=greeting)
         except Exception as e:
@@ -358,47 +533,113 @@ class TelephonyAssistant(Agent):
 # Entrypoint (Telefonie first, keine Raum-Autocreation; nutzt ctx.room vom SIP-Ingress)
 # --------------------------------------------------------------------------------------
 
+def prewarm(proc: JobProcess):
+    """
+    Einmal pro Job-Prozess, bevor er Calls annimmt:
+    - Silero-VAD laden (ONNX-Session) statt beim ersten Anruf
+    - lokale Indizes (Verfügbarkeit, KB-Replica) einlesen
+    - Azure-Speech-Token holen und Speech-SDK anstoßen
+    - lokales Embedding-Modell laden (EMBED_BACKEND=local)
+    """
+    proc.userdata["vad"] = silero.VAD.load(**vad_options())
+    prewarm_speech()
+    prewarm_embeddings()
+    get_availability_index()
+    get_kb_retriever().replica.available()
+
+
 async def entrypoint(ctx: JobContext):
     """
     Haupt-Einstiegspunkt:
     - Verbindet den Worker
-    - Wartet auf eingehenden Teilnehmer (SIP)
-    - Startet die Session im vom Ingress erzeugten Raum (ctx.room)
+    - Wartet auf eingehenden Teilnehmer (SIP) – parallel dazu Session/Plugins aufbauen und Verbindungen vorwärmen
+    - Startet die Session im vom Ingress erzeugten Raum (ctx.room), sobald der Anrufer da ist
     """
     await ctx.connect()
 
-    # SIP: auf Teilnehmer warten
-    participant = await ctx.wait_for_participant()
-    log.info(f"Phone call connected from participant: {participant.identity}")
+    # Opt-in: Event-Loop-Watchdog (LOOP_WATCHDOG=1) – meldet blockierende Aufrufe mit Stack
+    loop_watchdog = start_loop_watchdog(session_id=ctx.room.name)
+    if loop_watchdog:
+        ctx.add_shutdown_callback(loop_watchdog.aclose)
+
+    # Loop-Lag dieses Jobs für die Lastmeldung des Workers (load_fnc)
+    lag_reporter = start_lag_reporter(ctx.job.id)
+    ctx.add_shutdown_callback(lag_reporter.aclose)
+
+    # Buchungen: Hintergrund-Zustellung an n8n für die Dauer des Jobs (Rest übernimmt der nächste Job)
+    booking_dispatcher = BookingDispatcher()
+    booking_dispatcher.start()
+    ctx.add_shutdown_callback(booking_dispatcher.aclose)
+
+    # Verfügbarkeit: lokaler Index, Sync mit n8n / Snapshot im Hintergrund
+    availability_sync = AvailabilitySync()
+    availability_sync.start()
+    ctx.add_shutdown_callback(availability_sync.aclose)
+
+    # HTTP-Clients dieses Jobs (Embeddings) beim Ende schließen
+    ctx.add_shutdown_callback(aclose_embed_clients)
+
+    # Call-Records (Transkript, Tools, Transfer, Latenzen) – gepuffert, Schreiben im Hintergrund
+    call_recorder = start_call_recorder(call_id=ctx.job.id, room=ctx.room.name)
+    if call_recorder:
+        ctx.add_shutdown_callback(call_recorder.aclose)
+
+    # SIP: auf Teilnehmer warten – läuft als Task, der Aufbau unten passiert währenddessen
+    pickup_timer = PickupTimer(recorder=call_recorder)
+    participant_task = pickup_timer.wait_for_participant(ctx.wait_for_participant())
 
     # Audio-/LLM-Pipeline (Azure STT für DSGVO-Compliance)
     speech_cfg = _get_azure_stt_tts_config()
     llm_cfg = _get_azure_llm_config()
+    # STT/TTS mit dem Token aus prewarm (Erneuerung läuft im Hintergrund), sonst Subscription-Key
+    speech = await speech_plugins(speech_cfg, language="de-DE", voice="de-DE-KatjaNeural")
+    ctx.add_shutdown_callback(speech.aclose)
 
     session = AgentSession(
-        vad=silero.VAD.load(),
-        stt=azure.STT(
-            speech_key=speech_cfg["speech_key"],
-            speech_region=speech_cfg["speech_region"],
-            language="de-DE",
-        ),
-        llm=openai.LLM.with_azure(
-            model=llm_cfg["model"],
-            azure_deployment=llm_cfg["azure_deployment"],
-            azure_endpoint=llm_cfg["azure_endpoint"],
-            api_version=llm_cfg["api_version"],
-            api_key=llm_cfg["api_key"],
-        ),
-        tts=azure.TTS(
-            speech_key=speech_cfg["speech_key"],
-            speech_region=speech_cfg["speech_region"],
-            voice="de-DE-KatjaNeural",
-        ),
-        turn_detection="semantic",
+        vad=ctx.proc.userdata.get("vad") or silero.VAD.load(**vad_options()),
+        stt=speech.stt,
+        # AZURE_OPENAI_POOL: mehrere Deployments/Regionen, je Turn der Endpoint mit der besten TTFT
+        llm=pooled_llm(azure_llm_pool_configs(llm_cfg), lambda c: openai.LLM.with_azure(
+            model=c["model"],
+            azure_deployment=c["azure_deployment"],
+            azure_endpoint=c["azure_endpoint"],
+            api_version=c["api_version"],
+            api_key=c["api_key"],
+        )),
+        tts=speech.tts,
+        **session_options(),  # TURN_DETECTION, ENDPOINTING_MIN/MAX_DELAY_MS
     )
 
+    # Antwortlatenz pro Turn messen; ENDPOINTING_ADAPTIVE=1 passt die Stillezeit an den Anrufer an
+    EndpointingTuner(session, recorder=call_recorder).attach()
+    pickup_timer.attach(session)
+
+    agent = TelephonyAssistant()
+    ctx.add_shutdown_callback(agent.aclose)
+    agent.booking_dispatcher = booking_dispatcher
+    agent.quota.attach(session)  # 429 von LLM/TTS -> gemeinsame Pause aller Anrufe des Workers
+    session.on("user_input_transcribed", agent.on_user_transcribed)
+    # Mandant/Objekt aus der Dispatch-Regel -> eigener Pinecone-Namespace für query_kb
+    agent.kb_namespace = tenant_namespace(ctx.job.metadata)
+    agent.context_window.attach(session, recorder=call_recorder)
+    if call_recorder:
+        agent.call_recorder = call_recorder
+        call_recorder.attach(session)
+    pickup_timer.setup_done()
+    # TLS zu Azure OpenAI/TTS öffnen, solange es noch klingelt (CALL_SETUP_WARMUP)
+    warmup = start_warmup(session)
+    ctx.add_shutdown_callback(warmup.aclose)
+
+    participant = await participant_task
+    log.info(f"Phone call connected from participant: {participant.identity}")
+
+    # Anruferprofil (Stammgast, offene Buchungen) läuft parallel zu session.start/Begrüßung
+    agent.prefetch_caller_profile(
+        parse_caller_phone(ctx.room.local_participant.metadata)
+        or (getattr(participant, "attributes", None) or {}).get("sip.phoneNumber")
+    )
     # Start im aktuellen Raum (kein Auto-Create; SIP-Routing bestimmt den Raum)
-    await session.start(agent=TelephonyAssistant(), room=ctx.room)
+    await session.start(agent=agent, room=ctx.room)
 
 # --------------------------------------------------------------------------------------
 # CLI / Worker starten – Dispatch: INDIVIDUAL
@@ -408,28 +649,21 @@ if __name__ == "__main__":
     worker_name = ""  # bleibt leer, wie von dir gewünscht
     # HINWEIS: agent_name bleibt leer, damit deine bestehende Dispatch-Rule greifen kann
 
-    opts = WorkerOptions(entrypoint_fnc=entrypoint)
+    # Lastmeldung: aktive Jobs + CPU + Loop-Lag; ab WORKER_LOAD_THRESHOLD gehen neue Calls an andere Replicas
+    worker_load = WorkerLoad()
+    opts = WorkerOptions(
+        entrypoint_fnc=entrypoint,
+        prewarm_fnc=prewarm,
+        load_fnc=worker_load,
+        load_threshold=worker_load.threshold,
+    )
+    if idle_processes() is not None:
+        opts.num_idle_processes = idle_processes()  # WORKER_IDLE_PROCESSES: vorgewärmte Prozesse (Token, Speech-SDK)
     opts.ws_url = os.getenv("LIVEKIT_URL", opts.ws_url)
     opts.api_key = os.getenv("LIVEKIT_API_KEY", opts.api_key)
     opts.api_secret = os.getenv("LIVEKIT_API_SECRET", opts.api_secret)
     opts.agent_name = worker_name
 
+    start_metrics_server()  # nur wenn METRICS_PORT gesetzt
     log.info(f"🚀 Starte LiveKit Voice Agent Worker (agent_name='{opts.agent_name}') …")
     agents.cli.run_app(opts)
-
-# ...ganz am Ende der Datei, nach allen Klassendefinitionen...
-TelephonyAssistant.send_to_webhook.__openai_schema__ = {
-    "name": "send_to_webhook",
-    "description": "Sende strukturierte Payload an externen Webhook (URL via .env N8N_WEBHOOK_URL).",
-    "parameters": {
-        "type": "object",
-        "properties": {
-            "payload": {
-                "type": "object",
-                "additionalProperties": False
-            }
-        },
-        "required": ["payload"],
-        "additionalProperties": False
-    }
-}
@@ -0,0 +1,5 @@
+"""
+Gemeinsame Bausteine der Callisi Voice Agents.
+- Wird von agent_basic.py, agent_forward_sms.py, agent_forward_whatsapp.py und livekit_agent_dsgvo.py genutzt
+- Konfiguration ausschließlich über ENV (siehe .env.example)
+"""
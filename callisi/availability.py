@@ -0,0 +1,284 @@
+"""
+Lokaler Verfügbarkeits-Index für die Apartments.
+- Pro Apartment nach Anreise sortierte Intervalle [Anreise, Abreise) als Tages-Ordinals -> Konfliktprüfung per bisect;
+  Snapshot-Buchungen dürfen sich überlappen (laufendes Maximum der Abreisen begrenzt den Rückwärtslauf)
+- Sync: periodischer Pull von N8N_AVAILABILITY_URL (ETag) oder Push über die Snapshot-Datei (mtime wird erkannt)
+- Snapshot-Datei wird von allen Job-Prozessen geteilt -> neuer Job startet sofort warm
+- Lokale Holds aus book_appointment gelten, bis die Buchung im Snapshot auftaucht (bzw. HOLD_TTL abläuft)
+"""
+
+import asyncio
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+log = logging.getLogger("callisi.availability")
+
+
+def _get_availability_config() -> Dict[str, Any]:
+    return {
+        "apartments": [int(a) for a in os.getenv("APARTMENTS", "1,2,3,4,5").split(",") if a.strip()],
+        "url": os.getenv("N8N_AVAILABILITY_URL", ""),
+        "snapshot_path": os.getenv("AVAILABILITY_SNAPSHOT_PATH", "data/availability.json"),
+        "sync_interval_s": float(os.getenv("AVAILABILITY_SYNC_SECONDS", "60")),
+        "max_age_s": float(os.getenv("AVAILABILITY_MAX_AGE_SECONDS", "900")),
+        "hold_ttl_s": float(os.getenv("AVAILABILITY_HOLD_TTL_SECONDS", "3600")),
+    }
+
+
+def stay_days(checkin: Any, checkout: Any) -> Tuple[int, int]:
+    """Anreise/Abreise -> Tages-Ordinals; ValueError bei unlesbarem Datum oder Abreise nicht nach Anreise."""
+    start, end = _to_day(checkin), _to_day(checkout)
+    if end <= start:
+        raise ValueError("Abreise muss nach der Anreise liegen")
+    return start, end
+
+
+def _to_day(value: Any) -> int:
+    """ISO-Datum/-Zeitpunkt oder date -> Tages-Ordinal."""
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    text = str(value).strip()
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).date().toordinal()
+    except ValueError:
+        return date.fromisoformat(text[:10]).toordinal()
+
+
+class _AptIntervals:
+    """Sortierte Intervalle eines Apartments (parallele Listen für bisect); max_ends[i] = max(ends[:i + 1])."""
+
+    __slots__ = ("starts", "ends", "refs", "max_ends")
+
+    def __init__(self):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.refs: List[str] = []
+        self.max_ends: List[int] = []
+
+    def _update_max_ends(self, i: int) -> None:
+        del self.max_ends[i:]
+        running = self.max_ends[-1] if i else 0  # Tages-Ordinals sind > 0
+        for e in self.ends[i:]:
+            running = max(running, e)
+            self.max_ends.append(running)
+
+    def insert(self, start: int, end: int, ref: str) -> None:
+        i = bisect.bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.refs.insert(i, ref)
+        self._update_max_ends(i)
+
+    def remove(self, ref: str) -> bool:
+        try:
+            i = self.refs.index(ref)
+        except ValueError:
+            return False
+        del self.starts[i], self.ends[i], self.refs[i]
+        self._update_max_ends(i)
+        return True
+
+    def conflicts(self, start: int, end: int) -> List[Tuple[int, int, str]]:
+        """Alle Intervalle mit s < end und e > start."""
+        hi = bisect.bisect_left(self.starts, end)
+        out = []
+        i = hi - 1
+        # Snapshot-Intervalle können sich überlappen (lange Buchung enthält kurze): erst abbrechen, wenn kein
+        # früheres Intervall mehr über start hinausreicht
+        while i >= 0 and self.max_ends[i] > start:
+            if self.ends[i] > start:
+                out.append((self.starts[i], self.ends[i], self.refs[i]))
+            i -= 1
+        return out
+
+
+class AvailabilityIndex:
+    """Verfügbarkeit aller Apartments; Lesen ist lock-frei (atomarer Austausch des Snapshots)."""
+
+    def __init__(self, apartments: List[int], max_age_s: float = 900.0):
+        self.apartments = list(apartments)
+        self.max_age_s = max_age_s
+        self._remote: Dict[int, _AptIntervals] = {a: _AptIntervals() for a in self.apartments}
+        self._holds: Dict[str, Tuple[int, int, int, float]] = {}  # ref -> (apt, start, end, created)
+        self._lock = threading.Lock()
+        self.synced_at: Optional[float] = None
+
+    # ---- Schreiben ----
+
+    def replace_all(self, bookings: List[Dict[str, Any]], synced_at: Optional[float] = None) -> int:
+        """Kompletter Snapshot (Sync); Holds, die jetzt im Snapshot stehen, werden entfernt."""
+        fresh: Dict[int, _AptIntervals] = {a: _AptIntervals() for a in self.apartments}
+        refs = set()
+        count = 0
+        for b in bookings:
+            try:
+                apt = int(b["apartment"])
+                start, end = _to_day(b["checkin"]), _to_day(b["checkout"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if apt not in fresh or end <= start:
+                continue
+            ref = str(b.get("ref") or b.get("booking_ref") or f"{apt}:{start}")
+            fresh[apt].insert(start, end, ref)
+            refs.add(ref)
+            count += 1
+        with self._lock:
+            self._remote = fresh
+            self._holds = {r: h for r, h in self._holds.items() if r not in refs}
+            self.synced_at = synced_at or time.time()
+        return count
+
+    def hold(self, apartment: int, checkin: Any, checkout: Any, ref: str) -> None:
+        """Lokaler Hold für eine gerade angenommene Buchung (bis Sync sie bestätigt)."""
+        with self._lock:
+            self._holds[ref] = (int(apartment), _to_day(checkin), _to_day(checkout), time.time())
+
+    def release(self, ref: str) -> None:
+        with self._lock:
+            self._holds.pop(ref, None)
+
+    def expire_holds(self, ttl_s: float) -> None:
+        cutoff = time.time() - ttl_s
+        with self._lock:
+            self._holds = {r: h for r, h in self._holds.items() if h[3] >= cutoff}
+
+    # ---- Lesen ----
+
+    def conflicts(self, apartment: int, checkin: Any, checkout: Any) -> List[Tuple[int, int, str]]:
+        start, end = _to_day(checkin), _to_day(checkout)
+        remote = self._remote.get(int(apartment))
+        if remote is None:
+            raise KeyError(f"Unbekanntes Apartment {apartment}")
+        found = remote.conflicts(start, end)
+        for ref, (apt, s, e, _) in list(self._holds.items()):
+            if apt == int(apartment) and s < end and e > start:
+                found.append((s, e, ref))
+        return found
+
+    def is_free(self, apartment: int, checkin: Any, checkout: Any) -> bool:
+        return not self.conflicts(apartment, checkin, checkout)
+
+    def free_apartments(self, checkin: Any, checkout: Any) -> List[int]:
+        return [a for a in self.apartments if self.is_free(a, checkin, checkout)]
+
+    def age_s(self) -> Optional[float]:
+        return None if self.synced_at is None else time.time() - self.synced_at
+
+    def is_stale(self) -> bool:
+        age = self.age_s()
+        return age is None or age > self.max_age_s
+
+
+_index: Optional[AvailabilityIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_availability_index() -> AvailabilityIndex:
+    """Prozessweiter Index; lädt beim ersten Zugriff den Snapshot von Platte (falls vorhanden)."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            cfg = _get_availability_config()
+            _index = AvailabilityIndex(cfg["apartments"], max_age_s=cfg["max_age_s"])
+            _load_snapshot(_index, cfg["snapshot_path"])
+        return _index
+
+
+def _load_snapshot(index: AvailabilityIndex, path: str) -> bool:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            snap = json.load(f)
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        log.warning(f"Verfügbarkeits-Snapshot unlesbar ({path}): {e}")
+        return False
+    n = index.replace_all(snap.get("bookings", []), synced_at=snap.get("synced_at"))
+    log.info(f"Verfügbarkeits-Snapshot geladen: {n} Buchungen.")
+    return True
+
+
+def _write_snapshot(path: str, bookings: List[Dict[str, Any]], etag: Optional[str], synced_at: float) -> None:
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"synced_at": synced_at, "etag": etag, "bookings": bookings}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class AvailabilitySync:
+    """Hält den Index aktuell: Snapshot-Datei (Push/andere Prozesse) und periodischer Pull von n8n."""
+
+    def __init__(self, index: Optional[AvailabilityIndex] = None):
+        self.index = index or get_availability_index()
+        self.cfg = _get_availability_config()
+        self._task: Optional[asyncio.Task] = None
+        self._snapshot_mtime = 0.0
+        self._etag: Optional[str] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="availability-sync")
+
+    async def aclose(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            while True:
+                try:
+                    await self.sync_once(client)
+                except Exception as e:
+                    log.warning(f"Verfügbarkeits-Sync fehlgeschlagen: {e}")
+                await asyncio.sleep(self.cfg["sync_interval_s"])
+
+    async def sync_once(self, client: httpx.AsyncClient) -> None:
+        path = self.cfg["snapshot_path"]
+        self.index.expire_holds(self.cfg["hold_ttl_s"])
+
+        # 1) Push / anderer Prozess hat Snapshot aktualisiert
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            mtime = 0.0
+        if mtime > self._snapshot_mtime:
+            self._snapshot_mtime = mtime
+            await asyncio.to_thread(_load_snapshot, self.index, path)
+
+        # 2) Pull nur, wenn Snapshot älter als das Sync-Intervall (vermeidet N Prozesse x Pull)
+        age = self.index.age_s()
+        if not self.cfg["url"] or (age is not None and age < self.cfg["sync_interval_s"]):
+            return
+        headers = {"If-None-Match": self._etag} if self._etag else {}
+        r = await client.get(self.cfg["url"], headers=headers)
+        now = time.time()
+        if r.status_code == 304:
+            self.index.synced_at = now
+            return
+        r.raise_for_status()
+        data = r.json()
+        bookings = data.get("bookings", data) if isinstance(data, dict) else data
+        self._etag = r.headers.get("ETag")
+        n = self.index.replace_all(bookings, synced_at=now)
+        await asyncio.to_thread(_write_snapshot, path, bookings, self._etag, now)
+        self._snapshot_mtime = os.stat(path).st_mtime
+        log.info(f"Verfügbarkeit synchronisiert: {n} Buchungen.")
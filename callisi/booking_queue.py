@@ -0,0 +1,316 @@
+"""
+Durable, idempotente Buchungs-Queue hinter book_appointment.
+- Buchung wird lokal in SQLite persistiert (Idempotenz-Key = UNIQUE) und sofort bestätigt
+- BookingDispatcher liefert im Hintergrund an den n8n-Webhook (Retries, Backoff, Header Idempotency-Key)
+- Status: pending -> delivering -> delivered | failed
+- Mehrere Job-Prozesse können dieselbe DB nutzen (atomarer Claim per UPDATE ... WHERE status='pending')
+- Nach Zustellung wird der Payload geschwärzt gespeichert (PII nur so lange im Klartext, wie für die Zustellung nötig;
+  failed-Einträge behalten ihn für die manuelle Nachbearbeitung)
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from callisi.circuit_breaker import CircuitOpenError, get_breaker
+from callisi.redaction import redact, redact_obj, redaction_enabled
+
+log = logging.getLogger("callisi.booking")
+
+STATUS_PENDING = "pending"
+STATUS_DELIVERING = "delivering"
+STATUS_DELIVERED = "delivered"
+STATUS_FAILED = "failed"
+
+
+def _get_booking_config() -> Dict[str, Any]:
+    return {
+        "db_path": os.getenv("BOOKING_DB_PATH", "data/bookings.sqlite3"),
+        "webhook_url": os.getenv("N8N_WEBHOOK_URL", ""),
+        "max_attempts": int(os.getenv("BOOKING_MAX_ATTEMPTS", "8")),
+        "retry_base_s": float(os.getenv("BOOKING_RETRY_BASE_SECONDS", "2")),
+        "retry_max_s": float(os.getenv("BOOKING_RETRY_MAX_SECONDS", "300")),
+        "timeout_s": float(os.getenv("BOOKING_WEBHOOK_TIMEOUT_SECONDS", "30")),
+    }
+
+
+def idempotency_key(payload: Dict[str, Any]) -> str:
+    """Stabiler Schlüssel aus den fachlichen Feldern; gleiche Buchung -> gleicher Key."""
+    phone = "".join(ch for ch in str(payload.get("phone") or "") if ch.isdigit() or ch == "+")
+    parts = [
+        str(payload.get("action") or "").strip().lower(),
+        " ".join(str(payload.get("customer_name") or "").lower().split()),
+        str(payload.get("datetime") or "").strip(),
+        phone,
+        " ".join(str(payload.get("service") or "").lower().split()),
+    ]
+    # Apartment/Abreise nur wenn angegeben (Keys älterer Buchungen bleiben stabil)
+    if payload.get("apartment") is not None or payload.get("checkout"):
+        parts += [str(payload.get("apartment") or ""), str(payload.get("checkout") or "").strip()]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+class BookingQueue:
+    """SQLite-Store für Buchungen; alle Methoden sind synchron (vom Loop aus via asyncio.to_thread)."""
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS bookings (
+            ref TEXT PRIMARY KEY,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            response TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS bookings_due ON bookings (status, next_attempt_at);
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        parent = os.path.dirname(db_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self._SCHEMA)
+        self._notify = None  # vom BookingDispatcher gesetzt (threadsafe Wakeup)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ---- Schreiben ----
+
+    def enqueue(self, payload: Dict[str, Any], key: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """Legt Buchung an; liefert (Datensatz, neu_angelegt). Duplikate liefern den bestehenden Datensatz."""
+        key = key or idempotency_key(payload)
+        ref = uuid.uuid4().hex[:8].upper()
+        now = time.time()
+        body = dict(payload, booking_ref=ref, idempotency_key=key)
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO bookings (ref, idempotency_key, payload, status, next_attempt_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (ref, key, json.dumps(body, ensure_ascii=False), STATUS_PENDING, now, now, now),
+            )
+            created = cur.rowcount == 1
+            row = self._conn.execute("SELECT * FROM bookings WHERE idempotency_key = ?", (key,)).fetchone()
+        if created and self._notify is not None:
+            self._notify()
+        return dict(row), created
+
+    def claim_due(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Fällige pending-Buchungen atomar auf delivering setzen und zurückgeben."""
+        now = time.time()
+        claimed: List[Dict[str, Any]] = []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ref FROM bookings WHERE status = ? AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+                (STATUS_PENDING, now, limit),
+            ).fetchall()
+            for r in rows:
+                cur = self._conn.execute(
+                    "UPDATE bookings SET status = ?, attempts = attempts + 1, updated_at = ? WHERE ref = ? AND status = ?",
+                    (STATUS_DELIVERING, now, r["ref"], STATUS_PENDING),
+                )
+                if cur.rowcount == 1:
+                    row = self._conn.execute("SELECT * FROM bookings WHERE ref = ?", (r["ref"],)).fetchone()
+                    claimed.append(dict(row))
+        return claimed
+
+    def mark_delivered(self, ref: str, response: str) -> None:
+        with self._lock:
+            if redaction_enabled():
+                row = self._conn.execute("SELECT payload FROM bookings WHERE ref = ?", (ref,)).fetchone()
+                if row is not None:
+                    payload = json.dumps(redact_obj(json.loads(row["payload"])), ensure_ascii=False)
+                    self._conn.execute("UPDATE bookings SET payload = ? WHERE ref = ?", (payload, ref))
+                response = redact(response)
+            self._conn.execute(
+                "UPDATE bookings SET status = ?, response = ?, last_error = NULL, updated_at = ? WHERE ref = ?",
+                (STATUS_DELIVERED, response[:2000], time.time(), ref),
+            )
+
+    def mark_retry(self, ref: str, error: str, delay_s: float, refund_attempt: bool = False) -> None:
+        """Zurück auf pending; refund_attempt=True, wenn gar nicht gesendet wurde (z.B. Circuit offen)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE bookings SET status = ?, last_error = ?, next_attempt_at = ?, updated_at = ?, "
+                "attempts = attempts - ? WHERE ref = ?",
+                (STATUS_PENDING, error[:2000], now + delay_s, now, 1 if refund_attempt else 0, ref),
+            )
+
+    def mark_failed(self, ref: str, error: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE bookings SET status = ?, last_error = ?, updated_at = ? WHERE ref = ?",
+                (STATUS_FAILED, error[:2000], time.time(), ref),
+            )
+
+    def recover_stale(self, older_than_s: float) -> int:
+        """delivering-Einträge abgestürzter Prozesse wieder auf pending setzen."""
+        cutoff = time.time() - older_than_s
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE bookings SET status = ?, next_attempt_at = ? WHERE status = ? AND updated_at < ?",
+                (STATUS_PENDING, time.time(), STATUS_DELIVERING, cutoff),
+            )
+        return cur.rowcount
+
+    # ---- Lesen ----
+
+    def get(self, ref: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM bookings WHERE ref = ?", (ref.strip().upper(),)).fetchone()
+        return dict(row) if row else None
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM bookings GROUP BY status").fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+
+_queue: Optional[BookingQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_booking_queue() -> BookingQueue:
+    """Prozessweite Queue-Instanz (lazy)."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = BookingQueue(_get_booking_config()["db_path"])
+        return _queue
+
+
+class BookingDispatcher:
+    """Hintergrund-Zustellung der Queue an den n8n-Webhook."""
+
+    def __init__(self, queue: Optional[BookingQueue] = None, poll_interval_s: float = 1.0):
+        self.queue = queue or get_booking_queue()
+        self.cfg = _get_booking_config()
+        self.poll_interval_s = poll_interval_s
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._notify = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def running(self) -> bool:
+        """False ohne N8N_WEBHOOK_URL bzw. vor start/nach aclose – dann wird nichts zugestellt."""
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        if not self.cfg["webhook_url"]:
+            log.warning("BookingDispatcher: N8N_WEBHOOK_URL fehlt – Buchungen bleiben in der Queue.")
+            return
+        loop = asyncio.get_running_loop()
+        self._notify = lambda: loop.call_soon_threadsafe(self._wakeup.set)
+        self.queue._notify = self._notify
+        self._client = httpx.AsyncClient(timeout=self.cfg["timeout_s"])
+        self._task = asyncio.create_task(self._run(), name="booking-dispatcher")
+
+    async def aclose(self, *, drain_timeout_s: float = 5.0) -> None:
+        """Stoppt den Dispatcher; vorher kurz versuchen, offene Buchungen noch zuzustellen."""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._deliver_due(), timeout=drain_timeout_s)
+        except Exception as e:
+            log.info(f"BookingDispatcher: Drain beim Beenden abgebrochen: {e}")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self.queue._notify is self._notify:
+            self.queue._notify = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _run(self) -> None:
+        await asyncio.to_thread(self.queue.recover_stale, self.cfg["timeout_s"] * 2)
+        while True:
+            try:
+                await self._deliver_due()
+            except Exception as e:
+                log.warning(f"BookingDispatcher: Fehler im Zustell-Loop: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _deliver_due(self) -> None:
+        while True:
+            batch = await asyncio.to_thread(self.queue.claim_due)
+            if not batch:
+                return
+            await asyncio.gather(*(self._deliver(row) for row in batch))
+
+    def _backoff(self, attempts: int) -> float:
+        return min(self.cfg["retry_max_s"], self.cfg["retry_base_s"] * (2 ** max(0, attempts - 1)))
+
+    async def _deliver(self, row: Dict[str, Any]) -> None:
+        ref = row["ref"]
+        try:
+            async with get_breaker("n8n").guard():
+                r = await self._client.post(
+                    self.cfg["webhook_url"],
+                    content=row["payload"].encode("utf-8"),
+                    headers={"Content-Type": "application/json", "Idempotency-Key": row["idempotency_key"]},
+                )
+                if r.status_code >= 500:
+                    raise httpx.HTTPStatusError(f"Status {r.status_code}", request=r.request, response=r)
+        except CircuitOpenError as e:
+            await asyncio.to_thread(self.queue.mark_retry, ref, str(e), e.retry_in_s, True)
+            return
+        except httpx.HTTPStatusError:
+            pass  # 5xx -> unten als Retry behandelt
+        except Exception as e:
+            await self._retry_or_fail(row, f"Webhook-Fehler: {e}")
+            return
+
+        if 200 <= r.status_code < 300:
+            await asyncio.to_thread(self.queue.mark_delivered, ref, r.text)
+            log.info(f"Buchung {ref} zugestellt (Versuch {row['attempts']}).")
+        elif r.status_code == 409:
+            # n8n kennt den Idempotency-Key bereits -> gilt als zugestellt
+            await asyncio.to_thread(self.queue.mark_delivered, ref, r.text)
+            log.info(f"Buchung {ref} war bereits zugestellt (409).")
+        elif r.status_code in (408, 429) or r.status_code >= 500:
+            await self._retry_or_fail(row, f"Status {r.status_code}")
+        else:
+            await asyncio.to_thread(self.queue.mark_failed, ref, f"Status {r.status_code}: {r.text}")
+            log.error(f"Buchung {ref} endgültig abgelehnt: Status {r.status_code}")
+
+    async def _retry_or_fail(self, row: Dict[str, Any], error: str) -> None:
+        ref = row["ref"]
+        if row["attempts"] >= self.cfg["max_attempts"]:
+            await asyncio.to_thread(self.queue.mark_failed, ref, error)
+            log.error(f"Buchung {ref} nach {row['attempts']} Versuchen fehlgeschlagen: {error}")
+            return
+        delay = self._backoff(row["attempts"])
+        await asyncio.to_thread(self.queue.mark_retry, ref, error, delay)
+        log.warning(f"Buchung {ref}: {error} – neuer Versuch in {delay:.0f}s.")
@@ -0,0 +1,257 @@
+"""
+Call-Records (Transkript, Tool-Calls, Transfer-Ergebnis, Latenzen) ohne Einfluss auf das Gespräch.
+- CallRecorder hängt sich an die AgentSession-Events und puffert Records im Speicher
+- Hintergrund-Task schreibt in Batches (Thread, kein Blockieren des Loops) nach JSONL oder SQLite
+- Größenbasierte Rotation (CALL_RECORD_MAX_MB); mehrere Job-Prozesse koordinieren über flock (ohne fcntl nur prozesslokal)
+- PII wird vor dem Schreiben geschwärzt (callisi.redaction, PII_REDACTION)
+- Finaler Flush beim Schließen der Session / Job-Shutdown
+"""
+
+import abc
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from callisi.redaction import redact_obj, redaction_enabled
+
+try:
+    import fcntl  # Linux/macOS; ohne fcntl nur prozesslokal
+except ImportError:
+    fcntl = None
+
+log = logging.getLogger("callisi.call_recorder")
+
+
+def _get_call_record_config() -> Dict[str, Any]:
+    return {
+        "enabled": os.getenv("CALL_RECORDS", "1").strip().lower() not in ("0", "false", "no", "off"),
+        "backend": os.getenv("CALL_RECORD_BACKEND", "jsonl").strip().lower(),
+        "dir": os.getenv("CALL_RECORD_DIR", "data/calls"),
+        "max_bytes": int(float(os.getenv("CALL_RECORD_MAX_MB", "50")) * 1024 * 1024),
+        "flush_interval_s": float(os.getenv("CALL_RECORD_FLUSH_SECONDS", "2")),
+        "batch_size": int(os.getenv("CALL_RECORD_BATCH_SIZE", "200")),
+        "redact": redaction_enabled(),
+    }
+
+
+class _RotatingStore(abc.ABC):
+    """Gemeinsame Basis: Dateipfad, flock, Rotation nach Größe."""
+
+    suffix = ""
+
+    def __init__(self, directory: str, max_bytes: int):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.path = os.path.join(directory, f"calls{self.suffix}")
+        self._lock_path = os.path.join(directory, ".calls.lock")
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with open(self._lock_path, "a") as lf:
+            if fcntl is not None:
+                fcntl.flock(lf, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lf, fcntl.LOCK_UN)
+
+    def _rotate_if_needed(self) -> None:
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size < self.max_bytes:
+            return
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        base, ext = os.path.splitext(self.path)
+        target = f"{base}-{stamp}{ext}"
+        n = 1
+        while os.path.exists(target):
+            target = f"{base}-{stamp}-{n}{ext}"
+            n += 1
+        os.replace(self.path, target)
+        log.info(f"Call-Records rotiert: {target}")
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        with self._locked():
+            self._rotate_if_needed()
+            self._write(records)
+
+    @abc.abstractmethod
+    def _write(self, records: List[Dict[str, Any]]) -> None:
+        """Batch unter dem Lock schreiben (Rotation ist bereits erledigt)."""
+
+
+class JsonlStore(_RotatingStore):
+    suffix = ".jsonl"
+
+    def _write(self, records: List[Dict[str, Any]]) -> None:
+        data = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(data)
+
+
+class SqliteStore(_RotatingStore):
+    suffix = ".sqlite3"
+
+    def _write(self, records: List[Dict[str, Any]]) -> None:
+        conn = sqlite3.connect(self.path, timeout=10.0)
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS call_events (call_id TEXT, ts REAL, kind TEXT, data TEXT)"
+            )
+            conn.executemany(
+                "INSERT INTO call_events (call_id, ts, kind, data) VALUES (?, ?, ?, ?)",
+                [(r["call_id"], r["ts"], r["kind"], json.dumps(r, ensure_ascii=False, default=str)) for r in records],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def _make_store(cfg: Dict[str, Any]) -> _RotatingStore:
+    if cfg["backend"] == "sqlite":
+        return SqliteStore(cfg["dir"], cfg["max_bytes"])
+    return JsonlStore(cfg["dir"], cfg["max_bytes"])
+
+
+class CallRecorder:
+    """Ein Recorder pro Anruf; record() ist billig (nur append), Schreiben passiert im Hintergrund."""
+
+    def __init__(self, call_id: str, room: str = "", cfg: Optional[Dict[str, Any]] = None):
+        self.cfg = cfg or _get_call_record_config()
+        self.call_id = call_id
+        self.room = room
+        self.started_at = time.time()
+        self._buffer: List[Dict[str, Any]] = []
+        self._store = _make_store(self.cfg)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self._session: Any = None
+        self.summary: Dict[str, Any] = {"turns": 0, "tool_calls": 0, "tool_errors": 0, "transfer": None}
+
+    # ---- Erfassen ----
+
+    def record(self, kind: str, **data: Any) -> None:
+        if self._closed:
+            return
+        self._buffer.append({"call_id": self.call_id, "room": self.room, "ts": time.time(), "kind": kind, **data})
+        if len(self._buffer) >= self.cfg["batch_size"]:
+            self._wakeup.set()
+
+    def _handlers(self) -> Dict[str, Any]:
+        return {
+            "conversation_item_added": self._on_item,
+            "function_tools_executed": self._on_tools,
+            "metrics_collected": self._on_metrics,
+            "close": self._on_close,
+        }
+
+    def attach(self, session: Any) -> None:
+        """Registriert die Event-Handler an der AgentSession."""
+        for event, handler in self._handlers().items():
+            session.on(event, handler)
+        self._session = session
+
+    def detach(self) -> None:
+        if self._session is None:
+            return
+        for event, handler in self._handlers().items():
+            try:
+                self._session.off(event, handler)
+            except Exception:
+                pass
+        self._session = None
+
+    def _on_item(self, ev: Any) -> None:
+        item = ev.item
+        role = getattr(item, "role", None)
+        if role is None:
+            return
+        if role == "user":
+            self.summary["turns"] += 1
+        self.record("message", role=role, text=getattr(item, "text_content", None) or "",
+                    interrupted=bool(getattr(item, "interrupted", False)))
+
+    def _on_tools(self, ev: Any) -> None:
+        for call, out in ev.zipped():
+            is_error = bool(out is not None and getattr(out, "is_error", False))
+            self.summary["tool_calls"] += 1
+            self.summary["tool_errors"] += int(is_error)
+            self.record("tool_call", tool=call.name, arguments=call.arguments,
+                        output=(out.output[:2000] if out is not None else None), is_error=is_error)
+
+    def _on_metrics(self, ev: Any) -> None:
+        m = ev.metrics
+        try:
+            data = m.model_dump(mode="json", exclude={"metadata"})
+        except Exception:
+            data = {"repr": repr(m)}
+        self.record("metrics", **{k: v for k, v in data.items() if k not in ("call_id", "ts", "kind", "room")})
+
+    def _on_close(self, ev: Any) -> None:
+        self.summary["close_reason"] = str(getattr(ev, "reason", ""))
+        self._wakeup.set()
+
+    # ---- Hintergrund-Flush ----
+
+    def start(self) -> None:
+        self.record("call_start")
+        self._task = asyncio.create_task(self._run(), name="call-recorder")
+
+    async def _run(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.cfg["flush_interval_s"])
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        try:
+            await asyncio.to_thread(self._write_batch, batch)
+        except Exception as e:
+            log.warning(f"Call-Records konnten nicht geschrieben werden ({len(batch)} verworfen): {e}")
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        # Schwärzen im Writer-Thread, nicht im Event-Loop
+        self._store.write(redact_obj(batch) if self.cfg["redact"] else batch)
+
+    async def aclose(self) -> None:
+        """Stoppt den Flush-Task und schreibt Zusammenfassung + Rest garantiert weg."""
+        if self._closed:
+            return
+        self.record("call_end", duration_s=round(time.time() - self.started_at, 3), **self.summary)
+        self._closed = True
+        self.detach()
+        self._wakeup.set()
+        if self._task is not None:
+            # kein cancel(): ein laufender Batch-Write soll fertig werden
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+def start_call_recorder(call_id: str, room: str = "") -> Optional[CallRecorder]:
+    """Recorder starten, wenn CALL_RECORDS aktiv ist (Standard: an)."""
+    cfg = _get_call_record_config()
+    if not cfg["enabled"]:
+        return None
+    recorder = CallRecorder(call_id, room, cfg)
+    recorder.start()
+    return recorder
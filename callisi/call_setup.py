@@ -0,0 +1,157 @@
+"""
+Anrufaufbau parallel zum Warten auf den Anrufer und Messung Abheben -> erstes Audio.
+- entrypoint startet wait_for_participant als Task und baut währenddessen Session, Plugins und Agent auf
+- Vorwärmen (CALL_SETUP_WARMUP=1): TLS-Verbindungen zu Azure OpenAI und Azure TTS (SPEECH_POOL_SIZE) im
+  Verbindungspool der Plugins öffnen, damit der erste LLM-/TTS-Request keinen Handshake mehr zahlt
+- PickupTimer: Anrufer im Raum bis Clara zum ersten Mal spricht (Metrik + Call-Record "first_audio")
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Dict, Optional
+
+from callisi import metrics
+from callisi.speech_pool import tts_pool_size
+
+log = logging.getLogger("callisi.call_setup")
+
+PICKUP_TO_FIRST_AUDIO = metrics.histogram(
+    "callisi_pickup_to_first_audio_seconds", "Anrufer im Raum bis erstes Audio des Agents",
+)
+SETUP_SECONDS = metrics.histogram(
+    "callisi_call_setup_seconds", "Dauer der Aufbauschritte je Anruf", labels=("step",),
+)
+
+
+def _get_call_setup_config() -> Dict[str, Any]:
+    return {
+        "warmup": os.getenv("CALL_SETUP_WARMUP", "1").strip().lower() not in ("0", "false", "no", "off"),
+        "warmup_timeout_s": float(os.getenv("CALL_SETUP_WARMUP_TIMEOUT_MS", "3000")) / 1000,
+    }
+
+
+# ---- Vorwärmen ----
+
+async def _warm_llm(llm_instance: Any, timeout_s: float) -> None:
+    members = getattr(llm_instance, "members", None)
+    if members is not None:  # PooledLLM: jeden Endpoint vorwärmen, der Failover soll nicht kalt starten
+        await asyncio.gather(*(_warm_llm(m, timeout_s) for m in members))
+        return
+    # openai.AsyncClient des Plugins: gleicher httpx-Pool wie die Chat-Requests
+    client = getattr(llm_instance, "_client", None)
+    if client is None or not hasattr(client, "models"):
+        return
+    try:
+        await client.models.list(timeout=timeout_s)
+    except Exception as e:
+        # Status egal (z.B. 401/404) – die Verbindung liegt danach trotzdem im Pool
+        log.debug(f"LLM-Vorwärmen: {e}")
+
+
+async def _warm_tts(tts_instance: Any, timeout_s: float) -> None:
+    opts = getattr(tts_instance, "_opts", None)
+    if opts is None or not hasattr(opts, "get_endpoint_url"):
+        return
+    import aiohttp
+    from livekit.agents.utils import http_context
+
+    async def one() -> None:
+        try:
+            # gleiche aiohttp-Session wie azure.TTS (http_context des Jobs)
+            async with http_context.http_session().options(
+                opts.get_endpoint_url(), timeout=aiohttp.ClientTimeout(total=timeout_s)
+            ) as resp:
+                await resp.read()
+        except Exception as e:
+            log.debug(f"TTS-Vorwärmen: {e}")
+
+    # gleichzeitige Requests -> SPEECH_POOL_SIZE getrennte Keep-Alive-Verbindungen (Sätze werden überlappend synthetisiert)
+    await asyncio.gather(*(one() for _ in range(tts_pool_size())))
+
+
+async def warm_connections(session: Any, cfg: Optional[Dict[str, Any]] = None) -> None:
+    """Verbindungen der Session-Plugins öffnen; Fehler werden ignoriert (der echte Request verbindet dann selbst)."""
+    cfg = cfg or _get_call_setup_config()
+    if not cfg["warmup"]:
+        return
+    t0 = time.perf_counter()
+    await asyncio.gather(
+        _warm_llm(getattr(session, "llm", None), cfg["warmup_timeout_s"]),
+        _warm_tts(getattr(session, "tts", None), cfg["warmup_timeout_s"]),
+    )
+    SETUP_SECONDS.labels(step="warmup").observe(time.perf_counter() - t0)
+
+
+class ConnectionWarmup:
+    """Vorwärmen im Hintergrund; aclose für den Job-Shutdown (falls der Anrufer vorher auflegt)."""
+
+    def __init__(self, session: Any):
+        self.session = session
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(warm_connections(self.session), name="call_setup_warmup")
+
+    async def aclose(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+
+def start_warmup(session: Any) -> ConnectionWarmup:
+    warmup = ConnectionWarmup(session)
+    warmup.start()
+    return warmup
+
+
+# ---- Messung ----
+
+class PickupTimer:
+    """Misst Abheben (Anrufer im Raum) bis zum ersten agent_state 'speaking' und den Aufbau davor."""
+
+    def __init__(self, recorder: Any = None):
+        self.recorder = recorder
+        self.started_at = time.time()
+        self.pickup_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self._session: Any = None
+
+    def wait_for_participant(self, waiter: Awaitable[Any]) -> "asyncio.Future[Any]":
+        """Teilnehmer-Wartezeit als Task; der Zeitpunkt des Abhebens wird beim Eintreffen gemerkt."""
+        task = asyncio.ensure_future(waiter)
+        task.add_done_callback(self._on_pickup)
+        return task
+
+    def _on_pickup(self, task: "asyncio.Future[Any]") -> None:
+        if not task.cancelled() and task.exception() is None:
+            self.pickup_at = time.time()
+            SETUP_SECONDS.labels(step="participant_wait").observe(self.pickup_at - self.started_at)
+
+    def setup_done(self) -> None:
+        """Session/Agent fertig aufgebaut (vor session.start)."""
+        self.ready_at = time.time()
+        SETUP_SECONDS.labels(step="build").observe(self.ready_at - self.started_at)
+
+    def attach(self, session: Any) -> "PickupTimer":
+        self._session = session
+        session.on("agent_state_changed", self._on_agent_state)
+        return self
+
+    def _on_agent_state(self, ev: Any) -> None:
+        if ev.new_state != "speaking" or self.pickup_at is None:
+            return
+        self._session.off("agent_state_changed", self._on_agent_state)
+        first_audio_s = max(0.0, ev.created_at - self.pickup_at)
+        PICKUP_TO_FIRST_AUDIO.observe(first_audio_s)
+        # > 0: so lange lief der Aufbau noch, nachdem der Anrufer schon da war
+        setup_after_pickup_s = max(0.0, (self.ready_at or self.pickup_at) - self.pickup_at)
+        log.info(f"Abheben bis erstes Audio: {first_audio_s * 1000:.0f} ms (Aufbau nach Abheben: {setup_after_pickup_s * 1000:.0f} ms)")
+        if self.recorder is not None:
+            self.recorder.record("first_audio", pickup_to_first_audio_s=round(first_audio_s, 3),
+                                 setup_after_pickup_s=round(setup_after_pickup_s, 3))
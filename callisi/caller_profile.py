@@ -0,0 +1,282 @@
+"""
+Anruferprofil (Stammgast, offene Buchungen, bevorzugte Sprache) – parallel zur Begrüßung geladen.
+- Lokaler Cache in SQLite, Schlüssel = gesalzener Hash der Telefonnummer (keine Nummer im Klartext gespeichert);
+  ohne CALLER_PROFILE_SALT wird ein zufälliges Salz erzeugt und neben der DB abgelegt (<db>.salt) – ein bekanntes
+  Salz macht die Hashes bei dem kleinen Nummernraum umkehrbar
+- Optional CRM/n8n (CALLER_PROFILE_URL) als zweite Quelle, gleichzeitig abgefragt, mit Timeout + Circuit-Breaker
+- Ergebnis geht als Systemnachricht in den Agent-Kontext: Stammgäste bekommen Antworten ohne zusätzliche Tool-Calls
+- Am Anrufende werden Name, Sprache und neue Buchungen für den nächsten Anruf gemerkt
+- Aufbewahrung begrenzt (CALLER_PROFILE_RETENTION_DAYS); CALLER_PROFILES=0 schaltet ab
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from callisi import metrics
+from callisi.booking_queue import get_booking_queue
+from callisi.circuit_breaker import CircuitOpenError, get_breaker
+
+log = logging.getLogger("callisi.caller_profile")
+
+PROFILE_LOOKUP = metrics.histogram(
+    "callisi_caller_profile_seconds", "Dauer der Profilabfrage je Quelle", labels=("source",),
+)
+PROFILE_RESULT = metrics.counter(
+    "callisi_caller_profile_total", "Profilabfragen nach Ergebnis", labels=("outcome",),
+)
+
+
+def _get_caller_profile_config() -> Dict[str, Any]:
+    return {
+        "enabled": os.getenv("CALLER_PROFILES", "1").strip().lower() not in ("0", "false", "no", "off"),
+        "db_path": os.getenv("CALLER_PROFILE_DB_PATH", "data/caller_profiles.sqlite3"),
+        "salt": os.getenv("CALLER_PROFILE_SALT", "").strip(),
+        "retention_days": float(os.getenv("CALLER_PROFILE_RETENTION_DAYS", "365")),
+        "crm_url": os.getenv("CALLER_PROFILE_URL", ""),
+        "timeout_s": float(os.getenv("CALLER_PROFILE_TIMEOUT_MS", "800")) / 1000,
+    }
+
+
+def parse_caller_phone(metadata: Any) -> Optional[str]:
+    """Anrufernummer aus Teilnehmer-Metadaten (dict oder JSON-String); None, wenn nicht lesbar."""
+    try:
+        meta = metadata if isinstance(metadata, dict) else json.loads(metadata or "{}")
+        return meta.get("caller_phone") or meta.get("from") or meta.get("caller")
+    except (ValueError, AttributeError):
+        return None
+
+
+def normalize_phone(phone: str) -> str:
+    digits = "".join(ch for ch in phone if ch.isdigit())
+    if phone.strip().startswith("+"):
+        return digits
+    if digits.startswith("00"):
+        return digits[2:]
+    if digits.startswith("0"):
+        return "49" + digits[1:]  # nationale Nummer -> DE
+    return digits
+
+
+class CallerProfileStore:
+    """SQLite-Cache der Profile; synchron (vom Loop aus via asyncio.to_thread)."""
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS caller_profiles (
+            phone_key TEXT PRIMARY KEY,
+            name TEXT,
+            language TEXT,
+            calls INTEGER NOT NULL DEFAULT 0,
+            bookings TEXT NOT NULL DEFAULT '[]',
+            first_call_at REAL NOT NULL,
+            last_call_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, db_path: str, salt: str, retention_days: float):
+        parent = os.path.dirname(db_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.salt = salt
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self._SCHEMA)
+        cutoff = time.time() - retention_days * 86400
+        self._conn.execute("DELETE FROM caller_profiles WHERE last_call_at < ?", (cutoff,))
+
+    def key(self, phone: str) -> str:
+        return hashlib.sha256(f"{self.salt}|{normalize_phone(phone)}".encode("utf-8")).hexdigest()
+
+    def get(self, phone: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM caller_profiles WHERE phone_key = ?", (self.key(phone),)).fetchone()
+        if row is None:
+            return None
+        profile = dict(row)
+        profile["bookings"] = json.loads(profile["bookings"] or "[]")
+        return profile
+
+    def remember(self, phone: str, name: Optional[str] = None, language: Optional[str] = None,
+                 booking: Optional[Dict[str, Any]] = None) -> None:
+        """Anruf zählen; Name/Sprache überschreiben, neue Buchung anhängen (max. 10 je Profil)."""
+        key = self.key(phone)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT bookings FROM caller_profiles WHERE phone_key = ?", (key,)).fetchone()
+            bookings = json.loads(row["bookings"]) if row else []
+            if booking and booking.get("ref") not in {b.get("ref") for b in bookings}:
+                bookings = (bookings + [booking])[-10:]
+            self._conn.execute(
+                "INSERT INTO caller_profiles (phone_key, name, language, calls, bookings, first_call_at, last_call_at) "
+                "VALUES (?, ?, ?, 1, ?, ?, ?) "
+                "ON CONFLICT(phone_key) DO UPDATE SET name = COALESCE(excluded.name, name), "
+                "language = COALESCE(excluded.language, language), calls = calls + 1, "
+                "bookings = excluded.bookings, last_call_at = excluded.last_call_at",
+                (key, name, language, json.dumps(bookings, ensure_ascii=False), now, now),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[CallerProfileStore] = None
+_store_lock = threading.Lock()
+
+# frühere Standardwerte (Code bzw. .env.example) – öffentlich bekannt, daher wie "nicht gesetzt"
+_PUBLIC_SALTS = ("", "callisi", "bitte-ändern")
+
+
+def _salt(cfg: Dict[str, Any]) -> str:
+    """CALLER_PROFILE_SALT oder ein zufälliges, persistiertes Salz (alle Job-Prozesse lesen dieselbe Datei)."""
+    if cfg["salt"] not in _PUBLIC_SALTS:
+        return cfg["salt"]
+    if cfg["salt"]:
+        log.warning("CALLER_PROFILE_SALT ist ein öffentlicher Beispielwert – nutze zufälliges Salz")
+    path = cfg["db_path"] + ".salt"
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass  # schon erzeugt (auch von einem parallelen Prozess)
+    else:
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+    for _ in range(50):
+        with open(path, "r") as f:
+            salt = f.read().strip()
+        if salt:
+            return salt
+        time.sleep(0.01)  # anderer Prozess schreibt gerade
+    raise RuntimeError(f"Salz-Datei leer: {path}")
+
+
+def get_caller_profile_store() -> CallerProfileStore:
+    """Prozessweiter Store (lazy)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            cfg = _get_caller_profile_config()
+            _store = CallerProfileStore(cfg["db_path"], _salt(cfg), cfg["retention_days"])
+        return _store
+
+
+# ---- Abfrage ----
+
+def _open_bookings(bookings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Buchungen mit Abreise/Anreise ab heute, Status aus der Buchungs-Queue."""
+    today = date.today().isoformat()
+    queue = get_booking_queue()
+    result = []
+    for b in bookings:
+        if str(b.get("departure") or b.get("arrival") or "")[:10] < today:
+            continue
+        row = queue.get(b["ref"]) if b.get("ref") else None
+        result.append(dict(b, status=row["status"] if row else b.get("status", "unbekannt")))
+    return result
+
+
+def _local_profile(phone: str) -> Optional[Dict[str, Any]]:
+    t0 = time.perf_counter()
+    try:
+        profile = get_caller_profile_store().get(phone)
+        if profile is not None:
+            profile["open_bookings"] = _open_bookings(profile.pop("bookings"))
+        return profile
+    finally:
+        PROFILE_LOOKUP.labels(source="local").observe(time.perf_counter() - t0)
+
+
+async def _crm_profile(url: str, phone: str, timeout_s: float) -> Optional[Dict[str, Any]]:
+    t0 = time.perf_counter()
+    try:
+        async with get_breaker("crm").guard():
+            async with httpx.AsyncClient(timeout=timeout_s) as client:
+                r = await client.post(url, json={"action": "caller_profile", "phone": phone})
+            if r.status_code >= 500:
+                raise RuntimeError(f"Status {r.status_code}")
+        if r.status_code != 200:
+            return None
+        data = r.json()
+        return data if isinstance(data, dict) and data else None
+    finally:
+        PROFILE_LOOKUP.labels(source="crm").observe(time.perf_counter() - t0)
+
+
+async def fetch_caller_profile(phone: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Lokaler Cache und CRM gleichzeitig; None bei unbekanntem Anrufer, Fehler oder Timeout."""
+    cfg = _get_caller_profile_config()
+    if not cfg["enabled"] or not phone:
+        return None
+    lookups = [asyncio.to_thread(_local_profile, phone)]
+    if cfg["crm_url"]:
+        lookups.append(_crm_profile(cfg["crm_url"], phone, cfg["timeout_s"]))
+    try:
+        results = await asyncio.wait_for(asyncio.gather(*lookups, return_exceptions=True), cfg["timeout_s"] + 0.2)
+    except asyncio.TimeoutError:
+        PROFILE_RESULT.labels(outcome="timeout").inc()
+        log.warning("Anruferprofil: Timeout")
+        return None
+    profile: Dict[str, Any] = {}
+    for result in results:
+        if isinstance(result, CircuitOpenError):
+            continue
+        if isinstance(result, Exception):
+            log.warning(f"Anruferprofil: Quelle fehlgeschlagen: {result}")
+            continue
+        if result:
+            profile.update({k: v for k, v in result.items() if v not in (None, "", [])})
+    PROFILE_RESULT.labels(outcome="known" if profile else "unknown").inc()
+    return profile or None
+
+
+_BOOKING_LABELS = {"arrival": "Anreise", "departure": "Abreise", "apartment": "Apartment", "status": "Status"}
+
+
+def profile_instructions(profile: Dict[str, Any]) -> str:
+    """Systemnachricht für den Agent-Kontext."""
+    lines = ["Anruferprofil (aus früheren Anrufen, nicht vorlesen; nur nutzen, wenn passend):"]
+    calls = int(profile.get("calls") or 0)
+    if calls:
+        last = time.strftime("%d.%m.%Y", time.localtime(profile["last_call_at"])) if profile.get("last_call_at") else "?"
+        lines.append(f"- Stammgast: {calls} frühere Anrufe, zuletzt am {last}")
+    if profile.get("name"):
+        lines.append(f"- Name: {profile['name']}")
+    if profile.get("language"):
+        lines.append(f"- Bevorzugte Sprache: {profile['language']}")
+    for b in profile.get("open_bookings") or []:
+        details = ", ".join(f"{label} {b[k]}" for k, label in _BOOKING_LABELS.items() if b.get(k))
+        lines.append(f"- Offene Buchung {b.get('ref', '?')}: {details}")
+    return "\n".join(lines)
+
+
+async def remember_caller(phone: Optional[str], facts: Dict[str, str], language: Optional[str] = None) -> None:
+    """Anrufende: Profil aus den gesammelten Fakten (ContextWindow.facts) fortschreiben."""
+    if not _get_caller_profile_config()["enabled"] or not phone:
+        return
+    booking = None
+    if facts.get("Buchungsreferenz"):
+        booking = {
+            "ref": facts["Buchungsreferenz"],
+            "arrival": facts.get("Anreise") or facts.get("Anreise/Termin"),
+            "departure": facts.get("Abreise"),
+            "apartment": facts.get("Apartment"),
+        }
+    try:
+        await asyncio.to_thread(get_caller_profile_store().remember, phone, facts.get("Name"), language, booking)
+    except Exception as e:
+        log.warning(f"Anruferprofil konnte nicht gespeichert werden: {e}")
@@ -0,0 +1,260 @@
+"""
+Begrenzter Chat-Kontext für lange Anrufe (über Agent.llm_node, der gespeicherte Verlauf bleibt unverändert).
+- Ältere Tool-Ergebnisse (z.B. query_kb-Treffer samt Metadaten) werden durch einen Kurzvermerk ersetzt;
+  die letzten CONTEXT_KEEP_TOOL_OUTPUTS bleiben vollständig
+- Ab CONTEXT_SUMMARY_TOKENS fasst das Session-LLM frühere Turns im Hintergrund zusammen (blockiert keinen Turn);
+  die Zusammenfassung ersetzt diese Turns, die letzten CONTEXT_KEEP_ITEMS Einträge bleiben wörtlich
+- Harte Grenze CONTEXT_MAX_TOKENS: älteste Turns fallen weg, falls die Zusammenfassung (noch) nicht reicht
+- Buchungsrelevante Fakten (Name, Daten, Telefon, Apartment, Referenz) werden mitgeschrieben und gepinnt,
+  sobald der Originalverlauf gekürzt ist
+- Metriken pro LLM-Aufruf: geschätzte Kontext-Tokens vor/nach dem Kürzen, tatsächliche Prompt-Tokens (LLMMetrics)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Set
+
+from livekit.agents import llm
+
+from callisi import metrics
+
+log = logging.getLogger("callisi.chat_context")
+
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 12000, 16000, 32000)
+
+CONTEXT_TOKENS = metrics.histogram(
+    "callisi_llm_context_tokens_estimated", "Geschätzte Kontext-Tokens pro LLM-Aufruf (raw = ungekürzt, sent = gesendet)",
+    labels=("stage",), buckets=TOKEN_BUCKETS,
+)
+PROMPT_TOKENS = metrics.histogram(
+    "callisi_llm_prompt_tokens", "Prompt-Tokens pro LLM-Aufruf laut LLMMetrics", buckets=TOKEN_BUCKETS,
+)
+PROMPT_CACHED_TOKENS = metrics.histogram(
+    "callisi_llm_prompt_cached_tokens", "Davon aus dem Prompt-Cache", buckets=TOKEN_BUCKETS,
+)
+SUMMARIES = metrics.counter(
+    "callisi_context_summaries_total", "Zusammenfassungen des Gesprächsverlaufs", labels=("outcome",),
+)
+
+SUMMARY_INSTRUCTIONS = (
+    "Fasse den bisherigen Verlauf eines Telefonats zwischen einem Anrufer und der Assistentin Clara "
+    "(Ferienapartments) stichpunktartig auf Deutsch zusammen. Behalte: Anliegen, offene Fragen, gegebene Auskünfte, "
+    "Zusagen, Buchungsdaten (Name, Daten, Telefon, Apartment, Referenz) wörtlich. Keine Einleitung, höchstens 120 Wörter."
+)
+
+# Tool-Argumente, die als Buchungsfakten gepinnt werden (Feld -> Bezeichnung)
+FACT_FIELDS: Dict[str, str] = {
+    "customer_name": "Name",
+    "phone": "Telefon",
+    "datetime_iso": "Anreise/Termin",
+    "checkin_iso": "Anreise",
+    "checkout_iso": "Abreise",
+    "apartment": "Apartment",
+    "service": "Leistung",
+}
+
+_NAME_CUE = re.compile(r"(?i:mein name ist|ich hei(?:ß|ss)e|hier ist)\s+([A-ZÄÖÜ][a-zäöüß]+(?:[ -][A-ZÄÖÜ][a-zäöüß]+)?)")
+_PHONE = re.compile(r"(?<![\w+])((?:\+|00)[1-9]\d{0,2}|0\d{2,4})(?:[ /-]?\d){5,11}(?!\d)")
+_REFERENCE = re.compile(r"Referenz (\S+?)[),.]")
+
+
+def _get_chat_context_config() -> Dict[str, Any]:
+    return {
+        "enabled": os.getenv("CONTEXT_MANAGEMENT", "1").strip().lower() not in ("0", "false", "no", "off"),
+        "keep_tool_outputs": int(os.getenv("CONTEXT_KEEP_TOOL_OUTPUTS", "2")),
+        "keep_items": int(os.getenv("CONTEXT_KEEP_ITEMS", "12")),
+        "summary_tokens": int(os.getenv("CONTEXT_SUMMARY_TOKENS", "2500")),
+        "max_tokens": int(os.getenv("CONTEXT_MAX_TOKENS", "6000")),
+        "chars_per_token": float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "3.5")),
+        "summary_timeout_s": float(os.getenv("CONTEXT_SUMMARY_TIMEOUT_MS", "8000")) / 1000,
+    }
+
+
+def _item_text(item: Any) -> str:
+    if item.type == "message":
+        return item.text_content or ""
+    if item.type == "function_call":
+        return f"{item.name}({item.arguments})"
+    if item.type == "function_call_output":
+        return item.output or ""
+    return ""
+
+
+def _render(item: Any) -> str:
+    """Eine Zeile pro Eintrag für den Zusammenfassungs-Prompt."""
+    if item.type == "message":
+        speaker = {"user": "Anrufer", "assistant": "Clara"}.get(item.role, item.role)
+        return f"{speaker}: {item.text_content or ''}"
+    if item.type == "function_call":
+        return f"[Tool {item.name}: {item.arguments}]"
+    if item.type == "function_call_output":
+        return f"[Ergebnis {item.name}: {(item.output or '')[:300]}]"
+    return ""
+
+
+class ContextWindow:
+    """Pro Anruf: bereitet den Chat-Kontext für jeden LLM-Aufruf auf und sammelt Buchungsfakten."""
+
+    def __init__(self, cfg: Optional[Dict[str, Any]] = None):
+        self.cfg = cfg or _get_chat_context_config()
+        self.facts: Dict[str, str] = {}
+        self.summary = ""
+        self.recorder: Any = None
+        self._summarized_ids: Set[str] = set()
+        self._seen_ids: Set[str] = set()
+        self._summary_task: Optional[asyncio.Task] = None
+
+    def attach(self, session: Any, recorder: Any = None) -> "ContextWindow":
+        self.recorder = recorder
+        session.on("metrics_collected", self._on_metrics)
+        return self
+
+    def _on_metrics(self, ev: Any) -> None:
+        m = ev.metrics
+        if getattr(m, "type", None) == "llm_metrics" and not m.cancelled:
+            PROMPT_TOKENS.observe(m.prompt_tokens)
+            PROMPT_CACHED_TOKENS.observe(m.prompt_cached_tokens)
+
+    # ---- Schätzung ----
+
+    def estimate_tokens(self, items: List[Any]) -> int:
+        chars = sum(len(_item_text(item)) for item in items)
+        return int(chars / self.cfg["chars_per_token"]) + 4 * len(items)  # + Rollen-/Formatierungs-Overhead
+
+    # ---- Fakten ----
+
+    def _learn(self, items: List[Any]) -> None:
+        for item in items:
+            if item.id in self._seen_ids:
+                continue
+            self._seen_ids.add(item.id)
+            if item.type == "function_call":
+                try:
+                    args = json.loads(item.arguments or "{}")
+                except ValueError:
+                    continue
+                for field, label in FACT_FIELDS.items():
+                    value = args.get(field) if isinstance(args, dict) else None
+                    if value not in (None, ""):
+                        self.facts[label] = str(value)
+            elif item.type == "function_call_output" and item.name == "book_appointment":
+                m = _REFERENCE.search(item.output or "")
+                if m:
+                    self.facts["Buchungsreferenz"] = m.group(1)
+            elif item.type == "message" and item.role == "user":
+                text = item.text_content or ""
+                m = _NAME_CUE.search(text)
+                if m:
+                    self.facts.setdefault("Name", m.group(1))
+                m = _PHONE.search(text)
+                if m:
+                    self.facts.setdefault("Telefon", m.group(0))
+
+    def pinned_text(self) -> str:
+        if not self.facts:
+            return ""
+        return ("Gesicherte Angaben aus diesem Anruf (nicht erneut erfragen, für Buchung verwenden): "
+                + "; ".join(f"{k}: {v}" for k, v in self.facts.items()))
+
+    # ---- Aufbereitung ----
+
+    def _summary_cut(self, items: List[Any]) -> int:
+        """Index der letzten Nutzer-Nachricht vor den letzten keep_items (davor nur abgeschlossene Turns; 0 = nichts)."""
+        limit = len(items) - self.cfg["keep_items"]
+        cut = 0
+        for i, item in enumerate(items[:max(0, limit)]):
+            if i > 0 and item.type == "message" and item.role == "user":
+                cut = i
+        return cut
+
+    def prepare(self, chat_ctx: llm.ChatContext, summarizer: Any = None) -> llm.ChatContext:
+        """Kopie des Kontexts für diesen LLM-Aufruf: gekürzte Tool-Ergebnisse, Zusammenfassung, gepinnte Fakten."""
+        items = list(chat_ctx.items)
+        self._learn(items)
+        if not self.cfg["enabled"]:
+            return chat_ctx
+        raw_tokens = self.estimate_tokens(items)
+
+        system = [i for i in items if i.type == "message" and i.role == "system"]
+        skip = self._summarized_ids | {i.id for i in system}
+        history = [i for i in items if i.id not in skip]
+
+        # alte Tool-Ergebnisse durch Kurzvermerk ersetzen (Aufruf bleibt, damit die Paarung für die API stimmt)
+        outputs = [i for i, item in enumerate(history) if item.type == "function_call_output"]
+        keep = self.cfg["keep_tool_outputs"]
+        pruned = outputs[:-keep] if keep else outputs
+        for i in pruned:
+            history[i] = history[i].model_copy(update={"output": f"[{history[i].name}: älteres Ergebnis gekürzt]"})
+
+        dropped = 0
+        if self.estimate_tokens(system + history) > self.cfg["summary_tokens"]:
+            cut = self._summary_cut(history)
+            if cut and summarizer is not None and self._summary_task is None:
+                self._summary_task = asyncio.create_task(self._summarize(summarizer, history[:cut], self.summary))
+            while self.estimate_tokens(system + history) > self.cfg["max_tokens"]:
+                cut = self._summary_cut(history)
+                if not cut:
+                    break
+                dropped += cut
+                history = history[cut:]
+
+        head = list(system)
+        if self.summary or dropped:
+            if self.summary:
+                head.append(llm.ChatMessage(role="system", content=["Bisheriger Gesprächsverlauf (zusammengefasst):\n" + self.summary]))
+            pinned = self.pinned_text()
+            if pinned:
+                head.append(llm.ChatMessage(role="system", content=[pinned]))
+        prepared = llm.ChatContext(head + history)
+
+        sent_tokens = self.estimate_tokens(head + history)
+        CONTEXT_TOKENS.labels(stage="raw").observe(raw_tokens)
+        CONTEXT_TOKENS.labels(stage="sent").observe(sent_tokens)
+        if self.recorder is not None:
+            self.recorder.record("context", est_tokens_raw=raw_tokens, est_tokens_sent=sent_tokens,
+                                 pruned_outputs=len(pruned), summarized_items=len(self._summarized_ids), dropped_items=dropped)
+        return prepared
+
+    async def _summarize(self, summarizer: Any, items: List[Any], previous: str) -> None:
+        prompt = (f"Bisherige Zusammenfassung:\n{previous}\n\n" if previous else "") + \
+                 "Verlauf:\n" + "\n".join(filter(None, (_render(i) for i in items)))
+        ctx = llm.ChatContext.empty()
+        ctx.add_message(role="system", content=SUMMARY_INSTRUCTIONS)
+        ctx.add_message(role="user", content=prompt)
+
+        async def run() -> str:
+            parts: List[str] = []
+            async with summarizer.chat(chat_ctx=ctx) as stream:
+                async for chunk in stream:
+                    if chunk.delta and chunk.delta.content:
+                        parts.append(chunk.delta.content)
+            return "".join(parts).strip()
+
+        try:
+            summary = await asyncio.wait_for(run(), self.cfg["summary_timeout_s"])
+            if summary:
+                self.summary = summary
+                self._summarized_ids.update(i.id for i in items)
+                SUMMARIES.labels(outcome="ok").inc()
+                log.info(f"Verlauf zusammengefasst: {len(items)} Einträge -> {len(summary)} Zeichen")
+            else:
+                SUMMARIES.labels(outcome="empty").inc()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            SUMMARIES.labels(outcome="error").inc()
+            log.warning(f"Zusammenfassung fehlgeschlagen: {e}")
+        finally:
+            self._summary_task = None
+
+    async def aclose(self) -> None:
+        task = self._summary_task
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
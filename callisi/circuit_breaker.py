@@ -0,0 +1,184 @@
+"""
+Circuit Breaker pro externer Abhängigkeit (azure_openai, pinecone, n8n, twilio).
+- Gleitendes Zeitfenster: Fehlerquote und Anteil langsamer Aufrufe
+- open: sofortiger Fehler (CircuitOpenError) statt 20–30 s Timeout; nach CB_OPEN_SECONDS half_open mit Probe-Aufrufen
+- Zustand als Metrik (0=closed, 1=half_open, 2=open) und Zustandswechsel im Log
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Tuple
+
+from callisi import metrics
+
+log = logging.getLogger("callisi.circuit_breaker")
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CB_STATE = metrics.gauge(
+    "callisi_circuit_state", "Circuit-Breaker-Zustand (0=closed, 1=half_open, 2=open)", ["dependency"], multiprocess_mode="max",
+)
+CB_REJECTED = metrics.counter("callisi_circuit_rejected_total", "Wegen offenem Breaker abgewiesene Aufrufe", ["dependency"])
+CB_CALLS = metrics.counter("callisi_circuit_calls_total", "Aufrufe über Circuit Breaker", ["dependency", "outcome"])
+
+# Ab dieser Dauer gilt ein Aufruf als langsam (überschreibbar per CB_<NAME>_SLOW_CALL_MS)
+_DEFAULT_SLOW_CALL_MS = {"azure_openai": 1500, "pinecone": 1000, "n8n": 5000, "twilio": 5000}
+
+
+class CircuitOpenError(RuntimeError):
+    """Abhängigkeit gilt als gestört; Aufruf wurde nicht ausgeführt."""
+
+    def __init__(self, name: str, retry_in_s: float):
+        super().__init__(f"{name} vorübergehend nicht verfügbar (Circuit offen, neuer Versuch in {retry_in_s:.0f}s)")
+        self.name = name
+        self.retry_in_s = retry_in_s
+
+
+def _get_breaker_config(name: str) -> Dict[str, Any]:
+    prefix = f"CB_{name.upper()}_"
+
+    def env(key: str, default: str) -> str:
+        return os.getenv(prefix + key) or os.getenv("CB_" + key, default)
+
+    return {
+        "window_s": float(env("WINDOW_SECONDS", "30")),
+        "min_calls": int(env("MIN_CALLS", "5")),
+        "failure_rate": float(env("FAILURE_RATE", "0.5")),
+        "slow_call_s": float(env("SLOW_CALL_MS", str(_DEFAULT_SLOW_CALL_MS.get(name, 2000)))) / 1000,
+        "slow_rate": float(env("SLOW_RATE", "0.8")),
+        "open_s": float(env("OPEN_SECONDS", "15")),
+        "half_open_probes": int(env("HALF_OPEN_PROBES", "1")),
+        "max_window_calls": int(env("MAX_WINDOW_CALLS", "1000")),
+    }
+
+
+class CircuitBreaker:
+    """Thread-sicher, ohne asyncio-Primitive (nutzbar aus mehreren Loops)."""
+
+    def __init__(self, name: str, window_s: float = 30.0, min_calls: int = 5, failure_rate: float = 0.5,
+                 slow_call_s: float = 2.0, slow_rate: float = 0.8, open_s: float = 15.0, half_open_probes: int = 1,
+                 max_window_calls: int = 1000):
+        self.name = name
+        self.window_s = window_s
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_s = slow_call_s
+        self.slow_rate = slow_rate
+        self.open_s = open_s
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        # (ts, ok, slow); zusätzlich nach Anzahl begrenzt, damit Lastspitzen das Fenster nicht unbegrenzt wachsen lassen
+        self._calls: Deque[Tuple[float, bool, bool]] = deque(maxlen=max_window_calls)
+        self._lock = threading.Lock()
+        CB_STATE.labels(dependency=name).set(0)
+
+    def _transition(self, state: str, reason: str = "") -> None:
+        if state == self.state:
+            return
+        log.warning(f"Circuit '{self.name}': {self.state} -> {state}{f' ({reason})' if reason else ''}")
+        self.state = state
+        CB_STATE.labels(dependency=self.name).set(_STATE_VALUE[state])
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state in (OPEN, CLOSED):
+            self._calls.clear()
+            self._probes = 0
+
+    def _acquire(self) -> bool:
+        """True, wenn der Aufruf ein Half-Open-Probe ist; CircuitOpenError, wenn abgewiesen."""
+        with self._lock:
+            if self.state == OPEN:
+                waited = time.monotonic() - self._opened_at
+                if waited < self.open_s:
+                    CB_REJECTED.labels(dependency=self.name).inc()
+                    raise CircuitOpenError(self.name, self.open_s - waited)
+                self._transition(HALF_OPEN, "Probe")
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    CB_REJECTED.labels(dependency=self.name).inc()
+                    raise CircuitOpenError(self.name, 1.0)
+                self._probes += 1
+                return True
+            return False
+
+    def _record(self, ok: bool, duration_s: float, probe: bool) -> None:
+        slow = duration_s >= self.slow_call_s
+        CB_CALLS.labels(dependency=self.name, outcome="ok" if ok else "error").inc()
+        with self._lock:
+            if probe:
+                self._probes = max(0, self._probes - 1)
+                if self.state == HALF_OPEN:
+                    if ok and not slow:
+                        self._transition(CLOSED, "Probe erfolgreich")
+                    else:
+                        self._transition(OPEN, "Probe fehlgeschlagen" if not ok else "Probe zu langsam")
+                return
+            now = time.monotonic()
+            self._calls.append((now, ok, slow))
+            while self._calls and now - self._calls[0][0] > self.window_s:
+                self._calls.popleft()
+            n = len(self._calls)
+            if self.state != CLOSED or n < self.min_calls:
+                return
+            failures = sum(1 for _, c_ok, _ in self._calls if not c_ok)
+            slows = sum(1 for _, _, c_slow in self._calls if c_slow)
+            if failures / n >= self.failure_rate:
+                self._transition(OPEN, f"Fehlerquote {failures}/{n}")
+            elif slows / n >= self.slow_rate:
+                self._transition(OPEN, f"langsame Aufrufe {slows}/{n}")
+
+    def _release(self, probe: bool) -> None:
+        if probe:
+            with self._lock:
+                self._probes = max(0, self._probes - 1)
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[None]:
+        """`async with breaker.guard(): ...` – Exceptions im Block zählen als Fehler, Abbruch (Cancel) zählt nicht."""
+        probe = self._acquire()
+        t0 = time.monotonic()
+        recorded = False
+        try:
+            yield
+        except Exception:
+            recorded = True
+            self._record(False, time.monotonic() - t0, probe)
+            raise
+        else:
+            recorded = True
+            self._record(True, time.monotonic() - t0, probe)
+        finally:
+            if not recorded:
+                self._release(probe)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"name": self.name, "state": self.state, "calls_in_window": len(self._calls)}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Prozessweiter Breaker je Abhängigkeit (Konfiguration aus CB_* / CB_<NAME>_*)."""
+    with _breakers_lock:
+        cb = _breakers.get(name)
+        if cb is None:
+            cb = CircuitBreaker(name, **_get_breaker_config(name))
+            _breakers[name] = cb
+        return cb
+
+
+def breaker_states() -> Dict[str, str]:
+    with _breakers_lock:
+        return {name: cb.state for name, cb in _breakers.items()}
@@ -0,0 +1,186 @@
+"""
+Embeddings für query_kb und ingest_kb.
+- Azure OpenAI über AsyncAzureOpenAI (blockiert den Event-Loop nicht, ist abbrechbar)
+- Client wird pro Event-Loop gecacht -> Keep-Alive statt TLS-Handshake bei jeder Frage
+- aclose_clients() beim Job-Shutdown schließt die Verbindungen des Loops
+- Optional lokal (EMBED_BACKEND=local): kleines mehrsprachiges ONNX-Modell (z.B. multilingual-e5-small, quantisiert)
+  auf der CPU im Worker – kein Netz-Roundtrip vor der Vektorsuche, Anfragetexte verlassen den Server nicht
+- Lokales Modell: LOCAL_EMBED_MODEL_DIR mit model.onnx (bzw. LOCAL_EMBED_MODEL_FILE) und tokenizer.json;
+  braucht onnxruntime + tokenizers; Index und Anfragen müssen dasselbe Modell nutzen (ingest_kb --backend)
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+from callisi import metrics
+from callisi.quota import get_quota_governor, is_rate_limited, retry_after_s
+
+log = logging.getLogger("callisi.embeddings")
+
+EMBED_SECONDS = metrics.histogram(
+    "callisi_embed_seconds", "Dauer eines Embedding-Aufrufs je Backend", labels=("backend",),
+)
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str, str], Any]]" = weakref.WeakKeyDictionary()
+
+
+def _get_embedding_config() -> Dict[str, Any]:
+    return {
+        "backend": os.getenv("EMBED_BACKEND", "azure").strip().lower(),
+        "model_dir": os.getenv("LOCAL_EMBED_MODEL_DIR", "models/multilingual-e5-small"),
+        "model_file": os.getenv("LOCAL_EMBED_MODEL_FILE", "model.onnx"),
+        # e5-Modelle erwarten Präfixe; für Modelle ohne Präfix leer setzen
+        "query_prefix": os.getenv("LOCAL_EMBED_QUERY_PREFIX", "query: "),
+        "passage_prefix": os.getenv("LOCAL_EMBED_PASSAGE_PREFIX", "passage: "),
+        "max_tokens": int(os.getenv("LOCAL_EMBED_MAX_TOKENS", "512")),
+        "pooling": os.getenv("LOCAL_EMBED_POOLING", "mean").strip().lower(),
+        # 1 Thread: der Worker teilt sich die CPU mit VAD/Audio mehrerer Anrufe
+        "threads": int(os.getenv("LOCAL_EMBED_THREADS", "1")),
+    }
+
+
+def embed_backend() -> str:
+    """'local' oder 'azure' (Standard)."""
+    return "local" if _get_embedding_config()["backend"] == "local" else "azure"
+
+
+# ---- Azure ----
+
+def _azure_client(cfg: Dict[str, str]) -> Any:
+    from openai import AsyncAzureOpenAI  # OpenAI SDK >=1.43
+    loop = asyncio.get_running_loop()
+    per_loop = _clients.setdefault(loop, {})
+    key = (cfg["endpoint"], cfg["api_version"], cfg["api_key"])
+    client = per_loop.get(key)
+    if client is None:
+        client = AsyncAzureOpenAI(api_key=cfg["api_key"], api_version=cfg["api_version"], azure_endpoint=cfg["endpoint"])
+        per_loop[key] = client
+    return client
+
+
+async def azure_embed(texts: List[str], cfg: Dict[str, str]) -> List[List[float]]:
+    """Embeddings über Azure; cfg wie _get_azure_embed_config() der Agents."""
+    client = _azure_client(cfg)
+    t0 = time.perf_counter()
+    # Azure erwartet bei .create model=<DEPLOYMENTNAME>
+    try:
+        r = await client.embeddings.create(model=cfg["deployment"], input=texts)
+    except Exception as e:
+        if is_rate_limited(e):  # 429: alle Prozesse des Workers pausieren Embeddings gemeinsam
+            governor = get_quota_governor()
+            governor.throttle("embed_requests", retry_after_s(e, governor.cfg["throttle_default_s"]))
+        raise
+    EMBED_SECONDS.labels(backend="azure").observe(time.perf_counter() - t0)
+    return [d.embedding for d in r.data]
+
+
+async def aclose_clients() -> None:
+    """Schließt die Clients des laufenden Loops (ein Loop = ein Job, Thread- wie Prozess-Executor)."""
+    per_loop = _clients.pop(asyncio.get_running_loop(), None) or {}
+    for client in per_loop.values():
+        try:
+            await client.close()
+        except Exception:
+            pass
+
+
+# ---- Lokal (ONNX, CPU) ----
+
+class LocalEmbedder:
+    """ONNX-Encoder + HF-Tokenizer; Mean-Pooling (oder CLS) und L2-Normierung wie sentence-transformers."""
+
+    def __init__(self, cfg: Optional[Dict[str, Any]] = None):
+        self.cfg = cfg or _get_embedding_config()
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise RuntimeError(f"Lokale Embeddings brauchen onnxruntime und tokenizers: {e}")
+        model_dir = self.cfg["model_dir"]
+        model_path = os.path.join(model_dir, self.cfg["model_file"])
+        if not os.path.exists(model_path):
+            model_path = os.path.join(model_dir, "onnx", self.cfg["model_file"])  # Layout der HF-ONNX-Exporte
+        if not os.path.exists(model_path):
+            raise RuntimeError(f"Lokales Embedding-Modell nicht gefunden: {self.cfg['model_file']} in {model_dir} "
+                               f"(LOCAL_EMBED_MODEL_DIR)")
+        self.model_id = f"local:{os.path.basename(os.path.normpath(model_dir))}/{self.cfg['model_file']}"
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.cfg["max_tokens"])
+        self.tokenizer.enable_padding()
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = max(1, self.cfg["threads"])
+        opts.inter_op_num_threads = 1
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+        self.dimension = len(self.embed(["dimension"])[0])
+        log.info(f"Lokales Embedding-Modell geladen: {model_path} ({self.dimension} Dimensionen)")
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def embed(self, texts: List[str], kind: str = "query") -> List[List[float]]:
+        """Synchron (Aufrufer im Loop: asyncio.to_thread); kind 'query' oder 'passage' bestimmt das Präfix."""
+        import numpy as np
+
+        prefix = self.cfg["query_prefix"] if kind == "query" else self.cfg["passage_prefix"]
+        encodings = self.tokenizer.encode_batch([prefix + t for t in texts])
+        ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+        mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self._inputs:
+            feed["token_type_ids"] = np.zeros_like(ids)
+        out = self.session.run(None, {k: v for k, v in feed.items() if k in self._inputs})[0]
+        if out.ndim == 3:  # last_hidden_state -> Satzvektor
+            if self.cfg["pooling"] == "cls":
+                out = out[:, 0]
+            else:
+                weights = mask[..., None].astype(np.float32)
+                out = (out * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        out = out / np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out.astype(np.float32).tolist()
+
+
+_local: Optional[LocalEmbedder] = None
+_local_lock = threading.Lock()
+
+
+def get_local_embedder() -> LocalEmbedder:
+    """Prozessweites Modell (lazy; im Worker schon in prewarm geladen)."""
+    global _local
+    with _local_lock:
+        if _local is None:
+            _local = LocalEmbedder()
+        return _local
+
+
+async def local_embed(texts: List[str], kind: str = "query") -> List[List[float]]:
+    t0 = time.perf_counter()
+    # auch das (einmalige) Laden im Thread, falls prewarm es nicht erledigt hat
+    vectors = await asyncio.to_thread(lambda: get_local_embedder().embed(texts, kind))
+    EMBED_SECONDS.labels(backend="local").observe(time.perf_counter() - t0)
+    return vectors
+
+
+def embedding_id(deployment: Optional[str] = None) -> str:
+    """Kennung des aktiven Modells (Checkpoint-Signatur von ingest_kb)."""
+    if embed_backend() == "local":
+        return get_local_embedder().model_id
+    return f"azure:{deployment or ''}"
+
+
+def prewarm_embeddings() -> None:
+    """prewarm: lokales Modell laden (ONNX-Session, erste Inferenz), bevor der Prozess einen Anruf annimmt."""
+    if embed_backend() != "local":
+        return
+    try:
+        get_local_embedder()
+    except Exception as e:
+        log.error(f"Lokales Embedding-Modell nicht ladbar: {e}")
@@ -0,0 +1,168 @@
+"""
+VAD-/Endpointing-Konfiguration und adaptives Endpointing pro Anrufer.
+- Silero-VAD und AgentSession-Endpointing aus ENV (VAD_*, ENDPOINTING_*, TURN_DETECTION)
+- Misst pro Turn: Sprechende des Anrufers -> Antwortbeginn von Clara (Metrik + Call-Record)
+- Adaptiv (ENDPOINTING_ADAPTIVE=1): Pausen, nach denen der Anrufer weiterspricht, bestimmen die
+  Stillezeit bis zum Turn-Ende (min_endpointing_delay) – in festen Grenzen, per session.update_options
+"""
+
+import logging
+import math
+import os
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from callisi import metrics
+
+log = logging.getLogger("callisi.endpointing")
+
+TURN_RESPONSE = metrics.histogram(
+    "callisi_turn_response_seconds", "Sprechende des Anrufers bis Antwortbeginn des Agents",
+)
+EOU_DELAY = metrics.histogram(
+    "callisi_end_of_utterance_delay_seconds", "Sprechende bis Turn-Ende (VAD/Endpointing) laut LiveKit-Metrik",
+)
+ENDPOINTING_DELAY = metrics.histogram(
+    "callisi_endpointing_delay_seconds", "Gesetzte min_endpointing_delay nach Anpassung",
+)
+
+_TURN_DETECTION_MODES = ("vad", "stt", "realtime_llm", "manual")
+
+
+def _ms(name: str, default: str) -> float:
+    return float(os.getenv(name, default)) / 1000
+
+
+def _get_endpointing_config() -> Dict[str, Any]:
+    return {
+        "turn_detection": os.getenv("TURN_DETECTION", "vad").strip().lower(),
+        "vad_min_speech_s": _ms("VAD_MIN_SPEECH_MS", "50"),
+        "vad_min_silence_s": _ms("VAD_MIN_SILENCE_MS", "550"),
+        "vad_prefix_padding_s": _ms("VAD_PREFIX_PADDING_MS", "500"),
+        "vad_activation_threshold": float(os.getenv("VAD_ACTIVATION_THRESHOLD", "0.5")),
+        "min_delay_s": _ms("ENDPOINTING_MIN_DELAY_MS", "500"),
+        "max_delay_s": _ms("ENDPOINTING_MAX_DELAY_MS", "6000"),
+        "adaptive": os.getenv("ENDPOINTING_ADAPTIVE", "0").strip().lower() in ("1", "true", "yes", "on"),
+        "adaptive_floor_s": _ms("ENDPOINTING_ADAPTIVE_MIN_MS", "300"),
+        "adaptive_ceiling_s": _ms("ENDPOINTING_ADAPTIVE_MAX_MS", "1500"),
+        "adaptive_quantile": float(os.getenv("ENDPOINTING_ADAPTIVE_QUANTILE", "90")),
+        "adaptive_margin_s": _ms("ENDPOINTING_ADAPTIVE_MARGIN_MS", "150"),
+        "adaptive_min_samples": int(os.getenv("ENDPOINTING_ADAPTIVE_MIN_SAMPLES", "3")),
+        "cutoff_window_s": _ms("ENDPOINTING_CUTOFF_WINDOW_MS", "1500"),
+    }
+
+
+def vad_options(cfg: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Argumente für silero.VAD.load(**vad_options())."""
+    cfg = cfg or _get_endpointing_config()
+    return {
+        "min_speech_duration": cfg["vad_min_speech_s"],
+        "min_silence_duration": cfg["vad_min_silence_s"],
+        "prefix_padding_duration": cfg["vad_prefix_padding_s"],
+        "activation_threshold": cfg["vad_activation_threshold"],
+    }
+
+
+def session_options(cfg: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Argumente für AgentSession(**session_options(), ...)."""
+    cfg = cfg or _get_endpointing_config()
+    mode = cfg["turn_detection"]
+    if mode not in _TURN_DETECTION_MODES:
+        log.warning(f"TURN_DETECTION={mode!r} unbekannt, nutze 'vad'")
+        mode = "vad"
+    return {
+        "turn_detection": mode,
+        "min_endpointing_delay": cfg["min_delay_s"],
+        "max_endpointing_delay": cfg["max_delay_s"],
+    }
+
+
+class EndpointingTuner:
+    """Hängt an den Session-Events: misst Antwortlatenz pro Turn und passt optional das Endpointing an."""
+
+    def __init__(self, session: Any, recorder: Any = None, cfg: Optional[Dict[str, Any]] = None):
+        self.cfg = cfg or _get_endpointing_config()
+        self.session = session
+        self.recorder = recorder
+        self.delay_s = self.cfg["min_delay_s"]
+        self.pauses: Deque[float] = deque(maxlen=20)
+        self.cutoffs = 0
+        self._speech_ended_at: Optional[float] = None
+        self._agent_speaking_since: Optional[float] = None
+        self._awaiting_response = False
+
+    def attach(self) -> "EndpointingTuner":
+        self.session.on("user_state_changed", self._on_user_state)
+        self.session.on("agent_state_changed", self._on_agent_state)
+        self.session.on("metrics_collected", self._on_metrics)
+        return self
+
+    # ---- Events ----
+
+    def _on_user_state(self, ev: Any) -> None:
+        if ev.new_state == "listening" and ev.old_state == "speaking":
+            self._speech_ended_at = ev.created_at
+            self._awaiting_response = True
+        elif ev.new_state == "speaking" and self._speech_ended_at is not None:
+            gap = ev.created_at - self._speech_ended_at
+            speaking_since = self._agent_speaking_since
+            if speaking_since is None:
+                if self._awaiting_response:
+                    # Anrufer spricht nach einer Pause weiter, bevor Clara antwortet
+                    self._observe_pause(gap, cutoff=False)
+            elif ev.created_at - speaking_since <= self.cfg["cutoff_window_s"]:
+                # Clara hat gerade erst angefangen -> Anrufer wurde vermutlich abgeschnitten
+                self.cutoffs += 1
+                self._observe_pause(gap, cutoff=True)
+
+    def _on_agent_state(self, ev: Any) -> None:
+        if ev.new_state == "speaking":
+            self._agent_speaking_since = ev.created_at
+            if self._awaiting_response and self._speech_ended_at is not None:
+                self._awaiting_response = False
+                response_s = max(0.0, ev.created_at - self._speech_ended_at)
+                TURN_RESPONSE.observe(response_s)
+                if self.recorder is not None:
+                    self.recorder.record("turn_latency", response_s=round(response_s, 3), endpointing_delay_s=round(self.delay_s, 3))
+        elif ev.old_state == "speaking":
+            self._agent_speaking_since = None
+
+    def _on_metrics(self, ev: Any) -> None:
+        m = ev.metrics
+        if getattr(m, "type", None) == "eou_metrics":
+            EOU_DELAY.observe(m.end_of_utterance_delay)
+
+    # ---- Anpassung ----
+
+    def _observe_pause(self, gap_s: float, cutoff: bool) -> None:
+        if gap_s <= 0:
+            return
+        self.pauses.append(gap_s)
+        if self.cfg["adaptive"]:
+            self._adapt(cutoff)
+
+    def target_delay_s(self) -> Optional[float]:
+        """Stillezeit, die die typischen Denkpausen dieses Anrufers abdeckt (None = zu wenig Daten)."""
+        if len(self.pauses) < self.cfg["adaptive_min_samples"]:
+            return None
+        ordered = sorted(self.pauses)
+        k = min(len(ordered) - 1, max(0, math.ceil(self.cfg["adaptive_quantile"] / 100 * len(ordered)) - 1))
+        return ordered[k] + self.cfg["adaptive_margin_s"]
+
+    def _adapt(self, cutoff: bool) -> None:
+        target = self.target_delay_s()
+        if target is None:
+            if not cutoff:
+                return
+            target = self.delay_s + self.cfg["adaptive_margin_s"]  # vor genügend Samples: nach Abschneiden vorsichtig erhöhen
+        target = min(max(target, self.cfg["adaptive_floor_s"]), self.cfg["adaptive_ceiling_s"])
+        if abs(target - self.delay_s) < 0.05:
+            return
+        update = getattr(self.session, "update_options", None)
+        if update is None:
+            return
+        update(min_endpointing_delay=target)
+        log.info(f"Endpointing angepasst: {self.delay_s * 1000:.0f} -> {target * 1000:.0f} ms "
+                 f"(Pausen={len(self.pauses)}, abgeschnitten={self.cutoffs})")
+        self.delay_s = target
+        ENDPOINTING_DELAY.observe(target)
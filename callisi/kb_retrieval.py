@@ -0,0 +1,353 @@
+"""
+KB-Retrieval mit Deadline und Hedging für query_kb.
+- Primär: Embedding + Pinecone (VectorSearch)
+- Hedge: antwortet Pinecone nicht innerhalb des p-Quantils (KB_HEDGE_PERCENTILE) der letzten Latenzen,
+  startet parallel die lokale Abfrage (Ergebnis-Cache, sonst lokale Replica aus KB_REPLICA_PATH) – wer zuerst liefert, gewinnt
+- Gesamtdeadline kommt aus dem Turn-Budget; Hedge-Quote wird als Metrik und im Log ausgewiesen
+- Embedding und Pinecone laufen über Circuit Breaker (azure_openai, pinecone); lokale Embeddings ohne Breaker
+- Mandanten: Pinecone-Namespace pro Objekt (aus den Dispatch-Metadaten, sonst KB_NAMESPACE); Cache und Replica
+  sind pro Namespace getrennt, optionale Metadaten-Filter (z.B. category) gelten auch für die Replica
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from callisi import metrics
+from callisi.circuit_breaker import get_breaker
+from callisi.vector_search import get_vector_search
+
+log = logging.getLogger("callisi.kb_retrieval")
+
+KB_RESULTS = metrics.counter(
+    "callisi_kb_retrievals_total", "query_kb-Abfragen nach Ergebnisquelle", ["source"],
+)
+KB_HEDGES = metrics.counter("callisi_kb_hedges_fired_total", "Gestartete Hedge-Abfragen (Cache/Replica)")
+KB_LATENCY = metrics.histogram("callisi_kb_retrieval_seconds", "Dauer von query_kb-Retrieval inkl. Hedge")
+
+Hits = List[Dict[str, Any]]
+
+
+def _get_kb_retrieval_config() -> Dict[str, Any]:
+    return {
+        "hedge_percentile": float(os.getenv("KB_HEDGE_PERCENTILE", "90")),
+        "hedge_min_s": float(os.getenv("KB_HEDGE_MIN_MS", "150")) / 1000,
+        "hedge_default_s": float(os.getenv("KB_HEDGE_DEFAULT_MS", "400")) / 1000,
+        "cache_size": int(os.getenv("KB_CACHE_SIZE", "512")),
+        "cache_ttl_s": float(os.getenv("KB_CACHE_TTL_SECONDS", "3600")),
+        "replica_path": os.getenv("KB_REPLICA_PATH", "data/kb_replica.jsonl"),
+        "namespace": os.getenv("KB_NAMESPACE", ""),
+    }
+
+
+_NAMESPACE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def tenant_namespace(job_metadata: Any, default: Optional[str] = None) -> str:
+    """Namespace des Anrufs aus den Dispatch-Metadaten (tenant/namespace/property), sonst KB_NAMESPACE."""
+    default = _get_kb_retrieval_config()["namespace"] if default is None else default
+    try:
+        meta = job_metadata if isinstance(job_metadata, dict) else json.loads(job_metadata or "{}")
+        value = str(meta.get("tenant") or meta.get("namespace") or meta.get("property") or "").strip()
+    except (ValueError, AttributeError):
+        value = ""
+    if not value:
+        return default
+    if not _NAMESPACE.match(value):
+        log.warning(f"Ungültiger KB-Namespace in den Dispatch-Metadaten: {value!r} – nutze {default!r}")
+        return default
+    return value
+
+
+def replica_path(base: str, namespace: str) -> str:
+    """Eigene Replica-Datei je Namespace: data/kb_replica.jsonl -> data/kb_replica.<namespace>.jsonl."""
+    if not namespace:
+        return base
+    root, ext = os.path.splitext(base)
+    return f"{root}.{namespace}{ext}"
+
+
+def _meta_matches(meta: Dict[str, Any], flt: Dict[str, Any]) -> bool:
+    """Teilmenge der Pinecone-Filtersyntax: Gleichheit, $eq, $ne, $in, $nin; sonst LookupError."""
+    for field, cond in flt.items():
+        value = meta.get(field)
+        if not isinstance(cond, dict):
+            cond = {"$eq": cond}
+        for op, arg in cond.items():
+            if op == "$eq":
+                ok = value == arg
+            elif op == "$ne":
+                ok = value != arg
+            elif op == "$in":
+                ok = value in arg
+            elif op == "$nin":
+                ok = value not in arg
+            else:
+                raise LookupError(f"Filter {op} lokal nicht unterstützt")
+            if not ok:
+                return False
+    return True
+
+
+def matches_to_hits(res: Any) -> Hits:
+    """Pinecone-Antwort (dict oder Objekt, v2/v3) -> Liste von Treffern."""
+    matches = res.get("matches") if isinstance(res, dict) else getattr(res, "matches", [])
+    hits: Hits = []
+    for m in matches or []:
+        meta = m.get("metadata", {}) if isinstance(m, dict) else getattr(m, "metadata", {}) or {}
+        text = meta.get("text", "")
+        score = m.get("score") if isinstance(m, dict) else getattr(m, "score", None)
+        hits.append({"score": score, "text": text, "metadata": meta})
+    return hits
+
+
+class LatencyTracker:
+    """Gleitendes Fenster der letzten Latenzen für das Hedge-Quantil."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples: "deque[float]" = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        k = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+        return ordered[k]
+
+
+class ResultCache:
+    """LRU-Cache normalisierte Frage -> Treffer (mit TTL)."""
+
+    def __init__(self, size: int = 512, ttl_s: float = 3600.0):
+        self.size = size
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[Tuple[str, int, str], Tuple[float, Hits]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(query: str, top_k: int, scope: str = "") -> Tuple[str, int, str]:
+        return " ".join(query.lower().split()), top_k, scope
+
+    def get(self, query: str, top_k: int, scope: str = "") -> Optional[Hits]:
+        key = self._key(query, top_k, scope)
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or time.time() - item[0] > self.ttl_s:
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def put(self, query: str, top_k: int, hits: Hits, scope: str = "") -> None:
+        key = self._key(query, top_k, scope)
+        with self._lock:
+            self._data[key] = (time.time(), hits)
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+
+class LocalReplica:
+    """Lokale Kopie des Index (JSONL: id, values, metadata) mit Cosinus-Suche in NumPy."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._matrix = None
+        self._meta: List[Dict[str, Any]] = []
+        self._mtime = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self) -> bool:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime and self._matrix is not None:
+            return True
+        import numpy as np
+        vecs, meta = [], []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                vecs.append(item["values"])
+                meta.append(item.get("metadata", {}))
+        if not vecs:
+            return False
+        m = np.asarray(vecs, dtype=np.float32)
+        m /= np.maximum(np.linalg.norm(m, axis=1, keepdims=True), 1e-12)
+        self._matrix, self._meta, self._mtime = m, meta, mtime
+        log.info(f"KB-Replica geladen: {len(meta)} Einträge aus {self.path}")
+        return True
+
+    def available(self) -> bool:
+        with self._lock:
+            return self._load()
+
+    def search(self, vector: List[float], top_k: int, flt: Optional[Dict[str, Any]] = None) -> Hits:
+        import numpy as np
+        with self._lock:
+            if not self._load():
+                return []
+            matrix, meta = self._matrix, self._meta
+        q = np.asarray(vector, dtype=np.float32)
+        if q.shape[0] != matrix.shape[1]:
+            # Replica mit anderem Embedding-Modell indexiert (z.B. nach Wechsel von EMBED_BACKEND)
+            raise LookupError(f"Replica hat {matrix.shape[1]} Dimensionen, Anfrage {q.shape[0]} – ingest_kb neu ausführen")
+        q /= max(float(np.linalg.norm(q)), 1e-12)
+        scores = matrix @ q
+        if flt:
+            mask = np.fromiter((_meta_matches(m, flt) for m in meta), dtype=bool, count=len(meta))
+            scores = np.where(mask, scores, -np.inf)
+            k = min(top_k, int(mask.sum()))
+            if k == 0:
+                return []
+        else:
+            k = min(top_k, len(meta))
+        idx = np.argpartition(-scores, k - 1)[:k]
+        idx = idx[np.argsort(-scores[idx])]
+        return [{"score": float(scores[i]), "text": meta[i].get("text", ""), "metadata": meta[i]} for i in idx]
+
+
+class KBRetriever:
+    """Orchestriert Primärabfrage, Hedge und Deadline."""
+
+    def __init__(self, cfg: Optional[Dict[str, Any]] = None):
+        self.cfg = cfg or _get_kb_retrieval_config()
+        self.latency = LatencyTracker()
+        self.cache = ResultCache(self.cfg["cache_size"], self.cfg["cache_ttl_s"])
+        self.replicas: Dict[str, LocalReplica] = {}
+        self.replica = self.replica_for(self.cfg["namespace"])
+        self.calls = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def replica_for(self, namespace: str) -> LocalReplica:
+        replica = self.replicas.get(namespace)
+        if replica is None:
+            replica = self.replicas[namespace] = LocalReplica(replica_path(self.cfg["replica_path"], namespace))
+        return replica
+
+    def hedge_delay_s(self, deadline_s: float) -> float:
+        p = self.latency.percentile(self.cfg["hedge_percentile"])
+        delay = self.cfg["hedge_default_s"] if p is None else p
+        return min(max(delay, self.cfg["hedge_min_s"]), deadline_s)
+
+    async def retrieve(
+        self,
+        query: str,
+        top_k: int,
+        embed: Callable[[List[str]], Awaitable[List[List[float]]]],
+        connect: Callable[[], Any],
+        deadline_s: float,
+        namespace: str = "",
+        flt: Optional[Dict[str, Any]] = None,
+        embed_breaker: Optional[str] = "azure_openai",
+        **query_kwargs,
+    ) -> Tuple[Hits, str]:
+        """Liefert (Treffer, Quelle) mit Quelle in {pinecone, cache, replica}; asyncio.TimeoutError nach Deadline."""
+        self.calls += 1
+        scope = json.dumps([namespace, flt], sort_keys=True) if namespace or flt else ""
+        if namespace:
+            query_kwargs["namespace"] = namespace
+        if flt:
+            query_kwargs["filter"] = flt
+        t0 = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + deadline_s
+        async def guarded_embed() -> List[List[float]]:
+            if embed_breaker is None:
+                return await embed([query])
+            async with get_breaker(embed_breaker).guard():
+                return await embed([query])
+
+        embed_task = asyncio.ensure_future(guarded_embed())
+
+        async def primary() -> Hits:
+            vec = (await embed_task)[0]
+            remaining = max(0.0, deadline - loop.time())
+            # Circuit offen -> sofortiger Fehler -> Hedge startet ohne Wartezeit
+            async with get_breaker("pinecone").guard():
+                res = await get_vector_search(connect).query(timeout_s=remaining, vector=vec, top_k=top_k, include_metadata=True, **query_kwargs)
+            hits = matches_to_hits(res)
+            self.latency.add(time.perf_counter() - t0)
+            self.cache.put(query, top_k, hits, scope)
+            return hits
+
+        async def hedge() -> Tuple[Hits, str]:
+            cached = self.cache.get(query, top_k, scope)
+            if cached is not None:
+                return cached, "cache"
+            replica = self.replica_for(namespace)
+            if not await asyncio.to_thread(replica.available):
+                raise LookupError("kein lokaler Treffer")
+            vec = (await asyncio.shield(embed_task))[0]
+            return await asyncio.to_thread(replica.search, vec, top_k, flt), "replica"
+
+        primary_task = asyncio.ensure_future(primary())
+        tasks = {primary_task}
+        hedge_task: Optional[asyncio.Future] = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay_s(deadline_s))
+            if not done or primary_task.exception() is not None:
+                hedge_task = asyncio.ensure_future(hedge())
+                tasks.add(hedge_task)
+                self.hedges_fired += 1
+                KB_HEDGES.inc()
+                log.info(f"KB-Hedge ausgelöst nach {(time.perf_counter() - t0) * 1000:.0f} ms ({self.stats()})")
+            while tasks:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, tasks = await asyncio.wait(tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is not None:
+                        continue
+                    if t is primary_task:
+                        KB_RESULTS.labels(source="pinecone").inc()
+                        return t.result(), "pinecone"
+                    hits, source = t.result()
+                    self.hedges_won += 1
+                    KB_RESULTS.labels(source=source).inc()
+                    return hits, source
+            # beide fehlgeschlagen -> Fehler der Primärabfrage weiterreichen
+            if primary_task.done() and primary_task.exception() is not None and (hedge_task is None or hedge_task.done()):
+                raise primary_task.exception()
+            KB_RESULTS.labels(source="timeout").inc()
+            raise asyncio.TimeoutError()
+        finally:
+            for t in (primary_task, hedge_task, embed_task):
+                if t is None:
+                    continue
+                if not t.done():
+                    t.cancel()
+                elif not t.cancelled():
+                    t.exception()  # als abgerufen markieren (kein "never retrieved"-Log)
+            KB_LATENCY.observe(time.perf_counter() - t0)
+
+    def stats(self) -> Dict[str, Any]:
+        rate = self.hedges_fired / self.calls if self.calls else 0.0
+        return {"calls": self.calls, "hedges_fired": self.hedges_fired, "hedges_won": self.hedges_won, "hedge_rate": round(rate, 3)}
+
+
+_retriever: Optional[KBRetriever] = None
+_retriever_lock = threading.Lock()
+
+
+def get_kb_retriever() -> KBRetriever:
+    global _retriever
+    with _retriever_lock:
+        if _retriever is None:
+            _retriever = KBRetriever()
+        return _retriever
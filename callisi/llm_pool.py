@@ -0,0 +1,258 @@
+"""
+LLM-Pool über mehrere Azure-OpenAI-Deployments/Regionen: Auswahl je Turn nach Time-to-first-Token, Failover.
+- Pool: AZURE_OPENAI_POOL=name1,name2 – je Name AZURE_OPENAI_<NAME>_ENDPOINT, _API_KEY, _DEPLOYMENT_NAME,
+  _API_VERSION (fehlende Werte vom primären AZURE_OPENAI_*); der primäre Endpoint ist immer dabei ("primary")
+- Auswahl: beste gleitende TTFT (EWMA); Kontingent (AZURE_OPENAI_TPM bzw. AZURE_OPENAI_<NAME>_TPM) unter 50 % macht
+  einen Endpoint schrittweise unattraktiver; Messwerte älter als LLM_POOL_STALE_SECONDS fallen auf den Prior zurück,
+  damit ein einmal langsamer Endpoint wieder Anfragen bekommt
+- Failover bis zum ersten Token: Fehler, Timeout (LLM_POOL_TTFT_TIMEOUT_MS) oder 429 -> nächster Endpoint; der
+  fehlerhafte pausiert (LLM_POOL_ERROR_COOLDOWN_SECONDS, bei 429 Retry-After); erst wenn alle Endpoints 429 melden,
+  pausiert das worker-weite LLM-Kontingent (callisi.quota) – QUOTA_LLM_TPM gilt dann für den ganzen Pool
+- Statistik worker-weit (alle Anrufprozesse teilen sie, Datei in WORKER_STATE_DIR); Metriken je Endpoint
+- Nur ein Endpoint konfiguriert: das einzelne openai.LLM wie bisher
+"""
+
+import asyncio
+import dataclasses
+import hashlib
+import logging
+import os
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from livekit.agents import APIConnectionError, llm
+from livekit.agents.types import (
+    DEFAULT_API_CONNECT_OPTIONS,
+    NOT_GIVEN,
+    APIConnectOptions,
+    NotGivenOr,
+)
+
+from callisi import metrics
+from callisi.quota import get_quota_governor, is_rate_limited, refill, retry_after_s
+from callisi.shared_state import SharedSlots
+
+log = logging.getLogger("callisi.llm_pool")
+
+LLM_TTFT = metrics.histogram(
+    "callisi_llm_ttft_seconds", "Time-to-first-Token je Azure-OpenAI-Endpoint", labels=("endpoint",),
+)
+LLM_REQUESTS = metrics.counter(
+    "callisi_llm_requests_total", "LLM-Anfragen je Endpoint nach Ergebnis (ok, error, timeout, throttled)",
+    labels=("endpoint", "outcome"),
+)
+LLM_FAILOVERS = metrics.counter("callisi_llm_failovers_total", "Wechsel auf den nächsten Endpoint vor dem ersten Token")
+
+# TTFT-EWMA, Anzahl Messungen, Zeitpunkt der letzten Messung, Pause bis, Kontingent-Füllstand, dessen Zeitpunkt
+_SLOT = "<dddddd"
+
+
+def _get_llm_pool_config() -> Dict[str, Any]:
+    return {
+        "pool": [n.strip() for n in os.getenv("AZURE_OPENAI_POOL", "").split(",") if n.strip()],
+        "ttft_timeout_s": float(os.getenv("LLM_POOL_TTFT_TIMEOUT_MS", "3000")) / 1000,
+        "error_cooldown_s": float(os.getenv("LLM_POOL_ERROR_COOLDOWN_SECONDS", "10")),
+        "throttle_default_s": float(os.getenv("QUOTA_429_BACKOFF_SECONDS", "10")),
+        "prior_ttft_s": float(os.getenv("LLM_POOL_DEFAULT_TTFT_MS", "800")) / 1000,
+        "stale_s": float(os.getenv("LLM_POOL_STALE_SECONDS", "60")),
+        "alpha": float(os.getenv("LLM_POOL_EWMA_ALPHA", "0.3")),
+        "state_dir": os.getenv("WORKER_STATE_DIR", "/tmp/callisi-worker"),
+    }
+
+
+def _base_url(url: str) -> str:
+    m = re.match(r"^(https://[^/]+\.openai\.azure\.com)", (url or "").strip())
+    return m.group(1) if m else (url or "").strip().rstrip("/")
+
+
+def azure_llm_pool_configs(primary: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Primärer Endpoint (_get_azure_llm_config der Agents) + AZURE_OPENAI_POOL; je Eintrag name, tpm + with_azure-Parameter."""
+    configs: List[Dict[str, Any]] = [dict(primary, name="primary", tpm=float(os.getenv("AZURE_OPENAI_TPM", "0")))]
+    for name in _get_llm_pool_config()["pool"]:
+        if name == "primary":
+            continue
+        prefix = f"AZURE_OPENAI_{name.upper()}_"
+        configs.append({
+            "name": name,
+            "model": primary["model"],
+            "azure_deployment": os.getenv(prefix + "DEPLOYMENT_NAME") or primary["azure_deployment"],
+            "azure_endpoint": _base_url(os.getenv(prefix + "ENDPOINT") or primary["azure_endpoint"]),
+            "api_version": os.getenv(prefix + "API_VERSION") or primary["api_version"],
+            "api_key": os.getenv(prefix + "API_KEY") or primary["api_key"],
+            "tpm": float(os.getenv(prefix + "TPM", "0")),
+        })
+    return configs
+
+
+class PooledLLM(llm.LLM):
+    """Mehrere LLM-Instanzen hinter einer; chat() wählt je Aufruf den Endpoint (siehe Modul-Docstring)."""
+
+    def __init__(self, configs: List[Dict[str, Any]], members: List[llm.LLM], cfg: Optional[Dict[str, Any]] = None):
+        super().__init__()
+        self.cfg = cfg or _get_llm_pool_config()
+        self.names = [c["name"] for c in configs]
+        self.tpm = [float(c.get("tpm") or 0) for c in configs]
+        self.members = members
+        # eigene Datei je Pool-Zusammensetzung: Slot-Index = Position in AZURE_OPENAI_POOL
+        key = hashlib.sha1("|".join(f"{c['name']}@{c['azure_endpoint']}/{c['azure_deployment']}" for c in configs)
+                           .encode("utf-8")).hexdigest()[:10]
+        self.stats = SharedSlots(os.path.join(self.cfg["state_dir"], f"llm_pool-{key}.bin"), _SLOT, len(members))
+
+    @property
+    def model(self) -> str:
+        return self.members[0].model
+
+    @property
+    def provider(self) -> str:
+        return "azure-pool"
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools: Optional[List[Any]] = None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        parallel_tool_calls: NotGivenOr[bool] = NOT_GIVEN,
+        tool_choice: NotGivenOr[llm.ToolChoice] = NOT_GIVEN,
+        extra_kwargs: NotGivenOr[Dict[str, Any]] = NOT_GIVEN,
+    ) -> llm.LLMStream:
+        return PooledLLMStream(self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options,
+                               parallel_tool_calls=parallel_tool_calls, tool_choice=tool_choice, extra_kwargs=extra_kwargs)
+
+    # ---- Statistik ----
+
+    def _score(self, index: int, now: float) -> float:
+        ttft, samples, last, _cooldown, level, updated = self.stats.read(index)
+        prior = self.cfg["prior_ttft_s"]
+        score = ttft if samples else prior
+        if now - last > self.cfg["stale_s"]:
+            score = min(score, prior)
+        cap = self.tpm[index]
+        if cap > 0:
+            remaining = refill(level, updated, cap, now) / cap
+            score *= 1.0 + max(0.0, 0.5 - remaining) * 10  # leer: 6-fache TTFT
+        return score
+
+    def ranking(self) -> List[int]:
+        """Reihenfolge der Versuche: freie Endpoints nach Score, pausierte zuletzt (früheste Freigabe zuerst)."""
+        now = time.time()
+        with self.stats.locked():
+            entries = [(self.stats.read(i)[3], self._score(i, now), i) for i in range(len(self.members))]
+        ready = sorted((score, i) for cooldown, score, i in entries if cooldown <= now)
+        paused = sorted((cooldown, i) for cooldown, _score, i in entries if cooldown > now)
+        return [i for _, i in ready] + [i for _, i in paused]
+
+    def record_ttft(self, index: int, seconds: float) -> None:
+        LLM_TTFT.labels(endpoint=self.names[index]).observe(seconds)
+        with self.stats.locked():
+            ttft, samples, _last, cooldown, level, updated = self.stats.read(index)
+            ttft = seconds if not samples else ttft + self.cfg["alpha"] * (seconds - ttft)
+            self.stats.write(index, ttft, samples + 1, time.time(), cooldown, level, updated)
+
+    def record_usage(self, index: int, tokens: int) -> None:
+        cap = self.tpm[index]
+        if cap <= 0:
+            return
+        now = time.time()
+        with self.stats.locked():
+            ttft, samples, last, cooldown, level, updated = self.stats.read(index)
+            self.stats.write(index, ttft, samples, last, cooldown, refill(level, updated, cap, now) - tokens, now)
+
+    def record_error(self, index: int, cooldown_s: float) -> None:
+        with self.stats.locked():
+            values = list(self.stats.read(index))
+            values[3] = max(values[3], time.time() + cooldown_s)
+            self.stats.write(index, *values)
+
+    async def aclose(self) -> None:
+        await asyncio.gather(*(m.aclose() for m in self.members), return_exceptions=True)
+
+
+class PooledLLMStream(llm.LLMStream):
+    def __init__(self, pool: PooledLLM, *, chat_ctx: llm.ChatContext, tools: List[Any], conn_options: APIConnectOptions,
+                 parallel_tool_calls: NotGivenOr[bool], tool_choice: NotGivenOr[llm.ToolChoice],
+                 extra_kwargs: NotGivenOr[Dict[str, Any]]):
+        super().__init__(pool, chat_ctx=chat_ctx, tools=tools, conn_options=conn_options)
+        self._pool = pool
+        self._parallel_tool_calls = parallel_tool_calls
+        self._tool_choice = tool_choice
+        self._extra_kwargs = extra_kwargs
+        self._current_stream: Optional[llm.LLMStream] = None
+
+    @property
+    def chat_ctx(self) -> llm.ChatContext:
+        return self._chat_ctx if self._current_stream is None else self._current_stream.chat_ctx
+
+    @property
+    def tools(self) -> List[Any]:
+        return self._tools if self._current_stream is None else self._current_stream.tools
+
+    async def _run(self) -> None:
+        pool = self._pool
+        failed: List[str] = []
+        throttled: List[float] = []  # Retry-After je Endpoint mit 429
+        for index in pool.ranking():
+            name = pool.names[index]
+            sent = False
+            t0 = time.perf_counter()
+            try:
+                # Wiederholungen übernimmt der Pool (nächster Endpoint), nicht das einzelne Plugin
+                async with pool.members[index].chat(
+                    chat_ctx=self._chat_ctx, tools=self._tools,
+                    conn_options=dataclasses.replace(self._conn_options, max_retry=0),
+                    parallel_tool_calls=self._parallel_tool_calls, tool_choice=self._tool_choice,
+                    extra_kwargs=self._extra_kwargs,
+                ) as stream:
+                    chunks = stream.__aiter__()
+                    try:
+                        first = await asyncio.wait_for(chunks.__anext__(), pool.cfg["ttft_timeout_s"])
+                    except StopAsyncIteration:
+                        LLM_REQUESTS.labels(endpoint=name, outcome="ok").inc()
+                        return
+                    pool.record_ttft(index, time.perf_counter() - t0)
+                    self._current_stream = stream
+                    sent = True
+                    self._send(index, first)
+                    async for chunk in chunks:
+                        self._send(index, chunk)
+                LLM_REQUESTS.labels(endpoint=name, outcome="ok").inc()
+                return
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    outcome, cooldown = "timeout", pool.cfg["error_cooldown_s"]
+                elif is_rate_limited(e):
+                    outcome, cooldown = "throttled", retry_after_s(e, pool.cfg["throttle_default_s"])
+                    throttled.append(cooldown)
+                else:
+                    outcome, cooldown = "error", pool.cfg["error_cooldown_s"]
+                LLM_REQUESTS.labels(endpoint=name, outcome=outcome).inc()
+                pool.record_error(index, cooldown)
+                if sent:
+                    # Antwort schon teilweise beim Anrufer – LLMStream darf _run nicht wiederholen (doppelte Antwort)
+                    raise APIConnectionError(f"LLM-Endpoint {name} nach den ersten Tokens abgebrochen ({outcome}: {e})",
+                                             retryable=False) from e
+                failed.append(f"{name}: {outcome}")
+                LLM_FAILOVERS.inc()
+                log.warning(f"LLM-Endpoint {name} {outcome} ({e or 'kein erstes Token'}) – Pause {cooldown:.0f}s, "
+                            f"versuche nächsten")
+        if throttled and len(throttled) == len(failed):
+            # alle Endpoints im 429: wie ohne Pool das LLM-Kontingent des Workers sperren (CallQuota.attach sieht
+            # nur den Fehler des Pools, nicht die 429 der einzelnen Endpoints)
+            governor = get_quota_governor()
+            governor.throttle("llm_tokens", min(throttled))
+        raise APIConnectionError(f"alle LLM-Endpoints fehlgeschlagen ({', '.join(failed)})")
+
+    def _send(self, index: int, chunk: llm.ChatChunk) -> None:
+        if chunk.usage is not None:
+            self._pool.record_usage(index, chunk.usage.total_tokens)
+        self._event_ch.send_nowait(chunk)
+
+
+def pooled_llm(configs: List[Dict[str, Any]], factory: Callable[[Dict[str, Any]], llm.LLM]) -> llm.LLM:
+    """factory baut ein LLM je Endpoint (z.B. openai.LLM.with_azure); bei nur einem Endpoint kein Pool."""
+    members = [factory(c) for c in configs]
+    if len(members) == 1:
+        return members[0]
+    log.info(f"LLM-Pool: {', '.join(c['name'] for c in configs)}")
+    return PooledLLM(configs, members)
@@ -0,0 +1,129 @@
+"""
+Event-Loop-Watchdog (opt-in über LOOP_WATCHDOG=1).
+- Heartbeat-Task im Loop misst den Lag (Histogramm)
+- Watcher-Thread erkennt Blockaden > LOOP_BLOCK_THRESHOLD_MS und loggt den Stack des Loop-Threads + Session-ID
+- Ein Watchdog pro Job-Loop (Process- und Thread-Executor haben je Job einen eigenen Loop)
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, Optional
+
+from callisi import metrics
+
+log = logging.getLogger("callisi.loop_watchdog")
+
+LOOP_LAG = metrics.histogram(
+    "callisi_event_loop_lag_seconds", "Verspätung des Watchdog-Heartbeats im Event-Loop",
+)
+LOOP_BLOCKS = metrics.counter(
+    "callisi_event_loop_blocks_total", "Blockaden des Event-Loops über dem Schwellwert",
+)
+LOOP_BLOCK_DURATION = metrics.histogram(
+    "callisi_event_loop_block_seconds", "Dauer erkannter Event-Loop-Blockaden",
+)
+
+
+def _get_watchdog_config() -> Dict[str, Any]:
+    return {
+        "enabled": os.getenv("LOOP_WATCHDOG", "0").strip().lower() in ("1", "true", "yes", "on"),
+        "interval_s": float(os.getenv("LOOP_WATCHDOG_INTERVAL_MS", "50")) / 1000,
+        "threshold_s": float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100")) / 1000,
+        "stack_limit": int(os.getenv("LOOP_BLOCK_STACK_LIMIT", "25")),
+    }
+
+
+class LoopWatchdog:
+    """Misst Lag und meldet blockierende Callbacks des aktuellen Loops."""
+
+    def __init__(self, session_id: str = "", interval_s: float = 0.05, threshold_s: float = 0.1, stack_limit: int = 25):
+        self.session_id = session_id
+        self.interval_s = interval_s
+        self.threshold_s = threshold_s
+        self.stack_limit = stack_limit
+        self.blocks = 0
+        self.max_lag_s = 0.0
+        self.last_lag_s = 0.0
+        self._beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat(), name="loop-watchdog")
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def aclose(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        log.info(f"Loop-Watchdog [{self.session_id}]: {self.blocks} Blockaden, max. Lag {self.max_lag_s * 1000:.0f} ms")
+
+    async def _heartbeat(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval_s)
+            lag = max(0.0, loop.time() - t0 - self.interval_s)
+            self.last_lag_s = lag
+            self.max_lag_s = max(self.max_lag_s, lag)
+            LOOP_LAG.observe(lag)
+
+    def _watch(self) -> None:
+        reported_beat = None
+        stalled_since = 0.0
+        while not self._stop.wait(self.interval_s / 2):
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.interval_s
+            if stalled > self.threshold_s and reported_beat != beat:
+                reported_beat = beat
+                stalled_since = beat + self.interval_s
+                self.blocks += 1
+                LOOP_BLOCKS.inc()
+                log.warning(
+                    f"Event-Loop blockiert > {self.threshold_s * 1000:.0f} ms [session={self.session_id}]\n"
+                    f"{self._loop_stack()}"
+                )
+            elif reported_beat is not None and reported_beat != beat:
+                # Loop läuft wieder -> Gesamtdauer der Blockade erfassen
+                duration = beat - stalled_since
+                LOOP_BLOCK_DURATION.observe(max(0.0, duration))
+                log.warning(f"Event-Loop wieder frei nach {duration * 1000:.0f} ms [session={self.session_id}]")
+                reported_beat = None
+
+    def _loop_stack(self) -> str:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return "(Stack nicht verfügbar)"
+        return "".join(traceback.format_stack(frame, limit=self.stack_limit))
+
+
+def start_loop_watchdog(session_id: str = "") -> Optional[LoopWatchdog]:
+    """Startet den Watchdog im laufenden Loop, wenn LOOP_WATCHDOG aktiv ist; sonst None."""
+    cfg = _get_watchdog_config()
+    if not cfg["enabled"]:
+        return None
+    wd = LoopWatchdog(session_id, cfg["interval_s"], cfg["threshold_s"], cfg["stack_limit"])
+    wd.start()
+    return wd
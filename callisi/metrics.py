@@ -0,0 +1,93 @@
+"""
+Prometheus-Metriken der Agents (prometheus_client kommt als Abhängigkeit von livekit-agents mit).
+- counter()/gauge()/histogram(): get-or-create, mehrfacher Import registriert nichts doppelt
+- Export: METRICS_PORT im Worker-Hauptprozess; Job-Prozesse werden über PROMETHEUS_MULTIPROC_DIR aggregiert
+  (PROMETHEUS_MULTIPROC_DIR muss in der echten Umgebung gesetzt sein, bevor Python startet)
+- Ohne prometheus_client: No-op-Metriken, Code bleibt unverändert lauffähig
+"""
+
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+log = logging.getLogger("callisi.metrics")
+
+try:
+    from prometheus_client import (  # type: ignore
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        multiprocess,  # type: ignore
+        start_http_server,
+    )
+    HAS_PROMETHEUS = True
+except Exception:
+    HAS_PROMETHEUS = False
+
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _NoopMetric:
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+
+    def inc(self, amount: float = 1.0) -> None:
+        pass
+
+    def dec(self, amount: float = 1.0) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+    def observe(self, value: float) -> None:
+        pass
+
+
+_metrics: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def _get_or_create(name: str, factory) -> Any:
+    with _lock:
+        m = _metrics.get(name)
+        if m is None:
+            m = factory() if HAS_PROMETHEUS else _NoopMetric()
+            _metrics[name] = m
+        return m
+
+
+def counter(name: str, doc: str, labels: Sequence[str] = ()) -> Any:
+    return _get_or_create(name, lambda: Counter(name, doc, list(labels)))
+
+
+def gauge(name: str, doc: str, labels: Sequence[str] = (), multiprocess_mode: str = "livesum") -> Any:
+    return _get_or_create(name, lambda: Gauge(name, doc, list(labels), multiprocess_mode=multiprocess_mode))
+
+
+def histogram(name: str, doc: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Any:
+    return _get_or_create(name, lambda: Histogram(name, doc, list(labels), buckets=list(buckets)))
+
+
+def start_metrics_server(port: Optional[int] = None) -> bool:
+    """Startet den /metrics-Endpoint (nur im Worker-Hauptprozess aufrufen)."""
+    if port is None:
+        raw = os.getenv("METRICS_PORT", "")
+        port = int(raw) if raw.strip() else None
+    if not port:
+        return False
+    if not HAS_PROMETHEUS:
+        log.warning("METRICS_PORT gesetzt, aber prometheus_client fehlt – kein Metrik-Export.")
+        return False
+    mp_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if mp_dir:
+        os.makedirs(mp_dir, exist_ok=True)
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        start_http_server(port, registry=registry)
+    else:
+        start_http_server(port)
+    log.info(f"Metriken unter :{port}/metrics{' (multiprocess)' if mp_dir else ''}")
+    return True
@@ -0,0 +1,265 @@
+"""
+Worker-weiter Rate-Governor für Azure-Kontingente: LLM-Tokens, Embedding-Requests, TTS-Zeichen.
+- Ein Token-Bucket je Ressource, gemeinsam für alle Job-Prozesse des Workers (ein Prozess pro Anruf):
+  Zustand per mmap in WORKER_STATE_DIR, Lesen/Schreiben unter flock
+- Kapazität = Kontingent pro Minute (QUOTA_LLM_TPM, QUOTA_EMBED_RPM, QUOTA_TTS_CPM), Nachfüllung gleichmäßig; 0 = kein Limit
+- Priorität: laufende Anrufe dürfen den Bucket leeren, neue Anrufe (Begrüßung, erste Runde) nur bis zur Reserve
+  (QUOTA_RESERVE) – wird es knapp, warten die Neuen, nicht die Anrufer mitten im Gespräch
+- Wartezeit begrenzt (QUOTA_MAX_WAIT_MS, für neue Anrufe QUOTA_NEW_CALL_MAX_WAIT_MS); danach geht der Aufruf trotzdem
+  raus (Überziehung als Metrik) – der Governor glättet, er blockiert keine Anrufe
+- 429 von Azure: gemeinsame Sperre bis Retry-After für alle Prozesse statt unabhängiger Retries je Session
+- Admission: WorkerLoad meldet den Verbrauch (Komponente "quota"), LiveKit schickt neue Anrufe an andere Replicas,
+  bevor das Kontingent die laufenden Anrufer trifft
+"""
+
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Optional
+
+from callisi import metrics
+from callisi.shared_state import SharedSlots
+
+log = logging.getLogger("callisi.quota")
+
+QUOTA_WAIT = metrics.histogram(
+    "callisi_quota_wait_seconds", "Wartezeit auf Azure-Kontingent je Ressource und Priorität", labels=("resource", "priority"),
+)
+QUOTA_OVERDRAFT = metrics.counter(
+    "callisi_quota_overdraft_total", "Aufrufe trotz leerem Bucket nach maximaler Wartezeit", labels=("resource",),
+)
+QUOTA_THROTTLED = metrics.counter(
+    "callisi_quota_throttled_total", "429-Antworten von Azure (gemeinsame Sperre gesetzt)", labels=("resource",),
+)
+
+# feste Reihenfolge = Slot in der Zustandsdatei
+RESOURCES = ("llm_tokens", "embed_requests", "tts_chars")
+NEW = "new"
+ACTIVE = "active"
+
+_SLOT = "<ddd"  # Füllstand, Zeitpunkt der letzten Aktualisierung, gesperrt bis (429)
+_RETRY_AFTER = re.compile(r"retry after (\d+(?:\.\d+)?) ?s", re.I)
+
+
+def _get_quota_config() -> Dict[str, Any]:
+    return {
+        "capacity": {
+            "llm_tokens": float(os.getenv("QUOTA_LLM_TPM", "0")),
+            "embed_requests": float(os.getenv("QUOTA_EMBED_RPM", "0")),
+            "tts_chars": float(os.getenv("QUOTA_TTS_CPM", "0")),
+        },
+        "reserve": float(os.getenv("QUOTA_RESERVE", "0.2")),
+        "max_wait_s": float(os.getenv("QUOTA_MAX_WAIT_MS", "1500")) / 1000,
+        "new_max_wait_s": float(os.getenv("QUOTA_NEW_CALL_MAX_WAIT_MS", "4000")) / 1000,
+        "llm_completion_tokens": int(os.getenv("QUOTA_LLM_COMPLETION_TOKENS", "200")),
+        "throttle_default_s": float(os.getenv("QUOTA_429_BACKOFF_SECONDS", "10")),
+        # Verbrauchsanteil, ab dem die Komponente "quota" der Lastmeldung 1.0 erreicht
+        "load_target": float(os.getenv("QUOTA_LOAD_TARGET", "0.8")),
+        "state_dir": os.getenv("WORKER_STATE_DIR", "/tmp/callisi-worker"),
+    }
+
+
+def retry_after_s(error: Any, default: float) -> float:
+    """Retry-After aus Header (openai.RateLimitError) oder Azure-Meldung ('Please retry after 20 seconds')."""
+    response = getattr(error, "response", None)
+    header = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        if header:
+            return max(0.0, float(header))
+    except ValueError:
+        pass
+    m = _RETRY_AFTER.search(str(error))
+    return float(m.group(1)) if m else default
+
+
+def is_rate_limited(error: Any) -> bool:
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def refill(level: float, updated: float, capacity: float, now: float) -> float:
+    """Füllstand eines Minuten-Buckets zum Zeitpunkt now; updated == 0 (nie geschrieben) = voll."""
+    if updated <= 0:
+        return capacity
+    if capacity <= 0:
+        return level
+    return min(capacity, level + (now - updated) * capacity / 60.0)
+
+
+class QuotaGovernor:
+    """Token-Buckets in einer gemeinsamen Datei; synchron kurz gesperrt, Warten async."""
+
+    def __init__(self, cfg: Optional[Dict[str, Any]] = None):
+        self.cfg = cfg or _get_quota_config()
+        self.slots = SharedSlots(os.path.join(self.cfg["state_dir"], "quota.bin"), _SLOT, len(RESOURCES))
+
+    def enabled(self, resource: str) -> bool:
+        return self.cfg["capacity"].get(resource, 0) > 0
+
+    def _read(self, resource: str, now: float):
+        level, updated, blocked = self.slots.read(RESOURCES.index(resource))
+        return refill(level, updated, self.cfg["capacity"][resource], now), blocked
+
+    def _write(self, resource: str, level: float, now: float, blocked: float) -> None:
+        self.slots.write(RESOURCES.index(resource), level, now, blocked)
+
+    def _locked(self, fn):
+        with self.slots.locked():
+            return fn(time.time())
+
+    def try_take(self, resource: str, amount: float, priority: str = ACTIVE, force: bool = False) -> float:
+        """0.0 = entnommen, sonst Sekunden bis zum nächsten Versuch. force entnimmt in jedem Fall (Überziehung)."""
+        cap = self.cfg["capacity"][resource]
+
+        def take(now: float) -> float:
+            level, blocked = self._read(resource, now)
+            if not force and blocked > now:
+                self._write(resource, level, now, blocked)
+                return blocked - now
+            if cap <= 0:
+                self._write(resource, level, now, blocked)
+                return 0.0
+            floor = self.cfg["reserve"] * cap if priority == NEW else 0.0
+            need = min(amount, cap - floor)  # größer als der Bucket: warten, bis er (bis zur Reserve) voll ist
+            if force or level - need >= floor:
+                self._write(resource, level - amount, now, blocked)  # darf negativ werden (Schuld)
+                return 0.0
+            self._write(resource, level, now, blocked)
+            return (floor + need - level) * 60.0 / cap
+
+        return self._locked(take)
+
+    async def acquire(self, resource: str, amount: float, priority: str = ACTIVE,
+                      max_wait_s: Optional[float] = None) -> float:
+        """Wartet auf Kontingent (höchstens max_wait_s) und gibt die Wartezeit zurück."""
+        if amount <= 0 or (not self.enabled(resource) and not self.blocked(resource)):
+            return 0.0
+        if max_wait_s is None:
+            max_wait_s = self.cfg["new_max_wait_s"] if priority == NEW else self.cfg["max_wait_s"]
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        while True:
+            # direkt im Loop: flock wird nur für wenige Mikrosekunden gehalten
+            wait = self.try_take(resource, amount, priority)
+            waited = loop.time() - t0
+            if wait <= 0:
+                break
+            if waited + wait > max_wait_s:
+                if waited < max_wait_s:
+                    await asyncio.sleep(max_wait_s - waited)
+                self.try_take(resource, amount, priority, force=True)
+                QUOTA_OVERDRAFT.labels(resource=resource).inc()
+                log.warning(f"Kontingent {resource} erschöpft: {amount:.0f} nach {max_wait_s * 1000:.0f} ms trotzdem angefordert")
+                break
+            await asyncio.sleep(min(wait, 0.5))  # andere Prozesse können zwischendurch zurückgeben
+        waited = loop.time() - t0
+        QUOTA_WAIT.labels(resource=resource, priority=priority).observe(waited)
+        return waited
+
+    def settle(self, resource: str, returned: float) -> None:
+        """Schätzung korrigieren: positive Werte geben zurück, negative buchen nach (tatsächlicher Verbrauch)."""
+        if not self.enabled(resource) or not returned:
+            return
+
+        def adjust(now: float) -> None:
+            level, blocked = self._read(resource, now)
+            self._write(resource, min(self.cfg["capacity"][resource], level + returned), now, blocked)
+
+        self._locked(adjust)
+
+    def throttle(self, resource: str, seconds: float) -> None:
+        """429: alle Prozesse pausieren diese Ressource gemeinsam."""
+        QUOTA_THROTTLED.labels(resource=resource).inc()
+
+        def block(now: float) -> None:
+            level, blocked = self._read(resource, now)
+            self._write(resource, min(level, 0.0), now, max(blocked, now + seconds))
+
+        self._locked(block)
+        log.warning(f"Azure 429 für {resource}: gemeinsame Pause {seconds:.1f}s")
+
+    def blocked(self, resource: str) -> bool:
+        return self._locked(lambda now: self._read(resource, now)[1] > now)
+
+    def pressure(self) -> Dict[str, float]:
+        """Verbrauchsanteil je Ressource (0 = Bucket voll, 1 = leer oder gesperrt) für die Lastmeldung."""
+        def read(now: float) -> Dict[str, float]:
+            result = {}
+            for resource in RESOURCES:
+                level, blocked = self._read(resource, now)
+                cap = self.cfg["capacity"][resource]
+                if blocked > now:
+                    result[resource] = 1.0
+                elif cap > 0:
+                    result[resource] = min(1.0, max(0.0, 1.0 - level / cap))
+            return result
+
+        return self._locked(read)
+
+    def load(self) -> float:
+        """Komponente "quota" für WorkerLoad: Verbrauch / QUOTA_LOAD_TARGET, Sperre = 1.0."""
+        values = self.pressure()
+        if not values:
+            return 0.0
+        if any(v >= 1.0 for v in values.values()):
+            return 1.0
+        return max(values.values()) / max(1e-9, self.cfg["load_target"])
+
+
+_governor: Optional[QuotaGovernor] = None
+_governor_lock = threading.Lock()
+
+
+def get_quota_governor() -> QuotaGovernor:
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = QuotaGovernor()
+        return _governor
+
+
+class CallQuota:
+    """Pro Anruf: Priorität (neu bis zur ersten Anruferrunde, danach laufend) und Anbindung an die Plugins."""
+
+    def __init__(self, governor: Optional[QuotaGovernor] = None):
+        self.governor = governor or get_quota_governor()
+        self.priority = NEW
+
+    def call_in_progress(self) -> None:
+        self.priority = ACTIVE
+
+    async def acquire(self, resource: str, amount: float, max_wait_s: Optional[float] = None) -> float:
+        try:
+            return await self.governor.acquire(resource, amount, self.priority, max_wait_s)
+        except OSError as e:
+            log.warning(f"Kontingent-Zustand nicht lesbar ({e}) – ohne Begrenzung weiter")
+            return 0.0
+
+    def llm_estimate(self, prompt_tokens: int) -> int:
+        return prompt_tokens + self.governor.cfg["llm_completion_tokens"]
+
+    def settle_llm(self, estimated: int, usage: Any) -> None:
+        """Nach dem LLM-Aufruf: Schätzung durch usage.total_tokens ersetzen."""
+        total = getattr(usage, "total_tokens", None)
+        if total is not None:
+            self.governor.settle("llm_tokens", estimated - total)
+
+    async def tts_text(self, text: AsyncIterable[str]) -> AsyncIterator[str]:
+        """TTS-Zeichen je Textstück vor der Synthese anfordern."""
+        async for chunk in text:
+            await self.acquire("tts_chars", len(chunk))
+            yield chunk
+
+    def attach(self, session: Any) -> "CallQuota":
+        """429 der Session-Plugins (LLM, TTS) als gemeinsame Sperre melden."""
+        for plugin, resource in ((getattr(session, "llm", None), "llm_tokens"), (getattr(session, "tts", None), "tts_chars")):
+            if plugin is not None and hasattr(plugin, "on"):
+                plugin.on("error", lambda ev, resource=resource: self._on_error(resource, ev))
+        return self
+
+    def _on_error(self, resource: str, ev: Any) -> None:
+        error = getattr(ev, "error", None)
+        if is_rate_limited(error):
+            self.governor.throttle(resource, retry_after_s(error, self.governor.cfg["throttle_default_s"]))
@@ -0,0 +1,138 @@
+"""
+PII-Schwärzung (DSGVO) für Logs, Transkripte und Webhook-Payloads.
+- Ein vorkompiliertes Muster mit Alternativen (E-Mail, IBAN, Telefon, Adresse, Namen nach Hinweiswörtern) -> ein Durchlauf pro Text
+- Strukturierte Daten: bekannte Felder (customer_name, phone, …) werden komplett ersetzt, Rest wird gescannt
+- Logs: LogRecord-Factory schwärzt jede ausgegebene Meldung, unabhängig davon, welche Handler LiveKit registriert
+- Benchmark: scripts/bench_redaction.py
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, Optional
+
+EMAIL = "[EMAIL]"
+IBAN = "[IBAN]"
+PHONE = "[TELEFON]"
+ADDRESS = "[ADRESSE]"
+NAME = "[NAME]"
+
+_NAME_WORD = r"[A-ZÄÖÜ][a-zäöüß]+(?:-[A-ZÄÖÜ][a-zäöüß]+)?"
+# Name des Agents ("Ich heiße Clara.") ist keine PII des Anrufers – nur allein, "Clara Müller" bleibt ein Name
+AGENT_NAMES = ("Clara",)
+# Trenner in Telefonnummern: "0208 / 12 34 56", "0171-2345678", "030 1234567"
+_PHONE_SEP = r"(?:[ ]?[/-][ ]?|[ ])"
+
+# Je Alternative eine benannte Gruppe; Reihenfolge = Priorität bei gleicher Startposition (IBAN vor Telefon, Adresse vor PLZ)
+ALTERNATIVES = [
+    r"(?P<email>[\w.+-]+@[\w-]+(?:\.[\w-]+)+)",
+    r"(?P<iban>[A-Z]{2}\d{2}(?:[ ]?[A-Z0-9]{4}){2,7}(?:[ ]?[A-Z0-9]{1,3})?\b)",
+    # international (+49/0049…), national mit Trenner nach der Vorwahl, oder national ohne Trenner ab 10 Ziffern;
+    # kurze Ziffernfolgen ("Referenz 01234567") und per "_" angehängte Kennungen (AJ_0123…) sind keine Nummern
+    r"(?P<phone>(?:(?:\+|00)[1-9]\d{0,2}[ ]?(?:\(0\)[ ]?)?\(?\d{2,5}\)?(?:" + _PHONE_SEP + r"?\d){4,11}"
+    r"|(?<!_)\(?0[1-9]\d{1,4}\)?" + _PHONE_SEP + r"\d(?:" + _PHONE_SEP + r"?\d){3,10}"
+    r"|(?<!_)0[1-9]\d{8,11})(?!\d))",
+    # Vorausschau auf eine Hausnummer, bevor die teure Straßennamen-Erkennung läuft
+    r"(?P<street>(?=[A-ZÄÖÜ][\w -]{0,40}?[egz.r][ ]?\d)(?:" + _NAME_WORD + r"[ -]){0,2}[A-ZÄÖÜ]?[a-zäöüß]*"
+    r"(?i:stra(?:ß|ss)e|str\.|weg|allee|platz|gasse|ring|damm|ufer|chaussee)[ ]?\d{1,4}(?:[ ]?[a-zA-Z]\b)?)",
+    r"(?P<plz>\d{5}[ ](?!(?:Euro|EUR|Personen|Nächte|Gäste|Minuten|Stunden|Tage)\b)" + _NAME_WORD + r"\b)",
+    r"(?P<cue>(?i:ich[ ]hei(?:ß|ss)e|mein[ ]name[ ]ist|hier[ ]ist|name:|herr|frau)[ ])"
+    r"(?P<name>(?!(?:" + "|".join(AGENT_NAMES) + r")\b(?![ -][A-ZÄÖÜ]))" + _NAME_WORD + r"(?:[ ]" + _NAME_WORD + r")?)",
+]
+
+# Treffer beginnen nur an Wortanfängen: innerhalb von Wörtern scheitert die Lookbehind-Prüfung sofort,
+# statt dass alle Alternativen an jeder Position probiert werden ("_" bleibt erlaubt: sip_+49…)
+WORD_START = r"(?<![A-Za-zÄÖÜäöüß0-9.@+-])"
+_PATTERN = re.compile(WORD_START + "(?:" + "|".join(ALTERNATIVES) + ")")
+
+_TOKENS = {"email": EMAIL, "iban": IBAN, "phone": PHONE, "street": ADDRESS, "plz": ADDRESS}
+
+# Felder in Payloads/Records, deren Wert immer vollständig PII ist
+PII_FIELDS: Dict[str, str] = {
+    "customer_name": NAME,
+    "name": NAME,
+    "caller": PHONE,
+    "phone": PHONE,
+    "email": EMAIL,
+    "address": ADDRESS,
+    "iban": IBAN,
+}
+
+
+def _get_redaction_config() -> Dict[str, Any]:
+    return {
+        "enabled": os.getenv("PII_REDACTION", "1").strip().lower() not in ("0", "false", "no", "off"),
+    }
+
+
+def redaction_enabled() -> bool:
+    return _get_redaction_config()["enabled"]
+
+
+def _replace(m: "re.Match[str]") -> str:
+    kind = m.lastgroup
+    if kind == "name":
+        return m.group("cue") + NAME
+    return _TOKENS[kind]
+
+
+def redact(text: str) -> str:
+    """Schwärzt PII in einem Text (ein Regex-Durchlauf)."""
+    if not text:
+        return text
+    return _PATTERN.sub(_replace, text)
+
+
+def redact_obj(obj: Any, fields: Optional[Dict[str, str]] = None) -> Any:
+    """Rekursiv für dict/list/str; bekannte PII-Felder werden komplett ersetzt."""
+    fields = PII_FIELDS if fields is None else fields
+    if isinstance(obj, str):
+        if obj.startswith("{"):
+            # JSON-Strings (z.B. Tool-Argumente) feldweise behandeln
+            try:
+                return json.dumps(redact_obj(json.loads(obj), fields), ensure_ascii=False)
+            except ValueError:
+                pass
+        return redact(obj)
+    if isinstance(obj, dict):
+        out = {}
+        for k, v in obj.items():
+            token = fields.get(k) if isinstance(k, str) else None
+            out[k] = token if token is not None and v not in (None, "") else redact_obj(v, fields)
+        return out
+    if isinstance(obj, (list, tuple)):
+        return [redact_obj(v, fields) for v in obj]
+    return obj
+
+
+# ---- Logging ----
+
+_factory_lock = threading.Lock()
+_installed = False
+
+
+def install_log_redaction() -> bool:
+    """Setzt eine LogRecord-Factory, die die fertige Meldung schwärzt (idempotent; PII_REDACTION=0 schaltet ab)."""
+    global _installed
+    if not redaction_enabled():
+        return False
+    with _factory_lock:
+        if _installed:
+            return True
+        base_factory = logging.getLogRecordFactory()
+
+        def factory(*args: Any, **kwargs: Any) -> logging.LogRecord:
+            record = base_factory(*args, **kwargs)
+            try:
+                message = record.getMessage()
+            except Exception:
+                return record  # kaputte Format-Argumente: Logging meldet das selbst
+            record.msg = redact(message)
+            record.args = None
+            return record
+
+        logging.setLogRecordFactory(factory)
+        _installed = True
+        return True
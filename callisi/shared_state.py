@@ -0,0 +1,58 @@
+"""
+Gemeinsamer Zustand aller Job-Prozesse eines Workers (ein Prozess pro Anruf).
+- Feste Slots (struct) in einer Datei unter WORKER_STATE_DIR, per mmap gelesen/geschrieben
+- Read-modify-write unter flock (prozessübergreifend) und einem Thread-Lock (innerhalb des Prozesses)
+- Neue Datei = Nullen; die Nutzer werten 0 als "noch nie geschrieben"
+"""
+
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+try:
+    import fcntl  # Linux/macOS; ohne fcntl nur prozesslokal
+except ImportError:
+    fcntl = None
+
+
+class SharedSlots:
+    """count Slots im Format fmt (z.B. "<ddd"); Zugriffe nur innerhalb von locked()."""
+
+    def __init__(self, path: str, fmt: str, count: int):
+        self.path = path
+        self.slot = struct.Struct(fmt)
+        self.count = count
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._map: Optional[mmap.mmap] = None
+
+    def _open(self) -> mmap.mmap:
+        if self._map is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            size = self.slot.size * self.count
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._fd, self._map = fd, mmap.mmap(fd, size)
+        return self._map
+
+    @contextmanager
+    def locked(self) -> Iterator["SharedSlots"]:
+        with self._lock:
+            self._open()
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield self
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def read(self, index: int) -> Tuple[float, ...]:
+        return self.slot.unpack_from(self._open(), index * self.slot.size)
+
+    def write(self, index: int, *values: float) -> None:
+        self.slot.pack_into(self._open(), index * self.slot.size, *values)
@@ -0,0 +1,240 @@
+"""
+Azure Speech: Auth-Token-Cache pro Job-Prozess und vorgewärmte STT/TTS-Verbindungen.
+- Token (sts/v1.0/issueToken, 10 min gültig) holt schon prewarm, also bevor der Prozess einen Anruf annimmt
+- Proaktive Erneuerung nach AZURE_SPEECH_TOKEN_REFRESH_S: laufende STT-/TTS-Instanzen bekommen das neue Token,
+  damit auch Reconnects und Synthesen in langen Anrufen nicht am abgelaufenen Token scheitern
+- Ohne Key oder bei Fehler beim Token-Abruf: Subscription-Key wie bisher (AZURE_SPEECH_TOKEN=0 erzwingt das)
+- STT: Speech-SDK einmal in prewarm anstoßen (native Bibliothek, Zertifikate, DNS, Verbindungsaufbau)
+- TTS: SPEECH_POOL_SIZE Verbindungen im HTTP-Pool des Jobs öffnen, während es klingelt (call_setup)
+- Pro Prozess ein Anruf: die vorgewärmten Leerlauf-Prozesse (WORKER_IDLE_PROCESSES) bilden den Pool für kommende Anrufe
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from callisi import metrics
+
+log = logging.getLogger("callisi.speech_pool")
+
+TOKEN_FETCH = metrics.histogram(
+    "callisi_speech_token_fetch_seconds", "Abruf des Azure-Speech-Tokens", labels=("mode",),
+)
+TOKEN_REFRESH = metrics.counter(
+    "callisi_speech_token_refresh_total", "Token-Erneuerungen nach Ergebnis", labels=("outcome",),
+)
+STT_PRIME = metrics.histogram(
+    "callisi_speech_stt_prime_seconds", "Speech-SDK anstoßen (prewarm) bis Verbindung steht",
+)
+
+TOKEN_TTL_S = 600.0  # Azure: Token 10 Minuten gültig
+
+
+def _get_speech_pool_config() -> Dict[str, Any]:
+    region = os.getenv("AZURE_SPEECH_REGION", "germanywestcentral")
+    idle = os.getenv("WORKER_IDLE_PROCESSES", "").strip()
+    return {
+        "speech_key": os.getenv("AZURE_SPEECH_KEY", ""),
+        "speech_region": region,
+        "token": os.getenv("AZURE_SPEECH_TOKEN", "1").strip().lower() not in ("0", "false", "no", "off"),
+        "token_url": os.getenv("AZURE_SPEECH_TOKEN_URL")
+        or f"https://{region}.api.cognitive.microsoft.com/sts/v1.0/issueToken",
+        "refresh_s": float(os.getenv("AZURE_SPEECH_TOKEN_REFRESH_S", "480")),
+        "timeout_s": float(os.getenv("AZURE_SPEECH_TOKEN_TIMEOUT_MS", "3000")) / 1000,
+        "prime_stt": os.getenv("SPEECH_PRIME_STT", "1").strip().lower() not in ("0", "false", "no", "off"),
+        "pool_size": max(1, int(os.getenv("SPEECH_POOL_SIZE", "2"))),
+        "idle_processes": int(idle) if idle else None,
+    }
+
+
+class SpeechTokenCache:
+    """Ein Token pro Prozess; Abruf synchron (prewarm) oder async (Job), Erneuerung vor Ablauf."""
+
+    def __init__(self, cfg: Optional[Dict[str, Any]] = None):
+        self.cfg = cfg or _get_speech_pool_config()
+        self.token: Optional[str] = None
+        self.fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh: Optional["asyncio.Task[Optional[str]]"] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.cfg["token"] and bool(self.cfg["speech_key"])
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def valid(self) -> bool:
+        # 30 s Reserve, damit ein gerade ausgegebenes Token nicht unterwegs abläuft
+        return self.token is not None and self.age() < TOKEN_TTL_S - 30
+
+    def _store(self, token: str) -> str:
+        with self._lock:
+            self.token, self.fetched_at = token, time.time()
+        return token
+
+    def fetch_sync(self) -> Optional[str]:
+        """Für prewarm (noch kein Event-Loop)."""
+        if not self.enabled:
+            return None
+        t0 = time.perf_counter()
+        try:
+            r = httpx.post(self.cfg["token_url"], headers={"Ocp-Apim-Subscription-Key": self.cfg["speech_key"]},
+                           timeout=self.cfg["timeout_s"])
+            r.raise_for_status()
+            return self._store(r.text.strip())
+        except Exception as e:
+            log.warning(f"Speech-Token (prewarm) nicht abrufbar, nutze Subscription-Key: {e}")
+            return None
+        finally:
+            TOKEN_FETCH.labels(mode="prewarm").observe(time.perf_counter() - t0)
+
+    async def fetch(self) -> Optional[str]:
+        if not self.enabled:
+            return None
+        t0 = time.perf_counter()
+        try:
+            async with httpx.AsyncClient(timeout=self.cfg["timeout_s"]) as client:
+                r = await client.post(self.cfg["token_url"], headers={"Ocp-Apim-Subscription-Key": self.cfg["speech_key"]})
+            r.raise_for_status()
+            TOKEN_REFRESH.labels(outcome="ok").inc()
+            return self._store(r.text.strip())
+        except Exception as e:
+            TOKEN_REFRESH.labels(outcome="error").inc()
+            log.warning(f"Speech-Token nicht abrufbar: {e}")
+            return None
+        finally:
+            TOKEN_FETCH.labels(mode="job").observe(time.perf_counter() - t0)
+
+    async def get(self) -> Optional[str]:
+        """Gültiges Token (ggf. Erneuerung im Hintergrund anstoßen) oder None -> Subscription-Key."""
+        if not self.enabled:
+            return None
+        if not self.valid():
+            return await self.fetch()
+        if self.age() >= self.cfg["refresh_s"] and (self._refresh is None or self._refresh.done()):
+            self._refresh = asyncio.create_task(self.fetch(), name="speech_token_refresh")
+        return self.token
+
+
+_token_cache: Optional[SpeechTokenCache] = None
+
+
+def get_speech_token_cache() -> SpeechTokenCache:
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = SpeechTokenCache()
+    return _token_cache
+
+
+def _prime_stt(cfg: Dict[str, Any], token: Optional[str]) -> None:
+    """Wegwerf-Recognizer verbinden: lädt die native SDK-Bibliothek und löst DNS/TLS einmal pro Prozess."""
+    import azure.cognitiveservices.speech as speechsdk
+
+    t0 = time.perf_counter()
+    if token:
+        speech_config = speechsdk.SpeechConfig(auth_token=token, region=cfg["speech_region"])
+    else:
+        speech_config = speechsdk.SpeechConfig(subscription=cfg["speech_key"], region=cfg["speech_region"])
+    stream = speechsdk.audio.PushAudioInputStream()
+    recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config,
+                                            audio_config=speechsdk.audio.AudioConfig(stream=stream))
+    connection = speechsdk.Connection.from_recognizer(recognizer)
+    connected = threading.Event()
+    connection.connected.connect(lambda _: connected.set())
+    connection.open(True)
+    if connected.wait(cfg["timeout_s"]):
+        STT_PRIME.observe(time.perf_counter() - t0)
+    else:
+        log.warning("Speech-SDK: Verbindung im prewarm nicht aufgebaut")
+    connection.close()
+    stream.close()
+
+
+def prewarm_speech() -> None:
+    """prewarm: Token holen und Speech-SDK anstoßen, bevor der Prozess einen Anruf annimmt."""
+    cfg = _get_speech_pool_config()
+    token = get_speech_token_cache().fetch_sync()
+    if cfg["prime_stt"] and cfg["speech_key"]:
+        try:
+            _prime_stt(cfg, token)
+        except Exception as e:
+            log.warning(f"Speech-SDK anstoßen fehlgeschlagen: {e}")
+
+
+class SpeechPlugins:
+    """STT/TTS eines Anrufs; erneuert das Token vor Ablauf und reicht es an die laufenden Instanzen weiter."""
+
+    def __init__(self, stt: Any, tts: Any, cache: SpeechTokenCache, uses_token: bool):
+        self.stt = stt
+        self.tts = tts
+        self.cache = cache
+        self.uses_token = uses_token  # False: Subscription-Key, dann bleibt alles wie gebaut
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        if self.uses_token:
+            self._task = asyncio.create_task(self._run(), name="speech_token_refresher")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(max(5.0, self.cache.cfg["refresh_s"] - self.cache.age()))
+            token = await self.cache.fetch()
+            if token is not None:
+                self.apply_token(token)
+            elif not self.cache.valid():
+                log.error("Speech-Token abgelaufen, Erneuerung fehlgeschlagen")
+
+    def apply_token(self, token: str) -> None:
+        # die Plugins lesen das Token bei jeder Synthese bzw. jedem (Re-)Connect aus ihren Optionen
+        self.tts._opts.auth_token = token
+        self.stt._config.speech_auth_token = token
+        for stream in list(getattr(self.stt, "_streams", ())):
+            stream._opts.speech_auth_token = token
+            recognizer = getattr(stream, "_recognizer", None)
+            if recognizer is not None:
+                recognizer.authorization_token = token
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+async def speech_plugins(speech_cfg: Dict[str, str], language: str, voice: str) -> SpeechPlugins:
+    """azure.STT/azure.TTS mit gecachtem Token (sonst Subscription-Key) und gestarteter Token-Erneuerung."""
+    from livekit.agents import NOT_GIVEN
+    from livekit.plugins import azure
+
+    cache = get_speech_token_cache()
+    token = await cache.get()
+    if token is None:
+        auth: Dict[str, Any] = {"speech_key": speech_cfg["speech_key"]}
+    else:
+        auth = {"speech_auth_token": token}
+    stt = azure.STT(speech_region=speech_cfg["speech_region"], language=language, **auth)
+    tts = azure.TTS(speech_region=speech_cfg["speech_region"], voice=voice, **auth)
+    if token is not None:
+        # azure.STT übernimmt sonst AZURE_SPEECH_KEY aus der ENV; Key + Token lehnt das Speech-SDK ab
+        stt._config.speech_key = NOT_GIVEN
+    plugins = SpeechPlugins(stt, tts, cache, uses_token=token is not None)
+    plugins.start()
+    return plugins
+
+
+def idle_processes() -> Optional[int]:
+    """WorkerOptions.num_idle_processes: vorgewärmte Prozesse (Token + SDK) für die nächsten Anrufe."""
+    return _get_speech_pool_config()["idle_processes"]
+
+
+def tts_pool_size() -> int:
+    return _get_speech_pool_config()["pool_size"]
@@ -0,0 +1,149 @@
+"""
+Phasenabhängige Tool-Auswahl mit kompakten Schemas (über Agent.llm_node).
+- Gesprächsphasen: info (Auskunft), booking (Verfügbarkeit/Buchung), transfer (Weiterleitung/Nachricht)
+- Pro LLM-Aufruf gehen nur die Tools der aktuellen Phase mit, die die Variante tatsächlich hat
+  (z.B. kein request_human_transfer im Basic-Agent); der Verlauf bleibt dabei unverändert
+- Kompakte Schemas: kurze Beschreibung, nur Typen, Parameter mit Default (top_k, tz) ausgeblendet, nicht strict;
+  per update_tools beim Start installiert, ausgeführt wird das Original-Tool (Pydantic-Validierung wie bisher)
+- Phasenwechsel: Buchungs-Stichworte des Anrufers bzw. Tool-Aufrufe (check_availability, erfolgreicher
+  request_human_transfer); send_to_webhook ist in jeder Phase verfügbar (Basic hat keinen Transfer)
+- TOOL_PHASES=0: alle Tools in jeder Phase; TOOL_SCHEMAS=full: Original-Schemas
+- Messung: scripts/bench_tool_schemas.py
+"""
+
+import inspect
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from livekit.agents import RunContext, llm
+from livekit.agents.llm.tool_context import get_function_info, get_raw_function_info
+from livekit.agents.llm.utils import build_legacy_openai_schema, prepare_function_arguments
+
+log = logging.getLogger("callisi.tool_registry")
+
+PHASES: Dict[str, Tuple[str, ...]] = {
+    "info": ("query_kb", "check_availability", "get_current_time", "parse_relative_time_to_iso",
+             "get_booking_status", "request_human_transfer", "send_to_webhook"),
+    "booking": ("query_kb", "check_availability", "book_appointment", "get_current_time", "parse_relative_time_to_iso",
+                "get_booking_status", "request_human_transfer", "send_to_webhook"),
+    "transfer": ("request_human_transfer", "send_to_webhook", "query_kb", "get_current_time"),
+}
+
+# Kurzbeschreibungen fürs LLM; fehlt ein Tool hier, gilt der erste Satz des Docstrings
+DESCRIPTIONS: Dict[str, str] = {
+    "query_kb": "Fakten aus der Wissensdatenbank (Apartments, Preise, Ausstattung, Anfahrt). category optional: "
+                "apartment, prices_payment, checkin_checkout, arrival, house_rules, services, contact.",
+    "check_availability": "Freie Apartments (1-5) für Anreise/Abreise (ISO-Datum).",
+    "book_appointment": "Buchung anlegen. phone leer = Anrufernummer; apartment + checkout_iso wenn bekannt.",
+    "get_booking_status": "Status einer Buchung per Referenz.",
+    "get_current_time": "Aktuelle Zeit (ISO).",
+    "parse_relative_time_to_iso": "Relative Zeitangabe ('morgen um 14 Uhr') in ISO umwandeln.",
+    "request_human_transfer": "Anrufer an einen Mitarbeiter weiterleiten.",
+    "send_to_webhook": "Strukturierte Nachricht (z.B. Rückrufwunsch) an das Team senden.",
+}
+
+# Parameter mit sinnvollem Default, die das LLM nicht zu sehen braucht
+HIDDEN_PARAMS = {"top_k", "tz"}
+
+_BOOKING_CUES = re.compile(
+    r"\b(?:buch\w*|reservier\w*|frei(?:e|en)?\b|verfügbar\w*|anreise\w*|abreise\w*|übernacht\w*|nächte|"
+    r"wochenende|apartment\s?\d)", re.IGNORECASE,
+)
+
+
+def _get_tool_registry_config() -> Dict[str, Any]:
+    return {
+        "phases": os.getenv("TOOL_PHASES", "1").strip().lower() not in ("0", "false", "no", "off"),
+        "compact": os.getenv("TOOL_SCHEMAS", "compact").strip().lower() != "full",
+    }
+
+
+def _tool_name(tool: Any) -> str:
+    if llm.is_raw_function_tool(tool):
+        return get_raw_function_info(tool).name
+    return get_function_info(tool).name
+
+
+def _compact_property(prop: Dict[str, Any]) -> Dict[str, Any]:
+    prop = dict(prop)
+    variants = [p for p in prop.pop("anyOf", []) if p.get("type") != "null"]
+    if len(variants) == 1:
+        prop.update(variants[0])
+    return {k: prop[k] for k in ("type", "enum", "items") if k in prop}
+
+
+def compact_schema(tool: llm.FunctionTool) -> Dict[str, Any]:
+    """Minimales Function-Schema (Name, Kurzbeschreibung, Parametertypen, Pflichtfelder)."""
+    info = get_function_info(tool)
+    full = build_legacy_openai_schema(tool)["function"]["parameters"]
+    signature = inspect.signature(tool)
+    properties: Dict[str, Any] = {}
+    required: List[str] = []
+    for name, prop in full.get("properties", {}).items():
+        param = signature.parameters.get(name)
+        has_default = param is not None and param.default is not inspect.Parameter.empty
+        if has_default and name in HIDDEN_PARAMS:
+            continue
+        properties[name] = _compact_property(prop)
+        if not has_default and "null" not in json.dumps(prop.get("anyOf", "")):
+            required.append(name)
+    description = DESCRIPTIONS.get(info.name) or (info.description or "").split(". ")[0][:120]
+    parameters: Dict[str, Any] = {"type": "object", "properties": properties}
+    if required:
+        parameters["required"] = required
+    return {"name": info.name, "description": description, "parameters": parameters}
+
+
+def _compact_tool(tool: llm.FunctionTool) -> llm.RawFunctionTool:
+    """Kompaktes Schema nach außen, Ausführung über das Original-Tool."""
+    schema = compact_schema(tool)
+    params = [n for n, p in inspect.signature(tool).parameters.items() if p.default is not inspect.Parameter.empty
+              or n in schema["parameters"]["properties"]]
+
+    async def call(raw_arguments: Dict[str, Any], context: RunContext) -> Any:
+        # ausgelassene Parameter als None: LiveKit setzt dafür den Default bzw. None (Optional)
+        arguments = {name: raw_arguments.get(name) for name in params}
+        args, kwargs = prepare_function_arguments(fnc=tool, json_arguments=json.dumps(arguments), call_ctx=context)
+        return await tool(*args, **kwargs)
+
+    return llm.function_tool(call, raw_schema=schema)
+
+
+class ToolRegistry:
+    """Pro Anruf: aktuelle Phase und die dafür sichtbaren Tools."""
+
+    def __init__(self, cfg: Optional[Dict[str, Any]] = None):
+        self.cfg = cfg or _get_tool_registry_config()
+        self.phase = "info"
+
+    async def install(self, agent: Any) -> None:
+        """Tools des Agents durch kompakte Varianten ersetzen (gleiche Namen, Ausführung über das Original)."""
+        if not self.cfg["compact"]:
+            return
+        tools = [_compact_tool(t) if llm.is_function_tool(t) else t for t in agent.tools]
+        await agent.update_tools(tools)
+
+    def enter(self, phase: str) -> bool:
+        """Phase setzen; True, wenn sie sich geändert hat."""
+        if phase not in PHASES or phase == self.phase:
+            return False
+        log.info(f"Gesprächsphase: {self.phase} -> {phase}")
+        self.phase = phase
+        return True
+
+    def observe_user_text(self, text: str) -> bool:
+        """Buchungs-Stichworte des Anrufers -> Phase booking (True bei Wechsel)."""
+        if self.phase == "booking" or not text or not _BOOKING_CUES.search(text):
+            return False
+        return self.enter("booking")
+
+    def select(self, tools: List[Any]) -> List[Any]:
+        """Tools für den nächsten LLM-Aufruf (Verlauf bleibt unberührt); Fremd-Tools (z.B. MCP) bleiben."""
+        if not self.cfg["phases"]:
+            return tools
+        allowed = PHASES[self.phase]
+        return [t for t in tools
+                if not (llm.is_function_tool(t) or llm.is_raw_function_tool(t)) or _tool_name(t) in allowed]
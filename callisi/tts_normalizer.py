@@ -0,0 +1,345 @@
+"""
+Deutsche Textnormalisierung vor der Sprachsynthese (LLM-Text -> Azure TTS).
+- Deterministisch statt per Prompt/KB: Uhrzeiten, Daten, Geldbeträge, Zahlen und Einheiten in Worten,
+  Telefonnummern und Postleitzahlen Ziffer für Ziffer, E-Mails buchstabenweise (at, Punkt)
+- "1" vor einem bekannten Nomen als Artikel nach Genus/Kasus ("eine Frage", "mit einem Hund"), sonst und nach
+  Bezeichnern wie "Apartment"/"Nr." als "eins"; "1." vor einem Nomen bzw. nach Artikel als Ordinalzahl ("im ersten Stock")
+- Streaming: Text wird nur an Wortgrenzen weitergegeben, an denen kein Muster (z.B. "15:00 Uhr",
+  "+49 208 …", "46149 Oberhausen") über die Grenze reicht – kurze Zurückhaltung statt ganzer Sätze
+- Nur die Audio-Ausgabe wird umgeschrieben; Transkript und Call-Records behalten den Originaltext
+- TTS_NORMALIZE=0 schaltet ab
+"""
+
+import os
+import re
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List
+
+_ONES = ["null", "eins", "zwei", "drei", "vier", "fünf", "sechs", "sieben", "acht", "neun",
+         "zehn", "elf", "zwölf", "dreizehn", "vierzehn", "fünfzehn", "sechzehn", "siebzehn", "achtzehn", "neunzehn"]
+_TENS = ["", "", "zwanzig", "dreißig", "vierzig", "fünfzig", "sechzig", "siebzig", "achtzig", "neunzig"]
+_MONTHS = ["Januar", "Februar", "März", "April", "Mai", "Juni", "Juli", "August",
+           "September", "Oktober", "November", "Dezember"]
+_ORDINAL_IRREGULAR = {1: "erst", 3: "dritt", 7: "siebt", 8: "acht"}
+
+_UNITS = {
+    "m²": "Quadratmeter", "qm": "Quadratmeter", "km": "Kilometer", "m": "Meter", "cm": "Zentimeter",
+    "kg": "Kilogramm", "min": "Minuten", "Min": "Minuten", "Std": "Stunden", "h": "Stunden", "%": "Prozent",
+}
+_UNIT_SINGULAR = {"Minuten": "Minute", "Stunden": "Stunde"}
+_ABBREVIATIONS = {"Str.": "Straße", "str.": "straße", "Nr.": "Nummer", "ca.": "circa", "z.B.": "zum Beispiel", "inkl.": "inklusive"}
+_DATIVE_CUES = {"am", "im", "vom", "von", "zum", "zur", "beim", "mit", "seit", "dem", "den", "ab", "bis"}
+
+# Nomen, vor denen "1" als Artikel gesprochen wird (m/f/n); unbekannte Wörter -> "eins"
+_GENDER = {
+    **dict.fromkeys(("Nacht", "Person", "Minute", "Stunde", "Woche", "Nummer", "Wohnung", "Ferienwohnung", "Etage",
+                     "Frage", "Anfrage", "Übernachtung", "Buchung", "Reservierung", "Stornierung", "Rechnung",
+                     "Nachricht", "Küche", "Terrasse", "Garage", "Dusche", "Toilette", "Katze", "Decke", "Karte"), "f"),
+    **dict.fromkeys(("Tag", "Monat", "Gast", "Hund", "Parkplatz", "Stellplatz", "Balkon", "Garten", "Schlüssel",
+                     "Moment", "Termin", "Aufenthalt", "Wunsch", "Raum", "Stock", "Fernseher", "Kühlschrank"), "m"),
+    **dict.fromkeys(("Apartment", "Zimmer", "Schlafzimmer", "Badezimmer", "Wohnzimmer", "Bad", "Bett", "Doppelbett",
+                     "Einzelbett", "Kinderbett", "Sofa", "Schlafsofa", "Kind", "Haustier", "Jahr", "Wochenende",
+                     "Auto", "Fahrrad", "Handtuch", "Stockwerk", "Obergeschoss", "Problem", "Frühstück"), "n"),
+}
+_ARTICLE = {"m": ("ein", "einen", "einem"), "f": ("eine", "eine", "einer"), "n": ("ein", "ein", "einem")}  # Nom./Akk./Dat.
+_ACCUSATIVE_CUES = {"für", "ohne", "um", "gegen", "durch", "habe", "hat", "haben", "hätte", "hätten", "brauche",
+                    "braucht", "brauchen", "buche", "buchen", "möchte", "möchten", "suche", "suchen", "gibt"}
+_DATIVE_ARTICLE_CUES = {"mit", "von", "bei", "nach", "aus", "seit", "zu", "in", "an", "vor"}
+# nach diesen Wörtern ist eine Zahl ein Bezeichner ("Apartment 1", "Nr. 1") -> "eins"
+_LABELS = {"apartment", "zimmer", "wohnung", "nr.", "nummer", "haus", "etage", "raum", "platz", "stellplatz",
+           "parkplatz", "gleis", "linie", "bus", "tür", "eingang", "ausgang", "option", "punkt", "seite", "kategorie"}
+# "1." als Ordinalzahl nach Artikel/Präposition oder vor diesen Nomen ("im 1. Stock", "1. Etage")
+_ORDINAL_CUES = _DATIVE_CUES | {"der", "die", "das", "des", "jeden", "jede", "jeder", "jedes", "ihr", "ihre", "ihrem",
+                                "ihren", "unser", "unsere", "unserem", "unseren"}
+_ORDINAL_NOUNS = {"Stock", "Stockwerk", "Etage", "Obergeschoss", "Geschoss", "OG", "Reihe", "Tag", "Nacht", "Woche",
+                  "Mal", "Platz"}
+
+_NAME_WORD = r"[A-ZÄÖÜ][a-zäöüß]+"
+
+
+def _get_tts_normalizer_config() -> Dict[str, Any]:
+    return {
+        "enabled": os.getenv("TTS_NORMALIZE", "1").strip().lower() not in ("0", "false", "no", "off"),
+        "max_hold_chars": int(os.getenv("TTS_NORMALIZE_MAX_HOLD_CHARS", "120")),
+    }
+
+
+# ---- Zahlwörter ----
+
+def _below_thousand(n: int) -> str:
+    hundreds, rest = divmod(n, 100)
+    words = (("ein" if hundreds == 1 else _ONES[hundreds]) + "hundert") if hundreds else ""
+    if rest == 0:
+        return words
+    if rest < 20:
+        return words + ("eins" if rest == 1 else _ONES[rest])
+    tens, ones = divmod(rest, 10)
+    if ones == 0:
+        return words + _TENS[tens]
+    return words + ("ein" if ones == 1 else _ONES[ones]) + "und" + _TENS[tens]
+
+
+def number_to_words(n: int) -> str:
+    """Kardinalzahl in Worten ("eins", "einundzwanzig", "zweitausendfünfundzwanzig")."""
+    if n < 0:
+        return "minus " + number_to_words(-n)
+    if n < 1000:
+        return _ONES[n] if n < 20 else _below_thousand(n)
+    parts = []
+    millions, rest = divmod(n, 1_000_000)
+    if millions:
+        parts.append("eine Million" if millions == 1 else number_to_words(millions) + " Millionen")
+    thousands, rest = divmod(rest, 1000)
+    if thousands:
+        parts.append(("ein" if thousands == 1 else _below_thousand(thousands)) + "tausend")
+    words = " ".join(parts) if millions else "".join(parts)
+    if rest:
+        words += (" " if millions else "") + _below_thousand(rest)
+    return words
+
+
+def ordinal_to_words(n: int, ending: str = "er") -> str:
+    """Ordinalzahl mit Endung ("erster", "dritten", "zwanzigsten")."""
+    stem = _ORDINAL_IRREGULAR.get(n) if n < 20 else None
+    if stem is None:
+        stem = number_to_words(n) + ("t" if n < 20 else "st")
+    return stem + ending
+
+
+def year_to_words(n: int) -> str:
+    if 1100 <= n < 2000:
+        century, rest = divmod(n, 100)
+        return _ONES[century] + "hundert" + (_below_thousand(rest) if rest else "")
+    return number_to_words(n)
+
+
+def digits_to_words(digits: str) -> str:
+    return " ".join(_ONES[int(d)] for d in digits if d.isdigit())
+
+
+def _cardinal_before(n: int, following: str, preceding: str = "") -> str:
+    """'eins' vor einem bekannten Nomen als Artikel sprechen ("ein Apartment", "eine Nacht", "mit einem Hund")."""
+    gender = _GENDER.get(following)
+    if n != 1 or gender is None or preceding in _LABELS:
+        return number_to_words(n)
+    case = 2 if preceding in _DATIVE_ARTICLE_CUES else 1 if preceding in _ACCUSATIVE_CUES else 0
+    return _ARTICLE[gender][case]
+
+
+def _ordinal_ending(preceding: str, before: str = "", gender: str = "") -> str:
+    """Endung nach den vorausgehenden Wörtern: "am ersten", "in der ersten", "der erste", sonst nach Genus ("erste Etage")."""
+    cue = preceding in _ORDINAL_CUES
+    if preceding in _DATIVE_CUES or preceding == "des" or (cue and preceding.endswith(("em", "en"))) or (
+            preceding == "der" and before in _DATIVE_ARTICLE_CUES):
+        return "en"
+    if preceding in ("der", "die", "das") or (cue and preceding.endswith(("e", "es"))):
+        return "e"
+    return {"f": "e", "n": "es"}.get(gender, "er")
+
+
+def _decimal_to_words(text: str) -> str:
+    whole, _, frac = text.partition(",")
+    words = number_to_words(int(whole.replace(".", "")))
+    if frac:
+        words += " Komma " + digits_to_words(frac)
+    return words
+
+
+# ---- Muster (eine Alternative je Regel, benannte Gruppen; Reihenfolge = Priorität) ----
+
+_ALTERNATIVES = [
+    r"(?P<email>[\w.+-]+@[\w-]+(?:\.[\w-]+)+)",
+    r"(?P<phone>(?:(?:\+|00)[1-9]\d{0,2}|0\d{2,4})(?:(?:[ ]?[/-][ ]?|[ ])?\(?\d+\)?){2,6}(?!\d))",
+    r"(?P<date>(?P<d_day>[0-3]?\d)\.(?P<d_month>[01]?\d)\.(?P<d_year>\d{4}|\d{2})?(?!\d))",
+    r"(?P<iso>(?P<i_year>\d{4})-(?P<i_month>[01]\d)-(?P<i_day>[0-3]\d)\b)",
+    r"(?P<money>(?:€[ ]?(?P<m_pre>\d[\d.]*(?:,\d{1,2}|,-)?)|(?P<m_post>\d[\d.]*(?:,\d{1,2}|,-)?)[ ]?(?:€|EUR\b|Euro\b)))",
+    r"(?P<time>(?P<t_hour>[0-2]?\d)[:.](?P<t_min>[0-5]\d)(?![\d.])(?:[ ]?(?P<t_uhr>Uhr)\b)?)",
+    r"(?P<hour>(?P<h_hour>[0-2]?\d)[ ]?Uhr\b)",
+    r"(?P<plz>(?P<p_digits>\d{5})(?=[ ](?!(?:Euro|EUR|Personen|Nächte|Gäste|Minuten|Stunden|Tage)\b)" + _NAME_WORD + r"))",
+    r"(?P<range>(?P<r_from>\d+)[ ]?[-–][ ]?(?P<r_to>\d+)(?![\d.,:]))",
+    r"(?P<unit>(?P<u_num>\d+(?:,\d+)?)[ ]?(?P<u_unit>m²|qm|km|cm|kg|min|Min|Std|m|h|%)(?![\w²]))",
+    r"(?P<dotdec>(?P<dd_whole>\d+)\.(?P<dd_frac>\d{4,})(?!\.?\d))",  # "3.14159"; "3.141" bleibt Tausender
+    r"(?P<number>(?P<n_value>\d{1,3}(?:\.\d{3})+|\d+)(?:,(?P<n_frac>\d+)|(?P<n_dot>\.))?(?!\w)(?:[ ](?P<n_next>[A-Za-zÄÖÜäöüß]+))?)",
+    r"(?P<abbr>(?:" + "|".join(re.escape(a) for a in _ABBREVIATIONS) + r")(?=[ ]|$))",
+]
+_PATTERN = re.compile(r"(?<![\w.@+-])(?:" + "|".join(_ALTERNATIVES) + ")")
+_PLZ_CUE = re.compile(r"\b(?:PLZ|Postleitzahl)\b\W*(?:\w+\W+)?$", re.IGNORECASE)  # "PLZ: ", "Postleitzahl ist "
+_SPELL = {"@": "at", ".": "Punkt", "-": "Bindestrich", "_": "Unterstrich", "+": "plus"}
+
+
+def _spell_email(address: str) -> str:
+    return " ".join(_SPELL.get(c) or (_ONES[int(c)] if c.isdigit() else c) for c in address)
+
+
+def _phone(text: str) -> str:
+    words = ["plus"] if text.startswith("+") else []
+    if text.startswith("00"):
+        words.append("plus")
+        text = text[2:]
+    return " ".join(words + [digits_to_words(text)])
+
+
+def _money(amount: str) -> str:
+    whole, _, cents = amount.rstrip("-").rstrip(",").partition(",")
+    if not cents and re.fullmatch(r"\d+\.\d{1,2}", whole):  # Dezimalpunkt ("3.50 Euro")
+        whole, _, cents = whole.partition(".")
+    euros = int(whole.replace(".", ""))
+    words = ("ein" if euros == 1 else number_to_words(euros)) + " Euro"
+    if cents and int(cents):
+        words += " " + number_to_words(int(cents.ljust(2, "0")))
+    return words
+
+
+def _time(hour: int, minute: int) -> str:
+    words = ("ein" if hour == 1 else number_to_words(hour)) + " Uhr"
+    return words + (" " + number_to_words(minute) if minute else "")
+
+
+def _date(day: int, month: int, year: str, preceding: str) -> str:
+    words = f"{ordinal_to_words(day, _ordinal_ending(preceding))} {_MONTHS[month - 1]}"
+    if year:
+        words += " " + year_to_words(int(year) + (2000 if len(year) == 2 else 0))
+    return words
+
+
+def _preceding_word(text: str, start: int, back: int = 1) -> str:
+    head = text[max(0, start - 24):start].split()
+    return head[-back].lower() if len(head) >= back else ""
+
+
+def normalize(text: str, context: str = "") -> str:
+    """Schreibt einen Textabschnitt für die Aussprache um (ein Regex-Durchlauf).
+    context: unmittelbar vorausgehender Originaltext (Streaming), nur für Hinweiswörter wie "am", "PLZ"."""
+    if not text or not any(c.isdigit() or c in "@€." for c in text):
+        return text
+    full = context + text
+
+    def replace(m: "re.Match[str]") -> str:
+        kind = m.lastgroup
+        g = m.group
+        if kind == "email":
+            return _spell_email(g("email"))
+        if kind == "phone":
+            return _phone(g("phone"))
+        if kind in ("date", "iso"):
+            prefix = "d_" if kind == "date" else "i_"
+            day, month = int(g(prefix + "day")), int(g(prefix + "month"))
+            if not (1 <= day <= 31 and 1 <= month <= 12):
+                return m.group(0)
+            return _date(day, month, g(prefix + "year") or "", _preceding_word(full, m.start()))
+        if kind == "time":
+            if int(g("t_hour")) > 24 or (g("t_uhr") is None and "." in g("time")):
+                return g("time")  # "3.50" ohne "Uhr" ist eher ein Betrag/Dezimalwert
+            return _time(int(g("t_hour")), int(g("t_min")))
+        if kind == "hour":
+            return _time(int(g("h_hour")), 0)
+        if kind == "money":
+            return _money(g("m_pre") or g("m_post"))
+        if kind == "plz":
+            return digits_to_words(g("p_digits"))
+        if kind == "range":
+            return f"{number_to_words(int(g('r_from')))} bis {number_to_words(int(g('r_to')))}"
+        if kind == "unit":
+            unit = _UNITS[g("u_unit")]
+            num = g("u_num")
+            if num == "1":
+                return "eine " + _UNIT_SINGULAR[unit] if unit in _UNIT_SINGULAR else "ein " + unit
+            return _decimal_to_words(num) + " " + unit
+        if kind == "abbr":
+            return _ABBREVIATIONS[g("abbr")]
+        if kind == "dotdec":
+            return _decimal_to_words(f"{g('dd_whole')},{g('dd_frac')}")
+        # Zahl, optional mit Punkt (Ordinalzahl) und folgendem Wort (für "ein"/"eine")
+        following = g("n_next") or ""
+        value = g("n_value")
+        preceding = _preceding_word(full, m.start())
+        tail = " " + following if following else ""
+        if g("n_frac"):
+            return _decimal_to_words(f"{value},{g('n_frac')}") + tail
+        if len(value) == 5 and _PLZ_CUE.search(full, max(0, m.start() - 30), m.start()):
+            return digits_to_words(value) + (g("n_dot") or "") + tail
+        n = int(value.replace(".", ""))
+        if g("n_dot"):
+            if following and n < 100 and (preceding in _ORDINAL_CUES or following in _ORDINAL_NOUNS):
+                ending = _ordinal_ending(preceding, _preceding_word(full, m.start(), 2), _GENDER.get(following, ""))
+                return ordinal_to_words(n, ending) + tail
+            return number_to_words(n) + "." + tail
+        return _cardinal_before(n, following, preceding) + tail
+
+    parts, last = [], len(context)
+    for m in _PATTERN.finditer(full, len(context)):
+        parts += [full[last:m.start()], replace(m)]
+        last = m.end()
+    parts.append(full[last:])
+    return "".join(parts)
+
+
+# ---- Streaming ----
+
+# Wörter, nach denen ein Muster noch weitergehen kann ("am 15.03.", "€ 70", "Str. 9")
+# Artikel-/Kasus-/Ordinal-Hinweise und Bezeichner werden für die folgende Zahl gebraucht; "/" und "-" in Telefonnummern
+_HOLD_AFTER = re.compile(r"[\d@€+]|^[/-]$|^(?:" + "|".join(re.escape(w) for w in sorted(
+    _ORDINAL_CUES | _ACCUSATIVE_CUES | _DATIVE_ARTICLE_CUES | _LABELS | set(_ABBREVIATIONS))) + r")$", re.IGNORECASE)
+
+
+class StreamingNormalizer:
+    """Puffert LLM-Deltas bis zu einer sicheren Wortgrenze und gibt sie normalisiert weiter."""
+
+    def __init__(self, max_hold_chars: int = 120):
+        self.max_hold_chars = max_hold_chars
+        self._buf = ""
+        self._context = ""  # Ende des bereits freigegebenen Originaltexts (Hinweiswörter über die Schnittstelle)
+
+    def _safe_cut(self) -> int:
+        """Position nach dem letzten Leerzeichen, hinter dem kein Muster mehr weitergehen kann (0 = nichts)."""
+        end = len(self._buf)
+        while True:
+            ws = max(self._buf.rfind(" ", 0, end), self._buf.rfind("\n", 0, end))
+            if ws <= 0:
+                return 0
+            word = self._buf[:ws].rsplit(None, 1)[-1] if self._buf[:ws].strip() else ""
+            if not _HOLD_AFTER.search(word.rstrip(",;:!?")):
+                return ws + 1
+            end = ws
+
+    def push(self, chunk: str) -> str:
+        self._buf += chunk
+        cut = self._safe_cut()
+        if cut == 0 and len(self._buf) > self.max_hold_chars:
+            # Notbremse (z.B. lange Zahlenkolonne): an letzter Leerstelle freigeben
+            cut = max(self._buf.rfind(" "), self._buf.rfind("\n")) + 1
+        if cut <= 0:
+            return ""
+        out, self._buf = self._buf[:cut], self._buf[cut:]
+        return self._normalize(out)
+
+    def flush(self) -> str:
+        out, self._buf = self._buf, ""
+        return self._normalize(out)
+
+    def _normalize(self, out: str) -> str:
+        words = normalize(out, self._context)
+        self._context = (self._context + out)[-32:]
+        return words
+
+
+async def normalize_stream(text: AsyncIterable[str]) -> AsyncIterator[str]:
+    """Für Agent.tts_node: normalisierter Textstrom (TTS_NORMALIZE=0 reicht unverändert durch)."""
+    cfg = _get_tts_normalizer_config()
+    if not cfg["enabled"]:
+        async for chunk in text:
+            yield chunk
+        return
+    normalizer = StreamingNormalizer(cfg["max_hold_chars"])
+    async for chunk in text:
+        out = normalizer.push(chunk)
+        if out:
+            yield out
+    tail = normalizer.flush()
+    if tail:
+        yield tail
+
+
+def normalize_all(chunks: List[str]) -> str:
+    """Synchron über eine Chunk-Liste (Skripte/Prüfung): identisch zum Streaming-Ergebnis."""
+    normalizer = StreamingNormalizer(_get_tts_normalizer_config()["max_hold_chars"])
+    return "".join(normalizer.push(c) for c in chunks) + normalizer.flush()
@@ -0,0 +1,42 @@
+"""
+Latenzbudget pro Gesprächsrunde.
+- Startet, wenn der Anrufer ausgeredet hat (on_user_turn_completed)
+- Tools (z.B. query_kb) fragen das Restbudget ab und setzen daraus ihre Deadline
+"""
+
+import os
+import time
+from typing import Any, Dict
+
+
+def _get_turn_budget_config() -> Dict[str, Any]:
+    return {
+        "total_s": float(os.getenv("TURN_BUDGET_MS", "1200")) / 1000,
+        "reserve_s": float(os.getenv("TURN_BUDGET_RESERVE_MS", "0")) / 1000,
+        "min_tool_s": float(os.getenv("TURN_BUDGET_MIN_TOOL_MS", "250")) / 1000,
+    }
+
+
+class TurnBudget:
+    """Budget ab Turn-Ende; reserve_s bleibt für die Antwort nach dem Tool (LLM/TTS) übrig."""
+
+    def __init__(self, total_s: float = 1.2, reserve_s: float = 0.0, min_tool_s: float = 0.25):
+        self.total_s = total_s
+        self.reserve_s = reserve_s
+        self.min_tool_s = min_tool_s
+        self.started = time.monotonic()
+
+    @classmethod
+    def start(cls) -> "TurnBudget":
+        cfg = _get_turn_budget_config()
+        return cls(cfg["total_s"], cfg["reserve_s"], cfg["min_tool_s"])
+
+    def elapsed_s(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining_s(self) -> float:
+        return max(0.0, self.total_s - self.elapsed_s())
+
+    def tool_deadline_s(self) -> float:
+        """Zeit, die ein Tool jetzt noch verbrauchen darf (nie unter min_tool_s)."""
+        return max(self.min_tool_s, self.remaining_s() - self.reserve_s)
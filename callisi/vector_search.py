@@ -0,0 +1,101 @@
+"""
+Pinecone-Abfragen ohne Blockieren des Event-Loops.
+- Synchrone Client-Aufrufe laufen in einem eigenen, begrenzten ThreadPool (PINECONE_MAX_WORKERS)
+- Parallelitätslimit pro Worker-Prozess (PINECONE_MAX_CONCURRENCY) + Deadline je Abfrage (PINECONE_QUERY_TIMEOUT_MS)
+- Index-Verbindung wird pro Prozess einmal aufgebaut und wiederverwendet
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from callisi import metrics
+
+log = logging.getLogger("callisi.vector_search")
+
+QUERY_LATENCY = metrics.histogram("callisi_pinecone_query_seconds", "Dauer der Pinecone-Abfragen (inkl. Warten auf Slot)")
+QUERY_TIMEOUTS = metrics.counter("callisi_pinecone_query_timeouts_total", "Pinecone-Abfragen mit Deadline-Überschreitung")
+QUERY_INFLIGHT = metrics.gauge("callisi_pinecone_queries_inflight", "Laufende Pinecone-Abfragen")
+
+
+def _get_vector_search_config() -> Dict[str, Any]:
+    return {
+        "max_workers": int(os.getenv("PINECONE_MAX_WORKERS", "4")),
+        "max_concurrency": int(os.getenv("PINECONE_MAX_CONCURRENCY", "8")),
+        "timeout_s": float(os.getenv("PINECONE_QUERY_TIMEOUT_MS", "1500")) / 1000,
+    }
+
+
+class VectorSearch:
+    """Asynchrone Fassade über einen synchronen Pinecone-Index."""
+
+    def __init__(self, connect_fn: Callable[[], Any], max_workers: int = 4, max_concurrency: int = 8, timeout_s: float = 1.5):
+        self.connect_fn = connect_fn
+        self.max_concurrency = max_concurrency
+        self.timeout_s = timeout_s
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pinecone")
+        self._index: Any = None
+        self._index_lock = threading.Lock()
+        # Semaphore je Event-Loop (Thread-Executor: mehrere Jobs/Loops pro Prozess)
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+    def _get_index(self) -> Any:
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._index = self.connect_fn()
+        return self._index
+
+    def _query_sync(self, kwargs: Dict[str, Any]) -> Any:
+        return self._get_index().query(**kwargs)
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        sem = self._semaphores.get(loop)
+        if sem is None:
+            sem = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = sem
+        return sem
+
+    async def query(self, timeout_s: Optional[float] = None, **kwargs) -> Any:
+        """index.query(**kwargs) im ThreadPool; asyncio.TimeoutError nach Deadline (Warten auf Slot zählt mit)."""
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+
+        async def _run() -> Any:
+            async with self._semaphore():
+                QUERY_INFLIGHT.inc()
+                try:
+                    return await loop.run_in_executor(self._pool, self._query_sync, kwargs)
+                finally:
+                    QUERY_INFLIGHT.dec()
+
+        try:
+            return await asyncio.wait_for(_run(), timeout=timeout_s if timeout_s is not None else self.timeout_s)
+        except asyncio.TimeoutError:
+            QUERY_TIMEOUTS.inc()
+            raise
+        finally:
+            QUERY_LATENCY.observe(time.perf_counter() - t0)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False)
+
+
+_search: Optional[VectorSearch] = None
+_search_lock = threading.Lock()
+
+
+def get_vector_search(connect_fn: Callable[[], Any]) -> VectorSearch:
+    """Prozessweite Instanz; connect_fn wird beim ersten Query (im Pool-Thread) aufgerufen."""
+    global _search
+    with _search_lock:
+        if _search is None:
+            cfg = _get_vector_search_config()
+            _search = VectorSearch(connect_fn, cfg["max_workers"], cfg["max_concurrency"], cfg["timeout_s"])
+        return _search
@@ -0,0 +1,153 @@
+"""
+Lastmeldung des Workers an LiveKit (WorkerOptions.load_fnc) für die Verteilung über die Railway-Replicas.
+- Komponenten (1.0 = Ziel erreicht): aktive Jobs / WORKER_MAX_JOBS, CPU / WORKER_CPU_TARGET,
+  Loop-Lag / WORKER_LAG_TARGET_MS, Azure-Kontingent / QUOTA_LOAD_TARGET
+- Gemeldete Last = max(Komponenten) * WORKER_LOAD_THRESHOLD: LiveKit hält den Worker ab load >= load_threshold für
+  voll, d.h. genau dann, wenn eine Komponente ihr Ziel erreicht (z.B. beim WORKER_MAX_JOBS-ten Anruf)
+- Loop-Lag kommt aus den Job-Prozessen: LagReporter schreibt ihn periodisch nach WORKER_STATE_DIR
+"""
+
+import asyncio
+import glob
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from callisi import metrics
+from callisi.quota import get_quota_governor
+
+log = logging.getLogger("callisi.worker_load")
+
+WORKER_LOAD = metrics.gauge(
+    "callisi_worker_load", "Gemeldete Worker-Last je Komponente (1.0 = voll)", ["component"], multiprocess_mode="liveall",
+)
+
+
+def _get_worker_load_config() -> Dict[str, Any]:
+    return {
+        "max_jobs": int(os.getenv("WORKER_MAX_JOBS", "8")),
+        "threshold": float(os.getenv("WORKER_LOAD_THRESHOLD", "0.75")),
+        "cpu_target": float(os.getenv("WORKER_CPU_TARGET", "0.8")),
+        "lag_target_s": float(os.getenv("WORKER_LAG_TARGET_MS", "200")) / 1000,
+        "state_dir": os.getenv("WORKER_STATE_DIR", "/tmp/callisi-worker"),
+        "lag_max_age_s": float(os.getenv("WORKER_LAG_MAX_AGE_SECONDS", "5")),
+    }
+
+
+class WorkerLoad:
+    """Als load_fnc verwendbar: WorkerOptions(load_fnc=WorkerLoad(), load_threshold=...)."""
+
+    def __init__(self, cfg: Optional[Dict[str, Any]] = None):
+        self.cfg = cfg or _get_worker_load_config()
+        self.threshold = self.cfg["threshold"]
+        self._cpu_samples: Deque[float] = deque(maxlen=5)
+        self._cpu_lock = threading.Lock()
+        self._cpu_thread: Optional[threading.Thread] = None
+        self.last: Dict[str, float] = {}
+
+    def _sample_cpu(self) -> None:
+        from livekit.agents.utils.hw import get_cpu_monitor  # cgroup-bewusst (Container-Quota)
+        monitor = get_cpu_monitor()
+        while True:
+            value = monitor.cpu_percent(interval=0.5)
+            with self._cpu_lock:
+                self._cpu_samples.append(value)
+
+    def _cpu(self) -> float:
+        if self._cpu_thread is None:
+            self._cpu_thread = threading.Thread(target=self._sample_cpu, daemon=True, name="callisi-cpu-load")
+            self._cpu_thread.start()
+        with self._cpu_lock:
+            return sum(self._cpu_samples) / len(self._cpu_samples) if self._cpu_samples else 0.0
+
+    def job_loop_lag_s(self) -> float:
+        """Höchster gemeldeter Loop-Lag aller laufenden Job-Prozesse (veraltete Dateien zählen nicht)."""
+        now = time.time()
+        worst = 0.0
+        for path in glob.glob(os.path.join(self.cfg["state_dir"], "lag-*")):
+            try:
+                if now - os.stat(path).st_mtime > self.cfg["lag_max_age_s"]:
+                    continue
+                with open(path, "r") as f:
+                    worst = max(worst, float(f.read().strip() or 0.0))
+            except (OSError, ValueError):
+                continue
+        return worst
+
+    def _quota(self) -> float:
+        # Buckets der Job-Prozesse (quota.bin in WORKER_STATE_DIR): neue Anrufe abweisen, bevor das Kontingent leer ist
+        try:
+            return get_quota_governor().load()
+        except OSError as e:
+            log.debug(f"Kontingent-Zustand nicht lesbar: {e}")
+            return 0.0
+
+    def __call__(self, worker: Any) -> float:
+        jobs = len(worker.active_jobs)
+        components = {
+            "jobs": jobs / max(1, self.cfg["max_jobs"]),
+            "cpu": self._cpu() / self.cfg["cpu_target"],
+            "loop_lag": self.job_loop_lag_s() / self.cfg["lag_target_s"],
+            "quota": self._quota(),
+        }
+        peak = max(components.values())
+        # Ziel erreicht (z.B. jobs == WORKER_MAX_JOBS) -> 1.0, sonst unterhalb der Schwelle skaliert
+        load = 1.0 if peak >= 1.0 else peak * self.threshold
+        components["total"] = load
+        for name, value in components.items():
+            WORKER_LOAD.labels(component=name).set(value)
+        self.last = components
+        return load
+
+
+class LagReporter:
+    """Läuft im Job-Prozess: misst den Loop-Lag und schreibt das Maximum je Meldeintervall in eine Datei."""
+
+    def __init__(self, job_id: str, state_dir: str, tick_s: float = 0.1, report_s: float = 1.0):
+        self.path = os.path.join(state_dir, f"lag-{os.getpid()}-{job_id or 'job'}")
+        self.tick_s = tick_s
+        self.report_s = report_s
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._task = asyncio.create_task(self._run(), name="lag-reporter")
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        worst = 0.0
+        last_report = loop.time()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.tick_s)
+            worst = max(worst, loop.time() - t0 - self.tick_s)
+            if loop.time() - last_report >= self.report_s:
+                try:
+                    with open(self.path, "w") as f:
+                        f.write(f"{max(0.0, worst):.4f}")
+                except OSError as e:
+                    log.debug(f"Lag-Report nicht geschrieben: {e}")
+                worst = 0.0
+                last_report = loop.time()
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def start_lag_reporter(job_id: str) -> LagReporter:
+    reporter = LagReporter(job_id, _get_worker_load_config()["state_dir"])
+    reporter.start()
+    return reporter
@@ -0,0 +1,164 @@
+"""
+Query-Embeddings: Azure OpenAI vs. lokales ONNX-Modell auf der CPU (EMBED_BACKEND=local).
+- Kaltstart: erster Aufruf (Azure: Verbindungsaufbau, lokal: Modell laden)
+- Latenz einer Anruferfrage (p50/p95/p99), seriell und mit --parallel gleichzeitigen Anfragen (mehrere Anrufe)
+- Durchsatz beim Indexieren: Chunks der Wissensbasis (wie ingest_kb) in Batches von --batch-size
+- Laufen beide Backends: Überschneidung der Top-3-Treffer je Frage (Retrieval-Qualität lokal vs. Azure)
+
+Beispiel:
+    python scripts/bench_embeddings.py --backends azure,local --queries 50 --parallel 4
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ingest_kb import _embed_config, chunk_text, iter_files, parse_file, token_counter  # noqa: E402
+
+from callisi.embeddings import aclose_clients, azure_embed, get_local_embedder, local_embed  # noqa: E402
+
+# typische Anruferfragen (query_kb)
+QUESTIONS = [
+    "Wann ist der Check-in?",
+    "Bis wann muss ich morgen auschecken?",
+    "Gibt es WLAN in der Wohnung?",
+    "Wie viel kostet die Endreinigung?",
+    "Kann ich mit Karte bezahlen?",
+    "Sind Haustiere erlaubt?",
+    "Wie komme ich vom Bahnhof zu Ihnen?",
+    "Gibt es einen Parkplatz?",
+    "Welches Apartment passt für vier Personen?",
+    "Hat das Apartment eine Küche?",
+    "Do you have a washing machine?",
+    "Kann ich früher anreisen?",
+]
+
+Embed = Callable[[List[str], str], Awaitable[List[List[float]]]]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def backends(names: List[str]) -> Dict[str, Embed]:
+    result: Dict[str, Embed] = {}
+    for name in names:
+        if name == "azure":
+            cfg = _embed_config()
+            if not (cfg["api_key"] and cfg["endpoint"] and cfg["deployment"]):
+                print("azure: übersprungen (AZURE_OPENAI_EMBEDDING_* nicht gesetzt)")
+                continue
+            result[name] = lambda texts, kind, cfg=cfg: azure_embed(texts, cfg)
+        elif name == "local":
+            result[name] = lambda texts, kind: local_embed(texts, kind=kind)
+        else:
+            raise SystemExit(f"Unbekanntes Backend: {name}")
+    return result
+
+
+def passages(paths: List[str]) -> List[str]:
+    count = token_counter()
+    return [chunk for path in iter_files(paths) for _title, text, _extra in parse_file(path)
+            for chunk in chunk_text(text, 350, 50, count)]
+
+
+async def measure(name: str, embed: Embed, args: argparse.Namespace, texts: List[str]) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    if name == "local":
+        await asyncio.to_thread(get_local_embedder)
+    await embed([QUESTIONS[0]], "query")
+    cold_ms = (time.perf_counter() - t0) * 1000
+
+    serial: List[float] = []
+    for i in range(args.queries):
+        t = time.perf_counter()
+        await embed([QUESTIONS[i % len(QUESTIONS)]], "query")
+        serial.append((time.perf_counter() - t) * 1000)
+
+    parallel: List[float] = []
+
+    async def one(i: int) -> None:
+        t = time.perf_counter()
+        await embed([QUESTIONS[i % len(QUESTIONS)]], "query")
+        parallel.append((time.perf_counter() - t) * 1000)
+
+    for start in range(0, args.queries, args.parallel):
+        await asyncio.gather(*(one(i) for i in range(start, min(args.queries, start + args.parallel))))
+
+    t = time.perf_counter()
+    for i in range(0, len(texts), args.batch_size):
+        await embed(texts[i:i + args.batch_size], "passage")
+    throughput = len(texts) / max(1e-9, time.perf_counter() - t)
+
+    return {"cold_ms": cold_ms, "serial": serial, "parallel": parallel, "throughput": throughput}
+
+
+async def top_hits(embed: Embed, texts: List[str], batch_size: int, k: int = 3) -> List[List[int]]:
+    import numpy as np
+
+    matrix: List[List[float]] = []
+    for i in range(0, len(texts), batch_size):
+        matrix.extend(await embed(texts[i:i + batch_size], "passage"))
+    m = np.asarray(matrix, dtype=np.float32)
+    m /= np.maximum(np.linalg.norm(m, axis=1, keepdims=True), 1e-12)
+    q = np.asarray(await embed(QUESTIONS, "query"), dtype=np.float32)
+    q /= np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+    return [list(np.argsort(-row)[:k]) for row in q @ m.T]
+
+
+async def run(args: argparse.Namespace) -> int:
+    selected = backends([b.strip() for b in args.backends.split(",") if b.strip()])
+    if not selected:
+        print("Kein Backend verfügbar.")
+        return 1
+    texts = passages(args.paths)
+    print(f"{len(texts)} Chunks aus {', '.join(args.paths)}, {args.queries} Fragen, {args.parallel} parallel, "
+          f"Batch {args.batch_size}")
+    print(f"\n  {'Backend':<8} {'Kaltstart':>10} {'p50':>8} {'p95':>8} {'p99':>8} "
+          f"{f'p95 ({args.parallel} par.)':>15} {'Chunks/s':>9}")
+    try:
+        for name, embed in list(selected.items()):
+            try:
+                r = await measure(name, embed, args, texts)
+            except Exception as e:
+                print(f"  {name:<8} fehlgeschlagen: {e}")
+                del selected[name]
+                continue
+            s, par = r["serial"], r["parallel"]
+            print(f"  {name:<8} {r['cold_ms']:>8.0f}ms {_percentile(s, 50):>6.1f}ms {_percentile(s, 95):>6.1f}ms "
+                  f"{_percentile(s, 99):>6.1f}ms {_percentile(par, 95):>13.1f}ms {r['throughput']:>9.1f}")
+        if len(selected) == 2:
+            azure, local = [await top_hits(selected[n], texts, args.batch_size) for n in ("azure", "local")]
+            overlap = sum(len(set(a) & set(b)) for a, b in zip(azure, local)) / (3 * len(QUESTIONS))
+            same_first = sum(a[0] == b[0] for a, b in zip(azure, local)) / len(QUESTIONS)
+            print(f"\nTop-3-Überschneidung lokal vs. Azure: {overlap:.0%}, gleicher bester Treffer: {same_first:.0%}")
+    finally:
+        await aclose_clients()
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    load_dotenv(".env")
+    p = argparse.ArgumentParser(description="Latenz und Durchsatz: Azure-Embeddings vs. lokales ONNX-Modell.")
+    p.add_argument("paths", nargs="*", default=["kb"], help="Wissensbasis für den Durchsatz (Standard: kb/)")
+    p.add_argument("--backends", default="azure,local")
+    p.add_argument("--queries", type=int, default=50, help="Fragen je Messung")
+    p.add_argument("--parallel", type=int, default=4, help="gleichzeitige Fragen (parallele Anrufe)")
+    p.add_argument("--batch-size", type=int, default=32, help="Chunks pro Aufruf beim Durchsatz")
+    args = p.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Durchsatz-Benchmark der PII-Schwärzung (callisi.redaction).
+- Synthetische deutsche Transkript-/Logzeilen mit und ohne PII
+- Misst Zeilen/s, MB/s und µs pro Zeile für den Ein-Durchlauf-Redactor
+- Vergleich: dieselben Muster nacheinander (ein re.sub pro Muster)
+
+Beispiel:
+    python scripts/bench_redaction.py --lines 200000 --pii-ratio 0.3
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from typing import Callable, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from callisi import redaction  # noqa: E402
+
+PLAIN = [
+    "Guten Tag, ich hätte gerne eine Auskunft zum Check-in.",
+    "Wann ist der Check-out am Sonntag?",
+    "Gibt es Parkplätze in der Nähe der Apartments?",
+    "Ist Apartment 5 am nächsten Wochenende noch frei?",
+    "query_kb: Turn-Budget überschritten (812 ms)",
+    "Buchung aufgenommen (Referenz BK-3F2A9C). Die Bestätigung wird im Hintergrund übermittelt.",
+]
+PII = [
+    "Mein Name ist {first} {last}, erreichbar unter 0176 {n4} {n4}.",
+    "Phone call connected from participant: sip_+49176{n4}{n4}",
+    "Bitte an {mail} schicken, ich wohne in der {street} {no}, {plz} Berlin.",
+    "IBAN DE89 3704 0044 0532 0130 00 für die Kaution, Frau {last}.",
+    "Rückruf an +49 30 {n4}{n4} veranlassen.",
+]
+FIRST = ["Max", "Anna", "Lena", "Jonas", "Fatma", "Lukas"]
+LAST = ["Mustermann", "Schmidt", "Yilmaz", "Meier", "Schulz"]
+STREETS = ["Hauptstraße", "Lindenweg", "Berliner Allee", "Marktplatz"]
+
+
+def make_lines(n: int, pii_ratio: float, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(n):
+        if rng.random() < pii_ratio:
+            lines.append(rng.choice(PII).format(
+                first=rng.choice(FIRST), last=rng.choice(LAST), n4=rng.randint(1000, 9999),
+                mail=f"{rng.choice(FIRST).lower()}.{rng.choice(LAST).lower()}@example.de",
+                street=rng.choice(STREETS), no=rng.randint(1, 120), plz=rng.randint(10000, 99999),
+            ))
+        else:
+            lines.append(rng.choice(PLAIN))
+    return lines
+
+
+def sequential_redactor() -> Callable[[str], str]:
+    """Referenz: jede Alternative des kombinierten Musters als eigenes re.sub."""
+    parts = [re.compile(redaction.WORD_START + alt) for alt in redaction.ALTERNATIVES]
+
+    def run(text: str) -> str:
+        for pattern in parts:
+            text = pattern.sub(redaction._replace, text)
+        return text
+
+    return run
+
+
+def bench(name: str, fn: Callable[[str], str], lines: List[str], repeat: int) -> None:
+    total_bytes = sum(len(line.encode("utf-8")) for line in lines)
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for line in lines:
+            fn(line)
+        best = min(best, time.perf_counter() - t0)
+    print(f"{name:>12}: {len(lines) / best:>12,.0f} Zeilen/s | {total_bytes / best / 1e6:>7.1f} MB/s | "
+          f"{best / len(lines) * 1e6:>6.2f} µs/Zeile")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark der PII-Schwärzung")
+    ap.add_argument("--lines", type=int, default=100000)
+    ap.add_argument("--pii-ratio", type=float, default=0.3, help="Anteil der Zeilen mit PII")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--show", type=int, default=5, help="Beispielzeilen ausgeben")
+    args = ap.parse_args()
+
+    lines = make_lines(args.lines, args.pii_ratio, args.seed)
+    for line in lines[: args.show]:
+        print(f"  {line}\n  -> {redaction.redact(line)}")
+    print()
+    bench("ein Durchlauf", redaction.redact, lines, args.repeat)
+    bench("sequenziell", sequential_redactor(), lines, args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
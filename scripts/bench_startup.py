@@ -0,0 +1,125 @@
+"""
+Kaltstart-Benchmark eines Agent-Moduls.
+- Modus "import" (Standard, ohne Netz): frische Python-Prozesse messen Modul-Import und prewarm (VAD, Indizes)
+- Modus "worker": startet `python <agent>.py start` und misst bis "registered worker" im Log
+  (braucht LIVEKIT_URL / LIVEKIT_API_KEY / LIVEKIT_API_SECRET)
+- Optional die langsamsten Imports (python -X importtime)
+
+Beispiel:
+    python scripts/bench_startup.py --agent livekit_agent_dsgvo --runs 5 --top 10
+    python scripts/bench_startup.py --agent agent_basic --mode worker
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORT_PROBE = """
+import sys, time, json
+t0 = time.perf_counter()
+import importlib
+mod = importlib.import_module(sys.argv[1])
+t1 = time.perf_counter()
+class _Proc:
+    userdata = {}
+mod.prewarm(_Proc())
+t2 = time.perf_counter()
+print("BENCH " + json.dumps({"import_s": t1 - t0, "prewarm_s": t2 - t1}))
+"""
+
+
+def _run_import_probe(agent: str) -> Dict[str, float]:
+    t0 = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", _IMPORT_PROBE, agent], cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stdout
+    total = time.perf_counter() - t0
+    line = next(ln for ln in out.splitlines() if ln.startswith("BENCH "))
+    result = json.loads(line[len("BENCH "):])
+    result["process_s"] = total  # inkl. Interpreter-Start
+    return result
+
+
+def _slowest_imports(agent: str, top: int) -> List[Tuple[float, str]]:
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {agent}"], cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            _, cumulative, name = line.split("|")
+            rows.append((int(cumulative) / 1e6, name.rstrip()))
+        except ValueError:
+            continue
+    # nur direkte Imports des Agent-Moduls (Tiefe 1), sonst zählen verschachtelte Pakete doppelt
+    direct = [(s, n.strip()) for s, n in rows if (len(n) - len(n.lstrip()) - 1) // 2 == 1]
+    return sorted(direct, reverse=True)[:top]
+
+
+def bench_import(agent: str, runs: int, top: int) -> None:
+    samples = [_run_import_probe(agent) for _ in range(runs)]
+    print(f"{agent}: {runs} frische Prozesse")
+    for key in ("process_s", "import_s", "prewarm_s"):
+        values = [s[key] for s in samples]
+        print(f"  {key:<10} median {statistics.median(values) * 1000:>8.0f} ms | min {min(values) * 1000:>8.0f} ms | max {max(values) * 1000:>8.0f} ms")
+    if top:
+        print(f"\nLangsamste Imports (kumuliert, Top {top}):")
+        for seconds, name in _slowest_imports(agent, top):
+            print(f"  {seconds * 1000:>8.0f} ms  {name}")
+
+
+def bench_worker(agent: str, timeout_s: float) -> int:
+    missing = [k for k in ("LIVEKIT_URL", "LIVEKIT_API_KEY", "LIVEKIT_API_SECRET") if not os.getenv(k)]
+    if missing:
+        print(f"Fehlende ENV für Modus worker: {', '.join(missing)}")
+        return 2
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, f"{agent}.py", "start"], cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    registered: Optional[float] = None
+    try:
+        for line in proc.stdout:
+            if time.perf_counter() - t0 > timeout_s:
+                break
+            if "registered worker" in line:
+                registered = time.perf_counter() - t0
+                break
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    if registered is None:
+        print(f"Worker nicht innerhalb von {timeout_s:.0f} s registriert")
+        return 1
+    print(f"{agent}: Prozessstart -> Worker registriert: {registered * 1000:.0f} ms")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Kaltstart-Benchmark (Import, prewarm, Worker-Registrierung).")
+    p.add_argument("--agent", default="livekit_agent_dsgvo", help="Agent-Modul (z.B. agent_basic)")
+    p.add_argument("--mode", choices=["import", "worker"], default="import")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--top", type=int, default=10, help="langsamste Imports ausgeben (0 = aus)")
+    p.add_argument("--timeout", type=float, default=120.0, help="Timeout für Modus worker (s)")
+    args = p.parse_args(argv)
+    if args.mode == "worker":
+        return bench_worker(args.agent, args.timeout)
+    bench_import(args.agent, args.runs, args.top)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
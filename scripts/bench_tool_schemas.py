@@ -0,0 +1,86 @@
+"""
+Prompt-Tokens der Tool-Schemas pro LLM-Aufruf: alle Original-Schemas vs. phasenabhängige kompakte Schemas.
+- Baut TelephonyAssistant jeder Variante und serialisiert die Tools wie das OpenAI-Plugin (strict)
+- Je Phase (info, booking, transfer): Anzahl Tools, Zeichen, Tokens und Ersparnis pro Turn
+- Tokens mit tiktoken (o200k_base), falls installiert, sonst geschätzt (CONTEXT_CHARS_PER_TOKEN)
+
+Beispiel:
+    python scripts/bench_tool_schemas.py --agents agent_basic,livekit_agent_dsgvo --turns 20
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import sys
+from typing import Callable, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from livekit.plugins.openai.utils import to_fnc_ctx  # noqa: E402
+
+from callisi.tool_registry import PHASES, ToolRegistry  # noqa: E402
+
+try:
+    import tiktoken  # optional, genaue Zählung
+except Exception:
+    tiktoken = None
+
+
+def token_counter() -> Callable[[str], int]:
+    if tiktoken is not None:
+        enc = tiktoken.get_encoding("o200k_base")
+        return lambda text: len(enc.encode(text))
+    chars_per_token = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "3.5"))
+    return lambda text: int(len(text) / chars_per_token)
+
+
+class _ToolHolder:
+    """Minimaler update_tools-Empfänger für ToolRegistry.install (ohne laufende Session)."""
+
+    def __init__(self, tools: List) -> None:
+        self.tools = tools
+
+    async def update_tools(self, tools: List) -> None:
+        self.tools = tools
+
+
+def measure(agent_module: str, turns: int, count: Callable[[str], int]) -> None:
+    mod = importlib.import_module(agent_module)
+    agent = mod.TelephonyAssistant()
+    full = json.dumps(to_fnc_ctx(agent.tools), ensure_ascii=False)
+    full_tokens = count(full)
+
+    registry = ToolRegistry({"phases": True, "compact": True})
+    holder = _ToolHolder(agent.tools)
+    asyncio.run(registry.install(holder))
+
+    print(f"\n{agent_module}: {len(agent.tools)} Tools, alle Original-Schemas: {len(full):>5} Zeichen, {full_tokens:>4} Tokens")
+    print(f"  {'Phase':<9} {'Tools':>5} {'Zeichen':>8} {'Tokens':>7} {'Ersparnis/Turn':>15} {f'über {turns} Turns':>14}")
+    for phase in PHASES:
+        registry.phase = phase
+        selected = registry.select(holder.tools)
+        text = json.dumps(to_fnc_ctx(selected), ensure_ascii=False)
+        tokens = count(text)
+        saved = full_tokens - tokens
+        print(f"  {phase:<9} {len(selected):>5} {len(text):>8} {tokens:>7} {saved:>9} ({saved / max(1, full_tokens):>4.0%}) {saved * turns:>14}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Token-Ersparnis durch phasenabhängige, kompakte Tool-Schemas.")
+    p.add_argument("--agents", default="agent_basic,agent_forward_sms,agent_forward_whatsapp,livekit_agent_dsgvo")
+    p.add_argument("--turns", type=int, default=20, help="LLM-Aufrufe pro Anruf für die Hochrechnung")
+    args = p.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+    count = token_counter()
+    print("Tokenzählung:", "tiktoken o200k_base" if tiktoken is not None else "geschätzt (Zeichen / CONTEXT_CHARS_PER_TOKEN)")
+    for name in args.agents.split(","):
+        measure(name.strip(), args.turns, count)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
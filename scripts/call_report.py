@@ -0,0 +1,381 @@
+"""
+Auswertung der Call-Records (callisi.call_recorder, JSONL oder SQLite) als Bericht – offline, ohne Worker.
+- Turn-Latenz je Stufe (Endpointing, STT, LLM-TTFT, TTS-TTFB, Antwortzeit, ...): p50/p95/p99
+- Weiterleitungen: Erfolgsquote je Tagesstunde (connected / alle Versuche)
+- Häufigste query_kb-Fragen mit Trefferscore (bester Treffer je Aufruf), Anteil ohne Treffer
+- Fehlerquote je Tool
+- Liest in Blöcken (konstanter Speicher); Latenzen kommen per Regex direkt als NumPy-Spalten aus dem Block, nur
+  die seltenen Ereignisse (Tool-Calls, Weiterleitungen, Anrufende) werden als JSON geparst
+- Eine Datei je Prozess (--workers); rotierte Dateien, die vor --since endeten, werden nicht geöffnet
+
+Beispiel:
+    python scripts/call_report.py data/calls --since 2026-09-01 --until 2026-10-01 --top 20
+"""
+
+import argparse
+import array
+import datetime
+import glob
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+try:
+    import numpy as np
+except Exception as e:
+    raise SystemExit(f"Fehlende Bibliothek: {e}. Installiere mit: pip install numpy")
+
+# Stufe -> (Record-kind, Metrik-Typ bei kind=metrics, Feld in Sekunden)
+STAGES: Dict[str, Tuple[str, Optional[str], str]] = {
+    "endpointing": ("metrics", "eou_metrics", "end_of_utterance_delay"),
+    "stt": ("metrics", "eou_metrics", "transcription_delay"),
+    "on_user_turn": ("metrics", "eou_metrics", "on_user_turn_completed_delay"),
+    "llm_ttft": ("metrics", "llm_metrics", "ttft"),
+    "llm_total": ("metrics", "llm_metrics", "duration"),
+    "tts_ttfb": ("metrics", "tts_metrics", "ttfb"),
+    "response": ("turn_latency", None, "response_s"),
+    "first_audio": ("first_audio", None, "pickup_to_first_audio_s"),
+}
+KINDS = {k for k, _t, _f in STAGES.values()} | {"transfer", "tool_call", "call_end"}
+TRANSFER_OUTCOMES = ("connected", "timeout", "failed", "invalid_target")
+
+_NUM = rb"(-?[0-9][0-9.eE+-]*)"
+
+
+def _head(kind: str, mtype: Optional[str]) -> bytes:
+    return kind.encode() + (b'", "type": "' + mtype.encode() if mtype else b"")
+
+
+# Zeilenanfang des Recorders (json.dumps): call_id, room, ts, kind, danach die Felder (Metriken: type zuerst)
+_HEADS: Dict[bytes, List[Tuple[str, "re.Pattern[bytes]"]]] = {}
+for _name, (_kind, _mtype, _field) in STAGES.items():
+    _HEADS.setdefault(_head(_kind, _mtype), []).append((_name, re.compile(b'"' + _field.encode() + b'": ' + _NUM)))
+_STAGE_LINE_RE = re.compile(rb'"ts": ' + _NUM + rb', "kind": "(' + b"|".join(map(re.escape, _HEADS)) + rb')"([^\n]*)')
+_EVENT_RE = re.compile(rb'"kind": "(?:tool_call|transfer|call_end)"')
+_SCORE = re.compile(r"""["']score["']:\s*(-?[0-9.]+(?:[eE][-+]?[0-9]+)?)""")
+_ROTATED = re.compile(r"calls-(\d{8}-\d{6})(?:-\d+)?\.(?:jsonl|sqlite3)$")
+_CHUNK_BYTES = 32 * 1024 * 1024
+
+
+class Partial:
+    """Teilergebnis einer Datei: Stufen-Latenzen als NumPy-Spalten, Ereignisse (Tools, Weiterleitungen, Anrufende) als
+    kompakte array-Spalten bzw. kleine Zähler-Dicts."""
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, List[np.ndarray]] = {name: [] for name in STAGES}
+        self.transfer_ts = array.array("d")
+        self.transfer_outcome = array.array("b")  # Index in TRANSFER_OUTCOMES, -1 = sonstiges
+        self.call_durations = array.array("d")
+        self.turns = array.array("q")
+        self.tools: Dict[str, List[int]] = {}  # Tool -> [Aufrufe, Fehler]
+        self.queries: Dict[str, List[float]] = {}  # Frage -> [Aufrufe, Scoresumme, Aufrufe mit Score]
+        self.first_ts = float("inf")
+        self.last_ts = 0.0
+        self.lines = 0
+
+    def add_chunk(self, buf: bytes, since: float, until: float) -> None:
+        """Ganze Zeilen: Stufenwerte per Regex als Spalten (ohne JSON-Parsen), Ereignisse einzeln geparst."""
+        self.lines += buf.count(b"\n")
+        found = _STAGE_LINE_RE.findall(buf)
+        if found:
+            ts_col, head_col, rest_col = zip(*found)
+            ts = np.asarray(ts_col, dtype=np.bytes_).astype(np.float64)
+            heads = np.asarray(head_col, dtype=np.bytes_)
+            rests = np.asarray(rest_col, dtype=object)
+            keep = (ts >= since) & (ts < until)
+            if keep.any():
+                self.first_ts = min(self.first_ts, float(ts[keep].min()))
+                self.last_ts = max(self.last_ts, float(ts[keep].max()))
+            for head, stages in _HEADS.items():
+                selected = rests[keep & (heads == head)]
+                if not selected.size:
+                    continue
+                # Felder aller passenden Zeilen in einem Durchgang; fehlt ein Feld (null), fehlt nur dieser Wert
+                joined = b"\n".join(selected.tolist())
+                for name, field_re in stages:
+                    values = np.asarray(field_re.findall(joined), dtype=np.bytes_).astype(np.float64)
+                    # LiveKit meldet "nicht gemessen" als -1
+                    self.stages[name].append(values[values >= 0])
+        self._add_events(buf, since, until)
+
+    def _add_events(self, buf: bytes, since: float, until: float) -> None:
+        for m in _EVENT_RE.finditer(buf):
+            end = buf.find(b"\n", m.end())
+            try:
+                rec = json.loads(buf[buf.rfind(b"\n", 0, m.start()) + 1:end if end >= 0 else len(buf)])
+            except ValueError:
+                continue  # abgebrochene Zeile (Absturz mitten im Schreiben)
+            ts = float(rec.get("ts") or 0)
+            if since <= ts < until:
+                self.add_event(rec, ts)
+
+    def add_event(self, rec: Dict[str, Any], ts: float) -> None:
+        kind = rec.get("kind")
+        self.first_ts, self.last_ts = min(self.first_ts, ts), max(self.last_ts, ts)
+        if kind == "tool_call":
+            self._add_tool(rec)
+        elif kind == "transfer":
+            outcome = rec.get("outcome")
+            self.transfer_ts.append(ts)
+            self.transfer_outcome.append(TRANSFER_OUTCOMES.index(outcome) if outcome in TRANSFER_OUTCOMES else -1)
+        elif kind == "call_end":
+            self.call_durations.append(float(rec.get("duration_s") or 0))
+            self.turns.append(int(rec.get("turns") or 0))
+
+    def _add_tool(self, rec: Dict[str, Any]) -> None:
+        tool = str(rec.get("tool") or "?")
+        counts = self.tools.setdefault(tool, [0, 0])
+        counts[0] += 1
+        counts[1] += int(bool(rec.get("is_error")))
+        if tool != "query_kb":
+            return
+        try:
+            query = json.loads(rec.get("arguments") or "{}").get("query", "")
+        except (ValueError, AttributeError):
+            return
+        query = " ".join(str(query).lower().split()).rstrip("?!. ")
+        if not query:
+            return
+        # Ausgabe = str(hits), bester Treffer zuerst; "hinweis" statt Treffern -> kein Score
+        m = _SCORE.search(rec.get("output") or "")
+        stats = self.queries.setdefault(query, [0, 0.0, 0])
+        stats[0] += 1
+        if m:
+            stats[1] += float(m.group(1))
+            stats[2] += 1
+
+    def merge(self, other: "Partial") -> None:
+        for name, values in other.stages.items():
+            self.stages[name].extend(values)
+        self.transfer_ts.extend(other.transfer_ts)
+        self.transfer_outcome.extend(other.transfer_outcome)
+        self.call_durations.extend(other.call_durations)
+        self.turns.extend(other.turns)
+        for tool, (calls, errors) in other.tools.items():
+            counts = self.tools.setdefault(tool, [0, 0])
+            counts[0] += calls
+            counts[1] += errors
+        for query, (n, score_sum, scored) in other.queries.items():
+            stats = self.queries.setdefault(query, [0, 0.0, 0])
+            stats[0] += n
+            stats[1] += score_sum
+            stats[2] += scored
+        self.first_ts, self.last_ts = min(self.first_ts, other.first_ts), max(self.last_ts, other.last_ts)
+        self.lines += other.lines
+
+
+# ---- Lesen ----
+
+def _jsonl_chunks(path: str) -> Iterator[bytes]:
+    """Blöcke von ~_CHUNK_BYTES, immer an Zeilenenden geschnitten (konstanter Speicher, auch bei GB-Dateien)."""
+    rest = b""
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(_CHUNK_BYTES)
+            if not block:
+                break
+            block = rest + block
+            cut = block.rfind(b"\n") + 1
+            rest = block[cut:]
+            if cut:
+                yield block[:cut]
+    if rest:
+        yield rest + b"\n"
+
+
+def _sqlite_chunks(path: str, since: float, until: float) -> Iterator[bytes]:
+    """Gleiche Zeilen wie JSONL (Spalte data = json.dumps des Records); Filter auf kind und ts macht SQLite."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        marks = ",".join("?" * len(KINDS))
+        cursor = conn.execute(
+            f"SELECT data FROM call_events WHERE kind IN ({marks}) AND ts >= ? AND ts < ?", (*sorted(KINDS), since, until),
+        )
+        while True:
+            rows = cursor.fetchmany(50000)
+            if not rows:
+                break
+            yield ("\n".join(data for (data,) in rows) + "\n").encode("utf-8")
+    except sqlite3.OperationalError:
+        return  # leere Datei ohne Tabelle
+    finally:
+        conn.close()
+
+
+def scan_file(path: str, since: float = 0.0, until: float = float("inf")) -> Partial:
+    part = Partial()
+    chunks = _sqlite_chunks(path, since, until) if path.endswith(".sqlite3") else _jsonl_chunks(path)
+    for buf in chunks:
+        part.add_chunk(buf, since, until)
+    return part
+
+
+def record_files(paths: List[str], since: float = 0.0) -> List[str]:
+    """calls*.jsonl / calls*.sqlite3 in den Verzeichnissen; rotierte Dateien, die vor since endeten, entfallen."""
+    files: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "calls*.jsonl")) + glob.glob(os.path.join(path, "calls*.sqlite3"))))
+        elif os.path.exists(path):
+            files.append(path)
+    result = []
+    for path in files:
+        m = _ROTATED.search(os.path.basename(path))
+        # Zeitstempel im Namen = Rotation (lokale Zeit), danach kamen keine Records mehr dazu
+        if m and time.mktime(time.strptime(m.group(1), "%Y%m%d-%H%M%S")) < since:
+            continue
+        result.append(path)
+    return result
+
+
+def scan(files: List[str], since: float, until: float, workers: int) -> Partial:
+    total = Partial()
+    if workers <= 1 or len(files) <= 1:
+        for path in files:
+            total.merge(scan_file(path, since, until))
+        return total
+    with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+        for part in pool.map(scan_file, files, [since] * len(files), [until] * len(files)):
+            total.merge(part)
+    return total
+
+
+# ---- Aggregation ----
+
+def build_report(part: Partial, top: int = 20, utc_offset_h: float = 0.0) -> Dict[str, Any]:
+    stages = {}
+    for name, values in part.stages.items():
+        v = np.concatenate(values) * 1000 if values else np.empty(0)
+        if not v.size:
+            continue
+        p50, p95, p99 = np.percentile(v, [50, 95, 99])
+        stages[name] = {"n": int(v.size), "p50_ms": round(float(p50), 1), "p95_ms": round(float(p95), 1),
+                        "p99_ms": round(float(p99), 1), "mean_ms": round(float(v.mean()), 1)}
+
+    ts = np.frombuffer(part.transfer_ts, dtype=np.float64) if len(part.transfer_ts) else np.empty(0)
+    outcome = np.frombuffer(part.transfer_outcome, dtype=np.int8) if len(part.transfer_outcome) else np.empty(0, np.int8)
+    hours = ((ts + utc_offset_h * 3600) // 3600 % 24).astype(np.int64)
+    attempts = np.bincount(hours, minlength=24)
+    connected = np.bincount(hours[outcome == 0], minlength=24)
+    by_outcome = np.bincount(outcome[outcome >= 0].astype(np.int64), minlength=len(TRANSFER_OUTCOMES))
+    transfers = {
+        "attempts": int(ts.size),
+        "success_rate": round(float(connected.sum() / ts.size), 3) if ts.size else None,
+        "outcomes": {o: int(n) for o, n in zip(TRANSFER_OUTCOMES, by_outcome)},
+        "by_hour": [{"hour": h, "attempts": int(attempts[h]), "connected": int(connected[h]),
+                     "success_rate": round(float(connected[h] / attempts[h]), 3)}
+                    for h in np.nonzero(attempts)[0].tolist()],
+    }
+
+    names = sorted(part.queries)  # gleiche Anzahl -> alphabetisch (stabile Sortierung)
+    q = np.asarray([part.queries[n] for n in names], dtype=np.float64).reshape(-1, 3)
+    order = np.argsort(-q[:, 0], kind="stable")[:top]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_score = np.where(q[:, 2] > 0, q[:, 1] / q[:, 2], np.nan)
+    queries = [{"query": names[i], "count": int(q[i, 0]),
+                "mean_top_score": None if np.isnan(mean_score[i]) else round(float(mean_score[i]), 3),
+                "no_hits": int(q[i, 0] - q[i, 2])} for i in order.tolist()]
+
+    tools = sorted(part.tools.items(), key=lambda kv: -kv[1][0])
+    t = np.asarray([c for _n, c in tools], dtype=np.float64).reshape(-1, 2)
+    tool_rows = [{"tool": n, "calls": int(t[i, 0]), "errors": int(t[i, 1]), "error_rate": round(float(t[i, 1] / t[i, 0]), 3)}
+                 for i, (n, _c) in enumerate(tools)]
+
+    durations = np.frombuffer(part.call_durations, dtype=np.float64) if len(part.call_durations) else np.empty(0)
+    turns = np.frombuffer(part.turns, dtype=np.int64) if len(part.turns) else np.empty(0)
+    return {
+        "lines": part.lines,
+        "from": part.first_ts if part.last_ts else None,
+        "to": part.last_ts if part.last_ts else None,
+        "calls": int(durations.size),
+        "call_duration_p50_s": round(float(np.median(durations)), 1) if durations.size else None,
+        "turns_per_call_mean": round(float(turns.mean()), 1) if turns.size else None,
+        "stages": stages,
+        "transfers": transfers,
+        "top_queries": queries,
+        "tools": tool_rows,
+    }
+
+
+def print_report(r: Dict[str, Any], utc_offset_h: float) -> None:
+    def when(ts: Optional[float]) -> str:
+        if ts is None:
+            return "-"
+        tz = datetime.timezone(datetime.timedelta(hours=utc_offset_h))
+        return datetime.datetime.fromtimestamp(ts, tz).strftime("%Y-%m-%d %H:%M")
+
+    print(f"{r['lines']} Zeilen gelesen, {r['calls']} Anrufe, {when(r['from'])} – {when(r['to'])}")
+    if r["calls"]:
+        print(f"Anrufdauer p50 {r['call_duration_p50_s']}s, Ø {r['turns_per_call_mean']} Turns pro Anruf")
+
+    print(f"\nTurn-Latenz je Stufe\n  {'Stufe':<14} {'n':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'Ø':>9}")
+    for name, s in r["stages"].items():
+        print(f"  {name:<14} {s['n']:>8} {s['p50_ms']:>7.0f}ms {s['p95_ms']:>7.0f}ms {s['p99_ms']:>7.0f}ms {s['mean_ms']:>7.0f}ms")
+
+    t = r["transfers"]
+    print(f"\nWeiterleitungen: {t['attempts']} Versuche"
+          + (f", Erfolg {t['success_rate']:.0%} (" + ", ".join(f"{o} {n}" for o, n in t["outcomes"].items()) + ")"
+             if t["attempts"] else ""))
+    if t["by_hour"]:
+        print(f"  {'Stunde':<8} {'Versuche':>9} {'verbunden':>10} {'Quote':>7}")
+        for h in t["by_hour"]:
+            print(f"  {h['hour']:02d}:00    {h['attempts']:>9} {h['connected']:>10} {h['success_rate']:>7.0%}")
+
+    print(f"\nHäufigste query_kb-Fragen\n  {'Anzahl':>7} {'Ø Score':>8} {'ohne':>5}  Frage")
+    for q in r["top_queries"]:
+        score = "-" if q["mean_top_score"] is None else f"{q['mean_top_score']:.3f}"
+        print(f"  {q['count']:>7} {score:>8} {q['no_hits']:>5}  {q['query'][:80]}")
+
+    print(f"\nTools\n  {'Tool':<28} {'Aufrufe':>8} {'Fehler':>7} {'Quote':>7}")
+    for tool in r["tools"]:
+        print(f"  {tool['tool']:<28} {tool['calls']:>8} {tool['errors']:>7} {tool['error_rate']:>7.1%}")
+
+
+def _timestamp(value: Optional[str], default: float) -> float:
+    """ISO-Datum/-Zeit (lokale Zeit) -> Unix-Zeit."""
+    if not value:
+        return default
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    load_dotenv(".env")
+    p = argparse.ArgumentParser(description="Bericht aus den Call-Records (Latenzen, Weiterleitungen, query_kb, Tools).")
+    p.add_argument("paths", nargs="*", default=[os.getenv("CALL_RECORD_DIR", "data/calls")],
+                   help="Verzeichnisse oder Dateien (Standard: CALL_RECORD_DIR)")
+    p.add_argument("--since", help="ab (ISO, z.B. 2026-09-01)")
+    p.add_argument("--until", help="bis ausschließlich (ISO)")
+    p.add_argument("--top", type=int, default=20, help="Anzahl häufigster query_kb-Fragen")
+    p.add_argument("--utc-offset", type=float, default=None,
+                   help="Zeitzone der Stunden-Auswertung in Stunden (Standard: lokale Zeit)")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Prozesse (eine Datei je Prozess)")
+    p.add_argument("--json", action="store_true", help="Bericht als JSON ausgeben")
+    args = p.parse_args(argv)
+
+    since, until = _timestamp(args.since, 0.0), _timestamp(args.until, float("inf"))
+    utc_offset_h = args.utc_offset if args.utc_offset is not None else time.localtime().tm_gmtoff / 3600
+    files = record_files(args.paths, since)
+    if not files:
+        print(f"Keine Call-Records gefunden in: {', '.join(args.paths)}", file=sys.stderr)
+        return 1
+
+    t0 = time.perf_counter()
+    report = build_report(scan(files, since, until, args.workers), args.top, utc_offset_h)
+    elapsed = time.perf_counter() - t0
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report, utc_offset_h)
+        print(f"\n{len(files)} Dateien in {elapsed:.1f}s ausgewertet")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,139 +1,620 @@
+"""
+Wissensbasis indexieren: Verzeichnis mit Markdown-, HTML- und PDF-Dateien -> Pinecone + lokale Replica.
+- Streaming-Pipeline: Datei lesen -> Abschnitte (Überschriften) -> Chunks -> Embeddings in Batches -> Upsert
+- Chunks token-basiert (--chunk-tokens) mit Überlappung (--overlap-tokens), an Satzgrenzen geschnitten;
+  Tokens mit tiktoken (cl100k_base), falls installiert, sonst geschätzt (CONTEXT_CHARS_PER_TOKEN)
+- Speicher begrenzt: nur --concurrency Batches gleichzeitig im Speicher, unabhängig von der Korpusgröße
+- Checkpoint nach jedem Batch: abgebrochener Lauf setzt beim nächsten Start dort fort (--restart verwirft ihn)
+- Stabile IDs (Hash des relativen Dateipfads + Chunk-Nr.): erneutes Indexieren überschreibt statt zu duplizieren;
+  hat eine Datei weniger Chunks als beim letzten Lauf oder wurde sie gelöscht/umbenannt, werden die alten Vektoren
+  entfernt (bisheriger Stand aus der lokalen Replica, Löschen per ID-Präfix bzw. Metadaten-Filter)
+- Lokale Replica (KB_REPLICA_PATH) für den Hedge in query_kb wird am Ende atomar ersetzt; Zeilen von Dateien
+  außerhalb der angegebenen Pfade werden übernommen (Teil-Läufe wie `ingest_kb.py kb/faq.md`)
+- PDF braucht pypdf (optional); Überschrift = title, erster Teil des Titels = category, Dateipfad = source
+- Mandanten: --namespace (bzw. KB_NAMESPACE) schreibt in den Pinecone-Namespace und eine eigene Replica-Datei
+- Embeddings über Azure oder lokal (--backend local bzw. EMBED_BACKEND=local, ONNX auf der CPU); Worker und Index
+  müssen dasselbe Modell nutzen – beim Wechsel neu indexieren (Pinecone-Index mit passender Dimension)
+
+Beispiel:
+    python scripts/ingest_kb.py kb/ --batch-size 64
+    python scripts/ingest_kb.py kb/hotel-b/ --namespace hotel-b
+    python scripts/ingest_kb.py kb/ --backend local --restart    # Re-Index mit lokalem Modell
+    python scripts/ingest_kb.py kb/ --dry-run    # nur parsen/chunken, keine API-Aufrufe
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
 import os
-import uuid
+import re
+import sys
+import time
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
 from dotenv import load_dotenv
 
-load_dotenv(".env")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from callisi.embeddings import (  # noqa: E402
+    aclose_clients,
+    azure_embed,
+    embedding_id,
+    get_local_embedder,
+    local_embed,
+)
+from callisi.kb_retrieval import replica_path  # noqa: E402
 
 try:
-    from openai import AzureOpenAI
-    from azure.core.credentials import AzureKeyCredential
-    from pinecone import Pinecone
-except Exception as e:
-    raise SystemExit(f"Fehlende Bibliotheken: {e}. Installiere mit: pip install openai azure-core pinecone python-dotenv")
-
-# Embedding-Deployment aus .env
-EMBED_API_KEY = os.getenv("AZURE_OPENAI_EMBEDDING_API_KEY")
-EMBED_API_BASE = os.getenv("AZURE_OPENAI_EMBEDDING_ENDPOINT").rstrip("/")
-EMBED_DEPLOY = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME")
-EMBED_API_VERSION = os.getenv("AZURE_OPENAI_EMBEDDING_API_VERSION", "2024-12-01-preview")
-
-# Pinecone Konfiguration
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-PINECONE_INDEX = os.getenv("PINECONE_INDEX", "aparts-index")
-PINECONE_ENV = os.getenv("PINECONE_ENV")
-
-if not (PINECONE_API_KEY and PINECONE_ENV and EMBED_API_KEY and EMBED_API_BASE and EMBED_DEPLOY):
-    raise SystemExit("Setze PINECONE_* und AZURE_OPENAI_EMBEDDING_* Variablen in .env")
-
-
-# Azure OpenAI Client (neue API)
-client = AzureOpenAI(
-    api_version=EMBED_API_VERSION,
-    azure_endpoint=EMBED_API_BASE,
-    api_key=EMBED_API_KEY
-) 
-
-# Pinecone Setup
-pc = Pinecone(api_key=PINECONE_API_KEY)
-index = pc.Index(PINECONE_INDEX)
-
-# Deine Knowledge Base-Dokumente
-docs = [
-    {
-        "title": "hotel.info",
-        "text": "Aparts Oberhausen – Ferienwohnungen und Messeapartments, ideal für Gäste, die Komfort, zentrale Lage und barrierefreie Apartments suchen. Adresse: Neumühler Str. 9, 46149 Oberhausen."
-    },
-    {
-        "title": "contact",
-        "text": "Telefon: +49 208 77807218; Mobil: +49 176 31737442; E-Mail: info@aparts-ob.de; Inhaber: Frank Backofen; Managerin: Bianca."
-    },
-    {
-        "title": "arrival",
-        "text": "Anfahrt: 50 m vom Bahnhof Oberhausen Sterkrade. Ca. 5 Minuten zum Centro, Theatro, ARENA. Kostenloser Parkplatz auf den ausgewiesenen Flächen hinter dem Ferienhaus."
-    },
-    {
-        "title": "rooms.overview",
-        "text": "5 Apartments (3–6 Personen). Alle Apartments mit kompletter Küche, barrierefreiem Bad, großzügigem Wohn‑Schlafraum, King‑Size‑Boxspringbetten, WLAN/LAN, Smart TV, Bettwäsche & Handtücher, Hotel‑Hausschuhe."
-    },
-    {
-        "title": "apartment.1_2",
-        "text": "Apt 1 & 2: Erdgeschoss, barrierefrei, 40–50 m², Max. 2 Pers. + 1 Beistellbett, Apt2 mit Terrasse, rollstuhlgerechte Ausstattung, eigener Parkplatz."
-    },
-    {
-        "title": "apartment.3_4",
-        "text": "Apt 3 & 4: 1. Etage, ca. 48–52 m², Max. 2 Pers. + 1 Beistellbett, Apt3 extragroße Küche, flexibler Express-Check-In."
-    },
-    {
-        "title": "apartment.5",
-        "text": "Apt 5 (LuxusLoft): 95 m², bis 6 Pers. + 2 Beistellbetten, 3 Schlafzimmer, 4 Smart TVs, TOP Wannen- und Duschbad."
-    },
-    {
-        "title": "services",
-        "text": "Service: Airport-Transfer (DUS/DTM), Transfer zur Messe, Room Service inkl. Wäschetausch."
-    },
-    {
-        "title": "house_rules",
-        "text": "Hausordnung: Ruhezeiten 23:00–7:00, Rauchen innen verboten, Haustiere 1 Hund pro Apartment erlaubt (Reinigungsvormerkung bei Nässe), Schäden melden."
-    },
-    {
-        "title": "checkin_checkout",
-        "text": "Check-in ab 15:00 Uhr, Check-out bis 10:30 Uhr. Zugang per Code-Tastatur; Safe mit Schlüsselcodes."
-    },
-    {
-        "title": "wifi_tv",
-        "text": "WLAN & LAN in allen Apartments; Smart-TV mit Streaming (Netflix, AmazonPrime). Zugangscode wird vor Anreise per E-Mail mitgeteilt."
-    },
-    {
-        "title": "prices_payment",
-        "text": "Startpreise ab 70 € pro Nacht; Bezahlung online oder vor Ort per Karte; Barzahlung nur nach Absprache."
-    },
-    {
-        "title": "cleaning_fees",
-        "text": "Reinigungsgebühren bei Mehraufwand: Apt1–4: 54 €; Apt5: 89 €."
-    },
-    {
-        "title": "speech_rules",
-        "text": (
-            "Aussprache: Namen ausformulieren; Hausnummern in Worten; Postleitzahlen Ziffer-für-Ziffer; Maße und Einheiten ausformulieren; "
-            "Telefonnummern Ziffer-für-Ziffer; E-Mails buchstabenweise (at, Punkt); Uhrzeiten in Worten; Geldbeträge in Worten; Daten in deutscher Form."
-        )
-    },
-    {
-        "title": "booking_flow",
-        "text": "Buchungsreihenfolge: 1) vollständiger Name, 2) Wohnadresse, 3) Handynummer inkl. Vorwahl, 4) E-Mail für Bestätigung, 5) Zahlungswunsch (Karte/bar). Verwende Anrufernummer, wenn vorhanden."
-    },
-    {
-        "title": "fallback",
-        "text": "Fallback/Eskalation: 'Entschuldigung, da bin ich mir nicht sicher. Ich verbinde Sie nun mit einem unserer Mitarbeiter.'"
+    import tiktoken  # optional, genaue Zählung
+except Exception:
+    tiktoken = None
+
+EXTENSIONS = (".md", ".markdown", ".html", ".htm", ".pdf")
+PINECONE_MAX_BATCH = 100
+
+
+def token_counter(backend: str = "azure") -> Callable[[str], int]:
+    if backend == "local":
+        return get_local_embedder().count_tokens  # Tokenizer des lokalen Modells (Limit LOCAL_EMBED_MAX_TOKENS)
+    if tiktoken is not None:
+        enc = tiktoken.get_encoding("cl100k_base")  # Tokenizer der text-embedding-3-Modelle
+        return lambda text: len(enc.encode(text))
+    chars_per_token = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "3.5"))
+    return lambda text: max(1, int(len(text) / chars_per_token))
+
+
+# --------------------------------------------------------------------------------------
+# Parsen: jede Datei liefert (title, text, extra_metadata) pro Abschnitt – als Generator
+# --------------------------------------------------------------------------------------
+
+_HEADING = re.compile(r"^(#{1,3})\s+(.+?)\s*#*\s*$")
+_MD_LINK = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+_MD_MARKUP = re.compile(r"(\*\*|__|\*|`)")
+_HTML_COMMENT = re.compile(r"<!--.*?-->", re.S)
+
+Section = Tuple[str, str, Dict[str, Any]]
+
+
+def parse_markdown(path: str, default_title: str) -> Iterator[Section]:
+    title, lines = default_title, []
+    in_comment = False
+    with open(path, "r", encoding="utf-8") as f:
+        for raw in f:
+            line = raw.rstrip("\n")
+            if in_comment:
+                if "-->" not in line:
+                    continue
+                line, in_comment = line.split("-->", 1)[1], False
+            line = _HTML_COMMENT.sub("", line)
+            if "<!--" in line:
+                line, in_comment = line.split("<!--", 1)[0], True
+            m = _HEADING.match(line)
+            if m:
+                if any(s.strip() for s in lines):
+                    yield title, "\n".join(lines), {}
+                title, lines = m.group(2).strip(), []
+                continue
+            lines.append(_MD_MARKUP.sub("", _MD_LINK.sub(r"\1", line)))
+    if any(s.strip() for s in lines):
+        yield title, "\n".join(lines), {}
+
+
+class _HTMLSections(HTMLParser):
+    """Text außerhalb von script/style; h1–h3 beginnen einen neuen Abschnitt."""
+
+    BLOCK = {"p", "div", "li", "tr", "br", "section", "article", "table", "ul", "ol"}
+
+    def __init__(self, default_title: str):
+        super().__init__(convert_charrefs=True)
+        self.title = default_title
+        self.parts: List[str] = []
+        self.done: List[Section] = []
+        self._skip = 0
+        self._heading: Optional[List[str]] = None
+
+    def handle_starttag(self, tag: str, attrs: Any) -> None:
+        if tag in ("script", "style", "nav", "footer"):
+            self._skip += 1
+        elif tag in ("h1", "h2", "h3"):
+            self._heading = []
+        elif tag in self.BLOCK:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in ("script", "style", "nav", "footer"):
+            self._skip = max(0, self._skip - 1)
+        elif tag in ("h1", "h2", "h3") and self._heading is not None:
+            self.flush()
+            self.title = " ".join("".join(self._heading).split()) or self.title
+            self._heading = None
+
+    def handle_data(self, data: str) -> None:
+        if self._skip:
+            return
+        (self._heading if self._heading is not None else self.parts).append(data)
+
+    def flush(self) -> None:
+        text = "".join(self.parts)
+        if text.strip():
+            self.done.append((self.title, text, {}))
+        self.parts = []
+
+
+def parse_html(path: str, default_title: str, read_size: int = 65536) -> Iterator[Section]:
+    parser = _HTMLSections(default_title)
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        while True:
+            block = f.read(read_size)
+            if not block:
+                break
+            parser.feed(block)
+            # fertige Abschnitte sofort weiterreichen, statt die ganze Datei zu sammeln
+            while parser.done:
+                yield parser.done.pop(0)
+    parser.close()
+    parser.flush()
+    yield from parser.done
+
+
+def parse_pdf(path: str, default_title: str) -> Iterator[Section]:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise SystemExit("PDF-Dateien brauchen pypdf: pip install pypdf")
+    reader = PdfReader(path)
+    for number, page in enumerate(reader.pages, start=1):  # Seiten werden einzeln geladen
+        text = page.extract_text() or ""
+        if text.strip():
+            yield default_title, text, {"page": number}
+
+
+def parse_file(path: str) -> Iterator[Section]:
+    default_title = os.path.splitext(os.path.basename(path))[0]
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".md", ".markdown"):
+        return parse_markdown(path, default_title)
+    if ext in (".html", ".htm"):
+        return parse_html(path, default_title)
+    return parse_pdf(path, default_title)
+
+
+def iter_files(paths: Iterable[str]) -> Iterator[str]:
+    """Dateien in stabiler Reihenfolge (Voraussetzung für den Checkpoint)."""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if name.lower().endswith(EXTENSIONS) and not name.startswith("."):
+                    yield os.path.join(dirpath, name)
+
+
+# --------------------------------------------------------------------------------------
+# Chunking
+# --------------------------------------------------------------------------------------
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;:])\s+(?=[A-ZÄÖÜ0-9\"„(])|\n\s*\n")
+
+
+def _units(text: str, max_tokens: int, count: Callable[[str], int]) -> Iterator[Tuple[str, int]]:
+    """Sätze (zu lange Sätze wortweise geteilt) mit Tokenzahl."""
+    for sentence in _SENTENCE_END.split(text):
+        sentence = " ".join(sentence.split())
+        if not sentence:
+            continue
+        n = count(sentence)
+        if n <= max_tokens:
+            yield sentence, n
+            continue
+        words, buf = sentence.split(" "), []
+        for word in words:
+            buf.append(word)
+            if count(" ".join(buf)) >= max_tokens:
+                piece = " ".join(buf)
+                yield piece, count(piece)
+                buf = []
+        if buf:
+            piece = " ".join(buf)
+            yield piece, count(piece)
+
+
+def chunk_text(text: str, max_tokens: int, overlap_tokens: int, count: Callable[[str], int]) -> Iterator[str]:
+    """Sätze zu Chunks bis max_tokens packen; die letzten Sätze (bis overlap_tokens) beginnen den nächsten Chunk."""
+    window: List[Tuple[str, int]] = []
+    size = 0
+    fresh = 0  # Sätze im Fenster, die noch in keinem Chunk standen
+    for unit, n in _units(text, max_tokens, count):
+        if window and size + n > max_tokens:
+            yield " ".join(u for u, _ in window)
+            carry: List[Tuple[str, int]] = []
+            carried = 0
+            for u, k in reversed(window):
+                if carried + k > overlap_tokens or carried + k + n > max_tokens:
+                    break
+                carry.insert(0, (u, k))
+                carried += k
+            window, size, fresh = carry, carried, 0
+        window.append((unit, n))
+        size += n
+        fresh += 1
+    if window and fresh:
+        yield " ".join(u for u, _ in window)
+
+
+def category(title: str) -> str:
+    """Filterbarer Bereich für query_kb: 'apartment.1_2' -> 'apartment', 'Preise & Zahlung' -> 'preise'."""
+    return re.split(r"[.\s&/,:;-]+", title.strip().lower(), maxsplit=1)[0] or "allgemein"
+
+
+def source_id(source: str) -> str:
+    """ID-Präfix der Chunks einer Datei: Hash des relativen Pfads (nicht des Inhalts)."""
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+
+
+def iter_chunks(files: Iterable[str], base: str, args: argparse.Namespace, count: Callable[[str], int],
+                skip: Dict[str, int]) -> Iterator[Dict[str, Any]]:
+    """Chunks aller Dateien; skip[source] = bereits indexierte Chunks dieser Datei (Checkpoint)."""
+    for path in files:
+        source = os.path.relpath(path, base)
+        done = skip.get(source, 0)
+        if done < 0:  # Datei vollständig im Checkpoint
+            continue
+        stat = os.stat(path)
+        file_id = source_id(source)
+        index = 0
+        pending: Optional[Dict[str, Any]] = None
+        for title, text, extra in parse_file(path):
+            for chunk in chunk_text(text, args.chunk_tokens, args.overlap_tokens, count):
+                if pending is not None:
+                    yield pending
+                if index >= done:
+                    pending = {
+                        "id": f"{file_id}-{index:05d}",
+                        "text": chunk,
+                        "metadata": dict(extra, title=title, category=category(title), text=chunk, source=source, chunk=index),
+                        "source": source,
+                        "file": {"mtime": stat.st_mtime, "size": stat.st_size},
+                        "last": False,
+                    }
+                else:
+                    pending = None
+                index += 1
+        if pending is not None:
+            pending["last"] = True
+            pending["file"]["chunks"] = index
+            yield pending
+
+
+def batched(items: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch: List[Dict[str, Any]] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --------------------------------------------------------------------------------------
+# Checkpoint
+# --------------------------------------------------------------------------------------
+
+class Checkpoint:
+    """Fortschritt je Datei + Länge der Teil-Replica (Zeilen nach einem Abbruch werden abgeschnitten)."""
+
+    def __init__(self, path: str, signature: str):
+        self.path = path
+        self.signature = signature
+        self.progress: Dict[str, int] = {}  # source -> indexierte Chunks, -1 = fertig
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.replica_bytes = 0
+        self.chunks = 0
+
+    @classmethod
+    def load(cls, path: str, signature: str) -> Optional["Checkpoint"]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if data.get("signature") != signature:
+            print("Checkpoint passt nicht zu den Parametern – starte neu.")
+            return None
+        cp = cls(path, signature)
+        cp.progress, cp.files = data["progress"], data["files"]
+        cp.replica_bytes, cp.chunks = data["replica_bytes"], data["chunks"]
+        return cp
+
+    def still_valid(self, base: str, partial_path: str) -> bool:
+        """False, wenn seit dem Abbruch Dateien geändert wurden oder die Teil-Replica nicht passt."""
+        try:
+            if os.path.getsize(partial_path) < self.replica_bytes:
+                return False
+            for source, meta in self.files.items():
+                stat = os.stat(os.path.join(base, source))
+                if (stat.st_mtime, stat.st_size) != (meta["mtime"], meta["size"]):
+                    return False
+        except FileNotFoundError:
+            return False
+        return True
+
+    def commit(self, batch: List[Dict[str, Any]], replica_bytes: int) -> None:
+        for item in batch:
+            source = item["source"]
+            self.progress[source] = -1 if item["last"] else int(item["metadata"]["chunk"]) + 1
+            self.files[source] = {"mtime": item["file"]["mtime"], "size": item["file"]["size"]}
+        self.replica_bytes = replica_bytes
+        self.chunks += len(batch)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"signature": self.signature, "progress": self.progress, "files": self.files,
+                       "replica_bytes": self.replica_bytes, "chunks": self.chunks}, f)
+        os.replace(tmp, self.path)
+
+    def remove(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+# --------------------------------------------------------------------------------------
+# Embeddings + Upsert
+# --------------------------------------------------------------------------------------
+
+def _embed_config() -> Dict[str, str]:
+    base = os.getenv("AZURE_OPENAI_EMBEDDING_ENDPOINT") or os.getenv("AZURE_OPENAI_ENDPOINT", "")
+    return {
+        "api_key": os.getenv("AZURE_OPENAI_EMBEDDING_API_KEY") or os.getenv("AZURE_OPENAI_API_KEY", ""),
+        "endpoint": base.rstrip("/"),
+        "api_version": os.getenv("AZURE_OPENAI_EMBEDDING_API_VERSION", "2024-12-01-preview"),
+        "deployment": os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME", ""),
     }
-]
 
 
-upsert_items = []
-for doc in docs:
+async def embed_with_retry(texts: List[str], cfg: Dict[str, str], attempts: int = 5) -> List[List[float]]:
+    if cfg.get("backend") == "local":
+        return await local_embed(texts, kind="passage")
+    for attempt in range(attempts):
+        try:
+            return await azure_embed(texts, cfg)
+        except Exception as e:
+            status = getattr(e, "status_code", None)
+            if attempt == attempts - 1 or (status is not None and status < 500 and status != 429):
+                raise
+            delay = min(30.0, 2 ** attempt)
+            print(f"  Embedding-Fehler ({e}), neuer Versuch in {delay:.0f}s …")
+            await asyncio.sleep(delay)
+    raise RuntimeError("unreachable")
+
+
+def _print_embed_help(cfg: Dict[str, str], error: Exception) -> None:
+    print("Fehler beim Abrufen der Embeddings!")
+    if cfg.get("backend") == "local":
+        print(f"Lokales Modell: {cfg['model']}")
+        print(f"Fehler: {error}")
+        return
+    print(f"Deployment: {cfg['deployment']}")
+    print(f"Endpoint: {cfg['endpoint']}")
+    print(f"API-Version: {cfg['api_version']}")
+    print(f"API-Key gesetzt: {'JA' if cfg['api_key'] else 'NEIN'}")
+    print(f"Fehler: {error}")
+    print("\nPrüfe im Azure-Portal, ob der Deployment-Name exakt stimmt und das Modell bereitgestellt ist.")
+    print("Der Endpoint muss die Basis-URL der Resource sein (ohne /openai/deployments/...)")
+    print("API-Key muss zur Embedding-Resource gehören!")
+
+
+def _pinecone_index() -> Any:
     try:
-        response = client.embeddings.create(
-            input=[doc["text"]],
-            model=EMBED_DEPLOY
-        )
+        from pinecone import Pinecone
     except Exception as e:
-        print("Fehler beim Abrufen der Embeddings!")
-        print(f"Deployment: {EMBED_DEPLOY}")
-        print(f"Endpoint: {EMBED_API_BASE}")
-        print(f"API-Version: {EMBED_API_VERSION}")
-        print(f"API-Key gesetzt: {'JA' if EMBED_API_KEY else 'NEIN'}")
-        print(f"Fehler: {e}")
-        print("\nPrüfe im Azure-Portal, ob der Deployment-Name exakt stimmt und das Modell bereitgestellt ist.")
-        print("Der Endpoint muss die Basis-URL der Resource sein (ohne /openai/deployments/...)")
-        print("API-Key muss zur Embedding-Resource gehören!")
-        exit(1)
-    vector = response.data[0].embedding
-    upsert_items.append({
-        "id": str(uuid.uuid4()),
-        "values": vector,
-        "metadata": {"title": doc["title"], "text": doc["text"]}
-    })
-
-print(f"Upserting {len(upsert_items)} Dokumente in Pinecone-Index '{PINECONE_INDEX}'...")
-index.upsert(vectors=upsert_items)
-print("Fertig.")
\ No newline at end of file
+        raise SystemExit(f"Fehlende Bibliothek: {e}. Installiere mit: pip install pinecone")
+    api_key = os.getenv("PINECONE_API_KEY")
+    if not (api_key and os.getenv("PINECONE_ENV")):
+        raise SystemExit("Setze PINECONE_* und AZURE_OPENAI_EMBEDDING_* Variablen in .env")
+    return Pinecone(api_key=api_key).Index(os.getenv("PINECONE_INDEX", "aparts-index"))
+
+
+def replica_sources(path: str) -> Dict[str, int]:
+    """Chunks je Datei in einer vorhandenen Replica (Stand des letzten Laufs); leer, wenn es keine gibt."""
+    sources: Dict[str, int] = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    meta = json.loads(line).get("metadata") or {}
+                except ValueError:
+                    continue
+                if "source" in meta and "chunk" in meta:
+                    sources[meta["source"]] = max(sources.get(meta["source"], 0), int(meta["chunk"]) + 1)
+    except FileNotFoundError:
+        pass
+    return sources
+
+
+def carry_over(old_path: str, partial_path: str, keep: Callable[[str], bool]) -> int:
+    """Zeilen der alten Replica, deren Datei dieser Lauf nicht erfasst hat, in die neue übernehmen."""
+    kept = 0
+    try:
+        with open(old_path, "r", encoding="utf-8") as old, open(partial_path, "a", encoding="utf-8") as out:
+            for line in old:
+                try:
+                    source = (json.loads(line).get("metadata") or {}).get("source")
+                except ValueError:
+                    continue
+                if source is not None and keep(source):
+                    out.write(line if line.endswith("\n") else line + "\n")
+                    kept += 1
+    except FileNotFoundError:
+        pass
+    return kept
+
+
+def delete_chunks(index: Any, namespace: str, source: str, start: int = 0) -> int:
+    """Vektoren einer Datei ab Chunk start löschen; -1 = per Metadaten-Filter gelöscht (Anzahl unbekannt)."""
+    prefix = source_id(source) + "-"
+    try:
+        ids = [i for page in index.list(prefix=prefix, namespace=namespace) for i in page if int(i[len(prefix):]) >= start]
+    except Exception:
+        # pod-basierte Indizes kennen list() nicht, dafür Löschen per Metadaten-Filter
+        index.delete(filter={"source": {"$eq": source}, "chunk": {"$gte": start}}, namespace=namespace)
+        return -1
+    for i in range(0, len(ids), PINECONE_MAX_BATCH):
+        index.delete(ids=ids[i:i + PINECONE_MAX_BATCH], namespace=namespace)
+    return len(ids)
+
+
+async def run(args: argparse.Namespace) -> int:
+    try:
+        count = token_counter(args.backend)
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+    base = os.path.commonpath([os.path.abspath(p) for p in args.paths])
+    if os.path.isfile(base):
+        base = os.path.dirname(base)
+    files = list(iter_files(args.paths))  # nur Pfade, kein Inhalt
+    if not files:
+        print("Keine Markdown-/HTML-/PDF-Dateien gefunden.")
+        return 1
+
+    if args.dry_run:
+        chunks = tokens = 0
+        for item in iter_chunks(files, base, args, count, {}):
+            chunks += 1
+            tokens += count(item["text"])
+        counted = "Modell-Tokenizer" if args.backend == "local" else "tiktoken" if tiktoken else "geschätzt"
+        print(f"{len(files)} Dateien -> {chunks} Chunks, {tokens} Tokens (Ø {tokens / max(1, chunks):.0f} Tokens/Chunk; {counted})")
+        return 0
+
+    cfg: Dict[str, Any] = _embed_config()
+    if args.backend == "local":
+        cfg = {"backend": "local", "model": embedding_id()}
+    elif not (cfg["api_key"] and cfg["endpoint"] and cfg["deployment"]):
+        raise SystemExit("Setze PINECONE_* und AZURE_OPENAI_EMBEDDING_* Variablen in .env")
+    index = _pinecone_index()
+
+    signature = json.dumps([args.namespace, embedding_id(cfg.get("deployment")), args.chunk_tokens, args.overlap_tokens, sorted(os.path.abspath(p) for p in args.paths)])
+    checkpoint_path = args.checkpoint
+    partial_path = args.replica + ".partial"
+    checkpoint = None if args.restart else Checkpoint.load(checkpoint_path, signature)
+    if checkpoint is not None and not checkpoint.still_valid(base, partial_path):
+        print("Dateien seit dem Abbruch geändert – starte neu.")
+        checkpoint = None
+    if checkpoint is not None:
+        print(f"Setze fort: {checkpoint.chunks} Chunks aus dem letzten Lauf bereits indexiert.")
+    else:
+        checkpoint = Checkpoint(checkpoint_path, signature)
+    os.makedirs(os.path.dirname(os.path.abspath(args.replica)), exist_ok=True)
+    previous = replica_sources(args.replica)  # Chunks je Datei vor diesem Lauf (für das Aufräumen)
+    stale = 0
+    replica = open(partial_path, "ab" if checkpoint.chunks else "wb")
+    replica.truncate(checkpoint.replica_bytes)  # Zeilen nach dem letzten Checkpoint verwerfen
+    replica.seek(checkpoint.replica_bytes)
+
+    t0 = time.perf_counter()
+    done = 0
+    dimension = 0
+    pending: List[Tuple[List[Dict[str, Any]], "asyncio.Task[List[List[float]]]"]] = []
+
+    async def commit_oldest() -> None:
+        nonlocal done, dimension, stale
+        batch, task = pending.pop(0)
+        try:
+            vectors = await task
+        except Exception as e:
+            _print_embed_help(cfg, e)
+            raise SystemExit(1)
+        items = [{"id": b["id"], "values": v, "metadata": b["metadata"]} for b, v in zip(batch, vectors)]
+        dimension = len(vectors[0]) if vectors else dimension
+        for i in range(0, len(items), PINECONE_MAX_BATCH):
+            await asyncio.to_thread(index.upsert, vectors=items[i:i + PINECONE_MAX_BATCH], namespace=args.namespace)
+        for b in batch:
+            # Datei fertig: Chunks über der neuen Anzahl stammen aus einer älteren, längeren Fassung
+            chunks = b["file"].get("chunks", 0) if b["last"] else 0
+            # ohne alte Replica ist der vorherige Stand unbekannt -> immer nachsehen
+            if chunks and (previous.get(b["source"], 0) > chunks if previous else True):
+                stale += max(0, await asyncio.to_thread(delete_chunks, index, args.namespace, b["source"], chunks))
+        for item in items:
+            replica.write((json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8"))
+        replica.flush()
+        os.fsync(replica.fileno())
+        checkpoint.commit(batch, replica.tell())
+        done += len(batch)
+        rate = done / max(1e-9, time.perf_counter() - t0)
+        print(f"  {checkpoint.chunks} Chunks indexiert ({rate:.0f}/s)")
+
+    try:
+        for batch in batched(iter_chunks(files, base, args, count, checkpoint.progress), args.batch_size):
+            pending.append((batch, asyncio.create_task(embed_with_retry([b["text"] for b in batch], cfg))))
+            if len(pending) >= args.concurrency:
+                await commit_oldest()
+        while pending:
+            await commit_oldest()
+    finally:
+        for _, task in pending:
+            task.cancel()
+        replica.close()
+        await aclose_clients()
+
+    # Gelöschte/umbenannte Dateien (und Dateien ohne Chunks) aus dem Index entfernen; Dateien außerhalb der
+    # angegebenen Pfade, die noch existieren, bleiben unangetastet
+    indexed = set(checkpoint.progress)
+    walked = {os.path.relpath(path, base) for path in files}
+
+    def untouched(source: str) -> bool:
+        return source not in walked and os.path.exists(os.path.join(base, source))
+
+    for source in sorted(previous):
+        if source in indexed or untouched(source):
+            continue
+        stale += max(0, await asyncio.to_thread(delete_chunks, index, args.namespace, source))
+    if stale:
+        print(f"  {stale} veraltete Vektoren entfernt")
+
+    # Lokale Replica für den Hedge in query_kb (KB_REPLICA_PATH) – atomar ersetzen; Dateien außerhalb der
+    # angegebenen Pfade behalten ihre Zeilen (wie ihre Vektoren in Pinecone)
+    kept = carry_over(args.replica, partial_path, untouched) if previous else 0
+    if kept:
+        print(f"  {kept} Chunks anderer Dateien aus der bisherigen Replica übernommen")
+    os.replace(partial_path, args.replica)
+    checkpoint.remove()
+    print(f"Fertig: {checkpoint.chunks} Chunks in Pinecone-Index '{os.getenv('PINECONE_INDEX', 'aparts-index')}' "
+          f"(Namespace '{args.namespace or 'default'}', {dimension or '?'} Dimensionen, {embedding_id(cfg.get('deployment'))}), "
+          f"{time.perf_counter() - t0:.1f}s. Lokale Replica geschrieben: {args.replica}")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    load_dotenv(".env")
+    p = argparse.ArgumentParser(description="Markdown/HTML/PDF-Verzeichnis in Pinecone + lokale Replica indexieren.")
+    p.add_argument("paths", nargs="*", default=["kb"], help="Verzeichnisse oder Dateien (Standard: kb/)")
+    p.add_argument("--chunk-tokens", type=int, default=350)
+    p.add_argument("--overlap-tokens", type=int, default=50)
+    p.add_argument("--batch-size", type=int, default=64, help="Chunks pro Embedding-Request")
+    p.add_argument("--concurrency", type=int, default=2, help="Embedding-Batches gleichzeitig unterwegs")
+    p.add_argument("--backend", choices=("azure", "local"), default=os.getenv("EMBED_BACKEND", "azure").strip().lower(),
+                   help="Embedding-Modell (muss zu EMBED_BACKEND der Worker passen)")
+    p.add_argument("--namespace", default=os.getenv("KB_NAMESPACE", ""), help="Pinecone-Namespace des Mandanten/Objekts")
+    p.add_argument("--replica", default=None, help="Standard: KB_REPLICA_PATH, je Namespace eigene Datei")
+    p.add_argument("--checkpoint", default=None, help="Standard: data/ingest_checkpoint[.<namespace>].json")
+    p.add_argument("--restart", action="store_true", help="vorhandenen Checkpoint ignorieren")
+    p.add_argument("--dry-run", action="store_true", help="nur parsen und chunken")
+    args = p.parse_args(argv)
+    if args.overlap_tokens >= args.chunk_tokens:
+        p.error("--overlap-tokens muss kleiner als --chunk-tokens sein")
+    if args.namespace and not re.match(r"^[A-Za-z0-9_-]{1,64}$", args.namespace):
+        p.error("--namespace: nur Buchstaben, Ziffern, _ und - (max. 64 Zeichen)")
+    os.environ["EMBED_BACKEND"] = args.backend  # callisi.embeddings liest das Backend aus der ENV
+    args.replica = args.replica or replica_path(os.getenv("KB_REPLICA_PATH", "data/kb_replica.jsonl"), args.namespace)
+    args.checkpoint = args.checkpoint or replica_path("data/ingest_checkpoint.json", args.namespace)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
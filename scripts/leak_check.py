@@ -0,0 +1,163 @@
+"""
+Speicherleck-Prüfung: tausende simulierte Anrufe nacheinander durch `entrypoint` (Stand-ins aus load_test.py).
+- Aufwärmen, dann RSS und tracemalloc vor/nach N Anrufen -> Wachstum pro Anruf
+- Zählt TelephonyAssistant- und AgentSession-Instanzen, die nach dem Anruf noch leben (weakref)
+- Top-Allokationsstellen des Wachstums (tracemalloc-Diff)
+- Exit-Code 1, wenn das Wachstum pro Anruf --max-growth-kb überschreitet oder Agents/Sessions überleben (für CI)
+- measure(quiet=True) liefert nur die Zahlen, ohne Ausgabe (tests/test_memory_growth.py)
+
+Beispiel:
+    python scripts/leak_check.py --agent livekit_agent_dsgvo --calls 2000 --concurrency 20 --max-growth-kb 2
+"""
+
+import argparse
+import asyncio
+import gc
+import importlib
+import logging
+import os
+import sys
+import time
+import tracemalloc
+import weakref
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import load_test  # noqa: E402  (liegt neben diesem Skript)
+
+
+def _collect() -> None:
+    for _ in range(3):
+        gc.collect()
+
+
+async def _run_calls(mod, profile, results, total: int, concurrency: int, offset: int) -> int:
+    done = 0
+    while done < total:
+        n = min(concurrency, total - done)
+        row = await load_test.run_stage(mod, profile, results, n, offset + done)
+        if row["errors"]:
+            raise SystemExit(f"{row['errors']} simulierte Anrufe fehlgeschlagen")
+        done += n
+    results.clear()
+    return done
+
+
+def _track(cls, alive: "weakref.WeakSet[Any]") -> None:
+    """Jede neue Instanz von cls in alive beobachten."""
+    base_init = cls.__init__
+
+    def tracking_init(self, *a, **kw):
+        base_init(self, *a, **kw)
+        alive.add(self)
+
+    cls.__init__ = tracking_init
+
+
+async def measure(args: argparse.Namespace, *, quiet: bool = False, tmp_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Aufwärmen, dann args.calls Anrufe messen; Wachstum, überlebende Instanzen und tracemalloc-Diff.
+    tmp_dir: Verzeichnis für Datenbanken/Records (sonst ein neues Temp-Verzeichnis)."""
+    load_test.isolate_env(prefix="leakcheck-", tmp=tmp_dir)
+    mod = importlib.import_module(args.agent)
+    logging.getLogger().setLevel(logging.ERROR)
+    profile = load_test.Profile(load_test.parse_args([
+        "--turns", str(args.turns), "--kb-ratio", str(args.kb_ratio),
+        "--user-speech-ms", "1", "--agent-speech-ms", "1", "--llm-ttft-ms", "1", "--tts-first-chunk-ms", "1",
+        "--embed-ms", "1", "--pinecone-ms", "1", "--ring-ms", "1", "--jitter", "0",
+    ]))
+    results = load_test.install_stand_ins(mod, profile)
+
+    # jede erzeugte Agent- und Session-Instanz beobachten
+    agents: "weakref.WeakSet[Any]" = weakref.WeakSet()
+    sessions: "weakref.WeakSet[Any]" = weakref.WeakSet()
+    _track(mod.TelephonyAssistant, agents)
+    _track(mod.AgentSession, sessions)
+
+    if not quiet:
+        print(f"Aufwärmen: {args.warmup} Anrufe …", flush=True)
+    offset = await _run_calls(mod, profile, results, args.warmup, args.concurrency, 0)
+    _collect()
+
+    tracemalloc.start(args.frames)
+    snap0 = tracemalloc.take_snapshot()
+    rss0 = load_test._rss_mb()
+    t0 = time.perf_counter()
+
+    if not quiet:
+        print(f"Messung: {args.calls} Anrufe (je {args.concurrency} parallel) …", flush=True)
+    await _run_calls(mod, profile, results, args.calls, args.concurrency, offset)
+    _collect()
+
+    snap1 = tracemalloc.take_snapshot()
+    rss1 = load_test._rss_mb()
+    tracemalloc.stop()
+    wall = time.perf_counter() - t0
+
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+    stats = snap1.filter_traces(ignore).compare_to(snap0.filter_traces(ignore), "lineno")
+    traced_growth = sum(s.size_diff for s in stats)
+    return {
+        "calls": args.calls,
+        "wall_s": wall,
+        "traced_growth": traced_growth,
+        "per_call_kb": traced_growth / 1024 / max(1, args.calls),
+        "rss_growth_mb": rss1 - rss0,
+        "rss_per_call_kb": (rss1 - rss0) * 1e6 / 1024 / max(1, args.calls),
+        "agents": len(agents),
+        "sessions": len(sessions),
+        "stats": stats,
+    }
+
+
+async def main(args: argparse.Namespace) -> int:
+    result = await measure(args)
+    per_call_kb = result["per_call_kb"]
+    agents, sessions = result["agents"], result["sessions"]
+
+    print()
+    print(f"Anrufe:              {args.calls} in {result['wall_s']:.1f} s")
+    print(f"tracemalloc-Wachstum: {result['traced_growth'] / 1024:.1f} KiB gesamt, {per_call_kb:.3f} KiB/Anruf")
+    print(f"RSS-Wachstum:         {result['rss_growth_mb']:.1f} MB gesamt, {result['rss_per_call_kb']:.3f} KiB/Anruf")
+    print(f"Lebende Agents:       {agents}")
+    print(f"Lebende Sessions:     {sessions}")
+    print()
+    print(f"Top {args.top} Wachstumsstellen:")
+    for s in result["stats"][: args.top]:
+        if s.size_diff <= 0:
+            break
+        frame = s.traceback[0]
+        print(f"  {s.size_diff / 1024:>9.1f} KiB  {s.count_diff:>+7}  {frame.filename}:{frame.lineno}")
+
+    failed = False
+    if per_call_kb > args.max_growth_kb:
+        print(f"\nFEHLER: {per_call_kb:.3f} KiB/Anruf > --max-growth-kb {args.max_growth_kb}")
+        failed = True
+    if agents:
+        print(f"\nFEHLER: {agents} TelephonyAssistant-Instanzen überleben ihren Anruf")
+        failed = True
+    if sessions:
+        print(f"\nFEHLER: {sessions} AgentSession-Instanzen überleben ihren Anruf")
+        failed = True
+    if not failed:
+        print("\nOK: kein Wachstum über dem Grenzwert.")
+    return 1 if failed else 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Speicherleck-Prüfung über simulierte Anrufe.")
+    p.add_argument("--agent", default="livekit_agent_dsgvo", help="Agent-Modul (z.B. agent_basic)")
+    p.add_argument("--calls", type=int, default=2000, help="gemessene Anrufe")
+    p.add_argument("--warmup", type=int, default=200, help="Anrufe vor der Messung (Caches, Lazy-Imports)")
+    p.add_argument("--concurrency", type=int, default=20)
+    p.add_argument("--turns", type=int, default=3)
+    p.add_argument("--kb-ratio", type=float, default=0.5)
+    p.add_argument("--frames", type=int, default=10, help="tracemalloc-Stacktiefe")
+    p.add_argument("--top", type=int, default=15)
+    p.add_argument("--max-growth-kb", type=float, default=2.0, help="erlaubtes Wachstum pro Anruf (tracemalloc, KiB)")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,413 @@
+"""
+Lastgenerator für parallele Anrufe (Kapazitätsplanung eines Worker-Containers).
+- Startet N parallele `entrypoint`-Sessions eines Agent-Moduls gegen lokale Stand-ins
+  (LiveKit Room/Media, AgentSession, Azure STT/LLM/TTS, Azure Embeddings, Pinecone)
+- Rampe über mehrere Parallelitätsstufen; je Stufe: CPU/Call, RSS, Event-Loop-Lag, Turn-Latenz p50/p95/p99
+- Meldet die erste Stufe, bei der p95 der Turn-Latenz das SLO reißt
+
+Beispiel:
+    python scripts/load_test.py --agent livekit_agent_dsgvo --levels 1,4,8,16,32 --turns 6 --slo-p95-ms 1200
+"""
+
+import argparse
+import asyncio
+import importlib
+import inspect
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+try:
+    import numpy as np
+except Exception as e:
+    raise SystemExit(f"Fehlende Bibliothek: {e}. Installiere mit: pip install numpy")
+
+try:
+    import psutil  # optional, genauere RSS-Werte
+except Exception:
+    psutil = None
+
+
+# --------------------------------------------------------------------------------------
+# Messwerkzeuge
+# --------------------------------------------------------------------------------------
+
+def _rss_mb() -> float:
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1e6
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def _pct(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+class LoopLagMonitor:
+    """Misst die Verspätung eines periodischen Ticks = Event-Loop-Lag."""
+
+    def __init__(self, interval_s: float = 0.05):
+        self.interval_s = interval_s
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval_s)
+            self.samples.append(max(0.0, loop.time() - t0 - self.interval_s) * 1000)
+
+    def start(self) -> None:
+        self.samples = []
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+# --------------------------------------------------------------------------------------
+# Stand-ins
+# --------------------------------------------------------------------------------------
+
+class Profile:
+    """Latenzen der simulierten Abhängigkeiten (ms) + Gesprächsverlauf."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.turns = args.turns
+        self.user_speech_ms = args.user_speech_ms
+        self.llm_ttft_ms = args.llm_ttft_ms
+        self.tts_first_chunk_ms = args.tts_first_chunk_ms
+        self.agent_speech_ms = args.agent_speech_ms
+        self.embed_ms = args.embed_ms
+        self.pinecone_ms = args.pinecone_ms
+        self.kb_ratio = args.kb_ratio
+        self.ring_ms = args.ring_ms
+        self.jitter = args.jitter
+
+
+def _jit(profile: Profile, ms: float) -> float:
+    return max(0.0, ms * random.uniform(1 - profile.jitter, 1 + profile.jitter)) / 1000
+
+
+class FakeParticipant:
+    def __init__(self, identity: str, metadata: str = ""):
+        self.identity = identity
+        self.metadata = metadata
+
+
+class FakeRoom:
+    def __init__(self, name: str, caller: str):
+        self.name = name
+        self.remote_participants: Dict[str, FakeParticipant] = {}
+        self.local_participant = FakeParticipant("agent", json.dumps({"caller_phone": caller}))
+
+
+class FakeJobContext:
+    """Minimaler JobContext: connect/wait_for_participant/add_shutdown_callback/room."""
+
+    def __init__(self, call_id: int, profile: Profile):
+        caller = f"+4917{call_id:08d}"
+        self.room = FakeRoom(f"loadtest-{call_id}", caller)
+        self.job = SimpleNamespace(id=f"LT_{call_id}", metadata="")
+        self.proc = SimpleNamespace(userdata={})
+        self.profile = profile
+        self._caller = FakeParticipant(f"sip_{caller}")
+        self._shutdown_callbacks: List[Any] = []
+
+    async def connect(self) -> None:
+        await asyncio.sleep(0.01)
+
+    async def wait_for_participant(self, *args, **kwargs) -> FakeParticipant:
+        await asyncio.sleep(_jit(self.profile, self.profile.ring_ms))
+        self.room.remote_participants[self._caller.identity] = self._caller
+        return self._caller
+
+    def add_shutdown_callback(self, cb) -> None:
+        self._shutdown_callbacks.append(cb)
+
+    async def shutdown(self) -> None:
+        for cb in reversed(self._shutdown_callbacks):
+            # wie JobContext: Callback optional mit Shutdown-Grund
+            min_args = 2 if inspect.ismethod(cb) else 1
+            await (cb("loadtest") if cb.__code__.co_argcount >= min_args else cb())
+
+
+class FakeMedia:
+    """20-ms-Audioframes (16 kHz) in Echtzeit; Energie-Berechnung als CPU-Stand-in für VAD/Resampling."""
+
+    def __init__(self, seconds_per_frame: float = 0.02, sample_rate: int = 16000):
+        self.frame_s = seconds_per_frame
+        self.samples = int(sample_rate * seconds_per_frame)
+        self._task: Optional[asyncio.Task] = None
+        self.frames = 0
+
+    async def _run(self) -> None:
+        rng = np.random.default_rng()
+        while True:
+            pcm = rng.integers(-3000, 3000, self.samples, dtype=np.int16)
+            _ = float(np.sqrt(np.mean(pcm.astype(np.float32) ** 2)))
+            self.frames += 1
+            await asyncio.sleep(self.frame_s)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+class _StandIn:
+    """Platzhalter für STT/LLM/TTS/VAD-Plugins (Konstruktion ohne Netz)."""
+
+    def __init__(self, *args, **kwargs):
+        self.kwargs = kwargs
+
+    @classmethod
+    def load(cls, *args, **kwargs):
+        return cls(*args, **kwargs)
+
+    @classmethod
+    def with_azure(cls, *args, **kwargs):
+        return cls(*args, **kwargs)
+
+
+class FakeIndex:
+    """Pinecone-Stand-in; query ist – wie beim echten Client – synchron."""
+
+    def __init__(self, profile: Profile):
+        self.profile = profile
+
+    def query(self, vector=None, top_k: int = 3, include_metadata: bool = True, **kwargs) -> Dict[str, Any]:
+        time.sleep(_jit(self.profile, self.profile.pinecone_ms))
+        return {"matches": [{"score": 0.8, "metadata": {"title": "checkin_checkout", "text": "Check-in ab 15:00 Uhr."}}] * top_k}
+
+
+def install_stand_ins(mod, profile: Profile) -> List[Dict[str, Any]]:
+    """Ersetzt Netz-/Media-Abhängigkeiten im Agent-Modul durch lokale Stand-ins; liefert die Ergebnisliste."""
+    results: List[Dict[str, Any]] = []
+
+    async def fake_embed(texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(_jit(profile, profile.embed_ms))
+        return [[0.0] * 1536 for _ in texts]
+
+    async def fake_speech_plugins(speech_cfg: Dict[str, str], language: str, voice: str) -> SimpleNamespace:
+        async def aclose() -> None:
+            pass
+        return SimpleNamespace(stt=_StandIn(language=language), tts=_StandIn(voice=voice), aclose=aclose)
+
+    index = FakeIndex(profile)
+    mod._azure_embed = fake_embed
+    mod._pinecone_connect = lambda *a, **k: index
+    mod.silero = SimpleNamespace(VAD=_StandIn)
+    mod.speech_plugins = fake_speech_plugins
+    mod.openai = SimpleNamespace(LLM=_StandIn)
+
+    base_agent = mod.TelephonyAssistant
+
+    class LoadTestAssistant(base_agent):
+        session = property(lambda self: self._lt_session)
+
+    class FakeSession:
+        def __init__(self, **kwargs):
+            self.kwargs = kwargs
+            self.room: Optional[FakeRoom] = None
+            self.turn_latencies_ms: List[float] = []
+            self._handlers: Dict[str, List[Any]] = {}
+
+        def on(self, event: str, callback) -> None:
+            self._handlers.setdefault(event, []).append(callback)
+
+        def off(self, event: str, callback) -> None:
+            self._handlers.get(event, []).remove(callback)
+
+        def _emit(self, event: str, ev: Any) -> None:
+            for cb in self._handlers.get(event, []):
+                cb(ev)
+
+        def _state(self, event: str, old: str, new: str) -> None:
+            self._emit(event, SimpleNamespace(old_state=old, new_state=new, created_at=time.time()))
+
+        def update_options(self, **kwargs) -> None:
+            self.kwargs.update(kwargs)
+
+        async def generate_reply(self, instructions: str = "", **kwargs) -> None:
+            await asyncio.sleep(_jit(profile, profile.llm_ttft_ms))
+            await asyncio.sleep(_jit(profile, profile.tts_first_chunk_ms))
+
+        async def start(self, agent, room) -> None:
+            self.room = room
+            agent._lt_session = self
+            media = FakeMedia()
+            media.start()
+            try:
+                await agent.on_enter()
+                for turn in range(profile.turns):
+                    self._state("user_state_changed", "listening", "speaking")
+                    await asyncio.sleep(_jit(profile, profile.user_speech_ms))
+                    t_eos = time.perf_counter()
+                    self._state("user_state_changed", "speaking", "listening")
+                    item = SimpleNamespace(role="user", text_content=f"Frage {turn}", interrupted=False)
+                    self._emit("conversation_item_added", SimpleNamespace(item=item))
+                    await agent.on_user_turn_completed(None, None)
+                    if random.random() < profile.kb_ratio:
+                        await agent.query_kb(None, f"Frage {turn}: Wann ist Check-in?")
+                    await asyncio.sleep(_jit(profile, profile.llm_ttft_ms))
+                    await asyncio.sleep(_jit(profile, profile.tts_first_chunk_ms))
+                    self.turn_latencies_ms.append((time.perf_counter() - t_eos) * 1000)
+                    self._state("agent_state_changed", "thinking", "speaking")
+                    await asyncio.sleep(_jit(profile, profile.agent_speech_ms))
+                    self._state("agent_state_changed", "speaking", "listening")
+            finally:
+                await media.stop()
+                self._emit("close", SimpleNamespace(reason="loadtest"))
+                results.append({"room": room.name, "turns_ms": self.turn_latencies_ms, "frames": media.frames})
+
+    mod.TelephonyAssistant = LoadTestAssistant
+    mod.AgentSession = FakeSession
+    return results
+
+
+# --------------------------------------------------------------------------------------
+# Rampe
+# --------------------------------------------------------------------------------------
+
+async def run_stage(mod, profile: Profile, results: List[Dict[str, Any]], concurrency: int, call_offset: int) -> Dict[str, Any]:
+    results.clear()
+    lag = LoopLagMonitor()
+    lag.start()
+    rss0 = _rss_mb()
+    cpu0 = time.process_time()
+    t0 = time.perf_counter()
+    errors = 0
+
+    async def one_call(i: int) -> None:
+        nonlocal errors
+        ctx = FakeJobContext(call_offset + i, profile)
+        try:
+            await mod.entrypoint(ctx)
+        except Exception as e:
+            errors += 1
+            logging.getLogger("loadtest").warning(f"Call {i} fehlgeschlagen: {e}")
+        finally:
+            await ctx.shutdown()
+
+    await asyncio.gather(*(one_call(i) for i in range(concurrency)))
+    wall = time.perf_counter() - t0
+    cpu = time.process_time() - cpu0
+    await lag.stop()
+    turns = [t for r in results for t in r["turns_ms"]]
+    return {
+        "concurrency": concurrency,
+        "calls": concurrency,
+        "errors": errors,
+        "wall_s": round(wall, 2),
+        "cpu_s_per_call": round(cpu / max(1, concurrency), 4),
+        "cpu_util": round(cpu / wall, 3) if wall else 0.0,
+        "rss_mb": round(_rss_mb(), 1),
+        "rss_mb_per_call": round((_rss_mb() - rss0) / max(1, concurrency), 2),
+        "loop_lag_p95_ms": round(_pct(lag.samples, 95), 1),
+        "loop_lag_max_ms": round(max(lag.samples, default=0.0), 1),
+        "turn_p50_ms": round(_pct(turns, 50), 1),
+        "turn_p95_ms": round(_pct(turns, 95), 1),
+        "turn_p99_ms": round(_pct(turns, 99), 1),
+    }
+
+
+def _print_table(rows: List[Dict[str, Any]]) -> None:
+    cols = ["concurrency", "errors", "cpu_s_per_call", "cpu_util", "rss_mb", "rss_mb_per_call", "loop_lag_p95_ms", "loop_lag_max_ms",
+            "turn_p50_ms", "turn_p95_ms", "turn_p99_ms"]
+    print(" | ".join(f"{c:>15}" for c in cols))
+    for r in rows:
+        print(" | ".join(f"{r[c]:>15}" for c in cols))
+
+
+def isolate_env(prefix: str = "loadtest-", tmp: Optional[str] = None) -> str:
+    """Keine echten Webhooks/Queues; Datenbanken und Records in ein Temp-Verzeichnis (bzw. tmp)."""
+    os.environ["N8N_WEBHOOK_URL"] = ""
+    os.environ["N8N_AVAILABILITY_URL"] = ""
+    tmp = tmp or tempfile.mkdtemp(prefix=prefix)
+    os.environ["BOOKING_DB_PATH"] = os.path.join(tmp, "bookings.sqlite3")
+    os.environ["AVAILABILITY_SNAPSHOT_PATH"] = os.path.join(tmp, "availability.json")
+    os.environ["CALL_RECORD_DIR"] = os.path.join(tmp, "calls")
+    os.environ["CALLER_PROFILE_DB_PATH"] = os.path.join(tmp, "caller_profiles.sqlite3")
+    return tmp
+
+
+async def main(args: argparse.Namespace) -> int:
+    isolate_env()
+    mod = importlib.import_module(args.agent)
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("callisi").setLevel(logging.ERROR)
+    profile = Profile(args)
+    results = install_stand_ins(mod, profile)
+    random.seed(args.seed)
+
+    rows: List[Dict[str, Any]] = []
+    breaking: Optional[int] = None
+    offset = 0
+    for level in [int(x) for x in args.levels.split(",") if x.strip()]:
+        print(f"Stufe: {level} parallele Anrufe …", flush=True)
+        row = await run_stage(mod, profile, results, level, offset)
+        offset += level
+        rows.append(row)
+        if breaking is None and row["turn_p95_ms"] > args.slo_p95_ms:
+            breaking = level
+            if args.stop_at_breach:
+                break
+
+    print()
+    _print_table(rows)
+    print()
+    if breaking is None:
+        print(f"SLO p95 <= {args.slo_p95_ms:.0f} ms auf allen Stufen eingehalten.")
+    else:
+        print(f"SLO p95 <= {args.slo_p95_ms:.0f} ms gerissen ab {breaking} parallelen Anrufen.")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"slo_p95_ms": args.slo_p95_ms, "breaking_concurrency": breaking, "stages": rows}, f, indent=2)
+    return 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Lasttest: parallele entrypoint-Sessions gegen lokale Stand-ins.")
+    p.add_argument("--agent", default="livekit_agent_dsgvo", help="Agent-Modul (z.B. agent_basic)")
+    p.add_argument("--levels", default="1,2,4,8,16,32", help="Parallelitätsstufen, kommagetrennt")
+    p.add_argument("--turns", type=int, default=6, help="Gesprächsrunden pro Anruf")
+    p.add_argument("--slo-p95-ms", type=float, default=1200.0, help="SLO für p95 Turn-Latenz (ms)")
+    p.add_argument("--stop-at-breach", action="store_true", help="Rampe nach erster SLO-Verletzung beenden")
+    p.add_argument("--user-speech-ms", type=float, default=2500.0)
+    p.add_argument("--agent-speech-ms", type=float, default=3000.0)
+    p.add_argument("--llm-ttft-ms", type=float, default=450.0)
+    p.add_argument("--tts-first-chunk-ms", type=float, default=150.0)
+    p.add_argument("--embed-ms", type=float, default=120.0)
+    p.add_argument("--pinecone-ms", type=float, default=80.0)
+    p.add_argument("--kb-ratio", type=float, default=0.5, help="Anteil der Turns mit query_kb")
+    p.add_argument("--ring-ms", type=float, default=500.0, help="Zeit bis der Anrufer im Raum ist")
+    p.add_argument("--jitter", type=float, default=0.3, help="relative Streuung der Latenzen")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--json", help="Ergebnis zusätzlich als JSON schreiben")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,43 @@
+"""
+Speicherwachstum simulierter Anrufe über das Harness aus scripts/leak_check.py (Stand-ins aus load_test.py).
+- Wachstum pro Anruf (tracemalloc) unter einer Grenze
+- Keine TelephonyAssistant-/AgentSession-Instanzen überleben ihren Anruf
+"""
+
+import asyncio
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+import leak_check  # noqa: E402
+
+# wenige Anrufe, damit der Test schnell bleibt; einmalige Caches verteilen sich auf weniger Anrufe als in CI
+# mit leak_check.py --calls 2000, daher großzügiger als dessen Standard (--max-growth-kb 2)
+MAX_GROWTH_KB = 6.0
+
+
+@pytest.fixture(scope="module")
+def result(tmp_path_factory):
+    args = leak_check.parse_args(["--calls", "40", "--warmup", "20", "--concurrency", "10", "--turns", "2",
+                                  "--max-growth-kb", str(MAX_GROWTH_KB)])
+    # measure() setzt Webhook-/DB-Pfade in der ENV und den Root-Log-Level – danach wiederherstellen
+    saved_env, saved_level = dict(os.environ), logging.getLogger().level
+    try:
+        return asyncio.run(leak_check.measure(args, quiet=True, tmp_dir=str(tmp_path_factory.mktemp("leakcheck"))))
+    finally:
+        os.environ.clear()
+        os.environ.update(saved_env)
+        logging.getLogger().setLevel(saved_level)
+
+
+def test_growth_per_call_is_bounded(result):
+    assert result["per_call_kb"] <= MAX_GROWTH_KB, f"{result['per_call_kb']:.3f} KiB/Anruf"
+
+
+def test_no_agents_or_sessions_survive(result):
+    assert result["agents"] == 0
+    assert result["sessions"] == 0
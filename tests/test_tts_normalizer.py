@@ -0,0 +1,73 @@
+"""
+Textnormalisierung vor der Sprachsynthese (callisi/tts_normalizer.py), tabellengetrieben.
+- normalize: Einzeltexte
+- normalize_all: gleiche Ergebnisse, wenn der Text in ungünstigen Stücken gestreamt wird
+"""
+
+import pytest
+
+from callisi.tts_normalizer import normalize, normalize_all
+
+CASES = [
+    # "1" als Artikel nur vor bekannten Nomen, nach Genus und Kasus
+    ("Ich habe 1 Frage", "Ich habe eine Frage"),
+    ("1 Apartment ist frei", "ein Apartment ist frei"),
+    ("für 1 Nacht", "für eine Nacht"),
+    ("Ich habe 1 Hund", "Ich habe einen Hund"),
+    ("mit 1 Hund", "mit einem Hund"),
+    ("in 1 Woche", "in einer Woche"),
+    ("Es gibt 1 Parkplatz", "Es gibt einen Parkplatz"),
+    ("Ich habe 1 Zimmerchen", "Ich habe eins Zimmerchen"),
+    # Bezeichner: "eins"
+    ("Apartment 1 ist frei", "Apartment eins ist frei"),
+    ("Nr. 1 bitte", "Nummer eins bitte"),
+    ("Zimmer 1 Bett", "Zimmer eins Bett"),
+    # Ordinalzahlen mit Punkt
+    ("im 1. Stock", "im ersten Stock"),
+    ("1. Etage", "erste Etage"),
+    ("in der 2. Etage", "in der zweiten Etage"),
+    ("Der 3. Tag", "Der dritte Tag"),
+    ("das 1. Mal", "das erste Mal"),
+    ("Zimmer 3. Danach", "Zimmer drei. Danach"),
+    # Telefonnummern Ziffer für Ziffer, auch mit " / "
+    ("0208 / 12 34 56", "null zwei null acht eins zwei drei vier fünf sechs"),
+    ("0208/123456", "null zwei null acht eins zwei drei vier fünf sechs"),
+    ("+49 208 123456", "plus vier neun zwei null acht eins zwei drei vier fünf sechs"),
+    # Geldbeträge
+    ("3.50 Euro", "drei Euro fünfzig"),
+    ("3,50 €", "drei Euro fünfzig"),
+    ("1.000 Euro", "eintausend Euro"),
+    ("€ 89,-", "neunundachtzig Euro"),
+    # Daten und Uhrzeiten
+    ("Von 2025-10-19", "Von neunzehnten Oktober zweitausendfünfundzwanzig"),
+    ("am 15.03.2025", "am fünfzehnten März zweitausendfünfundzwanzig"),
+    ("der 3.10.", "der dritte Oktober"),
+    ("um 15.30 Uhr", "um fünfzehn Uhr dreißig"),
+    ("ab 1 Uhr", "ab ein Uhr"),
+    # Postleitzahlen Ziffer für Ziffer (vor einem Ortsnamen oder nach "PLZ"/"Postleitzahl")
+    ("46149 Oberhausen", "vier sechs eins vier neun Oberhausen"),
+    ("Die PLZ ist 46045.", "Die PLZ ist vier sechs null vier fünf."),
+    ("Postleitzahl: 46045", "Postleitzahl: vier sechs null vier fünf"),
+    # Zahlen und Dezimalzahlen
+    ("2 Personen", "zwei Personen"),
+    ("Wir haben 1.250 Gäste", "Wir haben eintausendzweihundertfünfzig Gäste"),
+    ("Pi ist 3.14159.", "Pi ist drei Komma eins vier eins fünf neun."),
+]
+
+
+@pytest.mark.parametrize("text, expected", CASES)
+def test_normalize(text, expected):
+    assert normalize(text) == expected
+
+
+STREAMS = [
+    (["Rufen Sie 0208 ", "/ 12 ", "34 56 an."], "Rufen Sie null zwei null acht eins zwei drei vier fünf sechs an."),
+    (["Im ", "1. ", "Stock ist ", "Apartment ", "1 frei."], "Im ersten Stock ist Apartment eins frei."),
+    (["Die PLZ ", "ist ", "46045."], "Die PLZ ist vier sechs null vier fünf."),
+    (["Sie kommen mit ", "1 ", "Hund ", "von ", "2025-10-19 an."], "Sie kommen mit einem Hund von neunzehnten Oktober zweitausendfünfundzwanzig an."),
+]
+
+
+@pytest.mark.parametrize("chunks, expected", STREAMS)
+def test_normalize_stream_chunks(chunks, expected):
+    assert normalize_all(chunks) == expected